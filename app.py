@@ -1,18 +1,38 @@
+import bisect
 import math
+import os
 import random
-import re
+import time
 import uuid
+from array import array
 from urllib.parse import urlparse
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import Flask, request, jsonify, send_from_directory
-
-from learning import ConversionEvent, get_metrics_store
-from search_provider import fetch_search_results, is_search_configured, get_search_provider_name
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
+
+from instrumentation import (
+    PROMETHEUS_CONTENT_TYPE, collect_timings, observe_stage, register_collector, render_prometheus, stage_summary,
+    stage_timer, stats_families, wants_timings,
+)
+from learning import ConversionEvent, get_event_writer, get_metrics_store
+from query_cache import QueryCache, QueryEntry, normalize_query
+from response_profiles import FastJSONProvider, ResponseStats, catalog_document, resolve_profile, shape_response, timed_dumps
+from retention import get_retention_worker
+from selection import solve_selection
+from signal_engine import ENTITY_RE, ENTITY_SKIP, INTENT_TOKENS, scan_triggers, token_set
+from search_cache import get_search_cache, search_ttl
+from provider_health import get_provider_health
+from search_provider import fetch_search_results, is_search_configured, get_search_provider_name, search_stats
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+
+
+@app.before_request
+def _start_background_retention():
+    get_retention_worker()  # once per worker process; a no-op after that
 
 # ═══════════════════════════════════════════════════════════════
 # DATA
@@ -128,23 +148,19 @@ def cos_sim(a, b):
 def extract_signals(query):
     q = query.lower()
     words = q.split()
+    triggers, has_entity, matched_template = scan_triggers(query)
 
     # ── Intent classification ──────────────────────────────────
-    intent_profiles = {
-        "financial_analysis": "earnings revenue profit stock market investment quarterly financial economics gdp tariff semiconductor fund",
-        "breaking_news":      "today latest breaking just announced hours minutes update urgent happened morning",
-        "tech_product":       "product launch release features review specs benchmark model gpt llm capabilities version",
-        "explainer":          "how does explain history background context overview understand mechanism works",
-        "policy":             "regulation law policy act eu government legislation compliance requirement providers",
-        "medical_clinical":   "clinical trial drug treatment therapy patient study health symptoms diagnosis results should take",
-    }
-    intent_scores = {k: cos_sim(q, v) for k, v in intent_profiles.items()}
+    q_tokens = token_set(q)
+    intent_scores = {}
+    for k, profile in INTENT_TOKENS.items():
+        # Inlined cos_sim against the precomputed profile token sets
+        intent_scores[k] = len(q_tokens & profile) / math.sqrt(len(q_tokens) * len(profile)) if q_tokens else 0
     sorted_intents = sorted(intent_scores.items(), key=lambda x: -x[1])
     intent = sorted_intents[0][0]
     top_intent_score = sorted_intents[0][1]
     # "What happened in X" / entity-heavy ambiguous -> prefer news/wire
-    has_entity = bool(re.search(r"\b[A-Z][a-z]{2,}\b", query))
-    what_happened = bool(re.search(r"\bwhat('s|\s+is|\s+happened|\s+happening)\b", q))
+    what_happened = "what_happened" in triggers
     # Override: (1) "what happened/happening" implies news even with lowercase "iran"; (2) ambiguous + entity
     if what_happened or (top_intent_score < 0.12 and has_entity):
         intent = "breaking_news"
@@ -152,59 +168,39 @@ def extract_signals(query):
     semantic_raw = min(top_intent_score * 3.8 + 0.22, 0.98)
 
     # ── DIMENSION 1: RELEVANCE ────────────────────────────────
-    entity_re = r'\b([A-Z][a-z]{1,}(?:\s[A-Z][a-z]{1,})*|[A-Z]{2,6})\b'
-    raw_entities = re.findall(entity_re, query)
-    skip = {'The', 'A', 'An', 'In', 'On', 'At', 'Is', 'It', 'If', 'Do', 'Be', 'We', 'My'}
-    entities = [e for e in raw_entities if len(e) > 1 and e not in skip]
+    raw_entities = ENTITY_RE.findall(query)
+    entities = [e for e in raw_entities if len(e) > 1 and e not in ENTITY_SKIP]
     entity_density_raw = min(len(entities) / 7, 1.0)
 
-    specific_markers = r'\b(q[1-4]|20[2-9]\d|\$[\d]+|percent|%|basis\s*points|ipo|ceo|cfo|merger|acquisition|exactly|specific|detail|result)\b'
-    specific_triggered = bool(re.search(specific_markers, q, re.IGNORECASE))
+    specific_triggered = "specific" in triggers
     specificity_raw = 0.88 if specific_triggered else (0.65 if len(words) > 9 else 0.38)
 
-    templates = [
-        (r'\b(earnings|revenue|profit)\b.*\b(q[1-4]|quarter|annual)\b', "<company>_earnings_<period>", 0.22),
-        (r'\b(what\s+did|said|announced|statement)\b',                   "<speaker>_statement",         0.18),
-        (r'\b(clinical\s+trial|phase\s+[123]|fda)\b',                    "<medical_trial>",              0.20),
-        (r'\b(today|this\s+morning|just|breaking)\b',                    "<breaking_event>",             0.15),
-        (r'\b(compliance|regulation|act|law|requirement)\b',             "<policy_query>",               0.12),
-        (r'\b(should\s+i|should\s+we)\b',                                "<decision_query>",             0.10),
-    ]
-    matched_template = None
-    for pattern, label, boost in templates:
-        if re.search(pattern, query, re.IGNORECASE):
-            matched_template = {"label": label, "boost": boost}
-            break
     template_boost_raw = 0.5 + (matched_template["boost"] if matched_template else 0)
 
     relevance_composed = min(0.38*semantic_raw + 0.25*entity_density_raw + 0.22*specificity_raw + 0.15*template_boost_raw, 0.99)
 
     # ── DIMENSION 2: CREDIBILITY ──────────────────────────────
-    high_stakes_pat = r'\b(should\s+i|should\s+we|invest|buy|sell|treatment|diagnosis|legal|liability|compliance|prescription|recommend)\b'
-    med_stakes_pat  = r'\b(impact|affect|influence|result|consequence|implication|effect)\b'
-    if re.search(high_stakes_pat, q, re.IGNORECASE):
+    if "high_stakes" in triggers:
         stakes_raw   = 0.95
         stakes_level = "high"
-    elif re.search(med_stakes_pat, q, re.IGNORECASE):
+    elif "med_stakes" in triggers:
         stakes_raw   = 0.68
         stakes_level = "medium"
     else:
         stakes_raw   = 0.38
         stakes_level = "low"
 
-    sensitivity_pat = r'\b(medical|clinical|legal|financial\s+advice|investment\s+advice|drug|diagnosis|prescription|liability|should\s+i\s+take)\b'
-    if re.search(sensitivity_pat, q, re.IGNORECASE):
+    if "sensitivity" in triggers:
         sensitivity_raw   = 0.92
         sensitivity_level = "high"
-    elif re.search(r'\b(finance|earnings|revenue|profit)\b', q, re.IGNORECASE):
+    elif "finance" in triggers:
         sensitivity_raw   = 0.72
         sensitivity_level = "finance"
     else:
         sensitivity_raw   = 0.30
         sensitivity_level = "general"
 
-    controversy_pat     = r'\b(policy|regulation|debate|controversial|ban|restrict|versus|vs\.|disagree|dispute|different\s+views)\b'
-    controversy_triggered = bool(re.search(controversy_pat, q, re.IGNORECASE))
+    controversy_triggered = "controversy" in triggers
     controversy_raw     = 0.78 if controversy_triggered else 0.28
 
     corroboration_raw = min(stakes_raw*0.5 + controversy_raw*0.3 + (0.25 if intent == "breaking_news" else 0), 1.0)
@@ -212,17 +208,13 @@ def extract_signals(query):
     credibility_composed = min(0.38*stakes_raw + 0.28*sensitivity_raw + 0.22*corroboration_raw + 0.12*controversy_raw, 0.99)
 
     # ── DIMENSION 3: FRESHNESS ────────────────────────────────
-    now_pat    = r'\b(today|this\s+morning|just|breaking|right\s+now|announced|hours\s+ago|minutes\s+ago|tonight|yesterday)\b'
-    recent_pat = r'\b(this\s+week|this\s+month|latest|recent|new|2025|2026|q[1-4]\s*202[456])\b'
-    archive_pat= r'\b(history|background|how\s+does|explain|what\s+is|overview|2020|2019|2018|originally)\b'
-
-    if re.search(now_pat, q, re.IGNORECASE):
+    if "now" in triggers:
         velocity_raw   = 1.0
         velocity_level = "real-time"
-    elif re.search(recent_pat, q, re.IGNORECASE):
+    elif "recent" in triggers:
         velocity_raw   = 0.74
         velocity_level = "recent"
-    elif re.search(archive_pat, q, re.IGNORECASE):
+    elif "archive" in triggers:
         velocity_raw   = 0.12
         velocity_level = "archival"
     else:
@@ -230,18 +222,17 @@ def extract_signals(query):
         velocity_level = "neutral"
 
     time_markers = []
-    if re.search(now_pat, q, re.IGNORECASE):
+    if "now" in triggers:
         time_markers.append("real-time (<4h)")
-    if re.search(recent_pat, q, re.IGNORECASE):
+    if "recent" in triggers:
         time_markers.append("recent (<7d)")
-    if re.search(r'\b(q[1-4])\b', q, re.IGNORECASE):
+    if "quarterly" in triggers:
         time_markers.append("quarterly")
-    if re.search(r'\b(202[3456])\b', q):
+    if "year" in triggers:
         time_markers.append("year-specific")
     temporal_raw = min(velocity_raw + len(time_markers)*0.04, 1.0)
 
-    event_pat        = r'\b(earnings|ipo|merger|acquisition|rate\s+decision|vote|election|launch|announcement|profit\s+warning|down\s+\d|up\s+\d)\b'
-    event_triggered  = bool(re.search(event_pat, q, re.IGNORECASE))
+    event_triggered  = "event" in triggers
     event_urgency_raw = 0.82 if event_triggered else 0.22
 
     half_life_map = {
@@ -264,12 +255,10 @@ def extract_signals(query):
         max_freshness_hours = 9999
 
     # ── DIMENSION 4: DEPTH ────────────────────────────────────
-    analytical_pat      = r'\b(analyze|analysis|impact|implication|compare|versus|tradeoff|why\s+is|explain\s+why|how\s+does|what\s+are\s+the)\b'
-    analytical_triggered = bool(re.search(analytical_pat, q, re.IGNORECASE))
+    analytical_triggered = "analytical" in triggers
     complexity_raw = min(0.60*(0.88 if analytical_triggered else 0.35) + 0.40*(len(words)/18), 0.99)
 
-    depth_pat             = r'\b(comprehensive|detailed|in-depth|full\s+analysis|thorough|breakdown|deep\s+dive|specific|exactly)\b'
-    depth_keywords_triggered = bool(re.search(depth_pat, q, re.IGNORECASE))
+    depth_keywords_triggered = "depth" in triggers
     if depth_keywords_triggered:
         depth_required = 0.92
     elif complexity_raw > 0.62:
@@ -277,18 +266,15 @@ def extract_signals(query):
     else:
         depth_required = 0.32
 
-    nav_pat  = r'\b(official|site|website|page|homepage|portal)\b'
-    trans_pat= r'\b(how\s+to|steps\s+to|guide|tutorial|sign\s+up)\b'
-    if re.search(nav_pat, q, re.IGNORECASE):
+    if "navigational" in triggers:
         question_type = "navigational"
-    elif re.search(trans_pat, q, re.IGNORECASE):
+    elif "transactional" in triggers:
         question_type = "transactional"
     else:
         question_type = "informational"
     question_type_score = {"informational": 0.65, "navigational": 0.30, "transactional": 0.48}[question_type]
 
-    ambiguity_pat      = r'\b(or|versus|vs\.|either|unclear|depends|different\s+views|perspective|both\s+sides)\b'
-    ambiguity_triggered = bool(re.search(ambiguity_pat, q, re.IGNORECASE))
+    ambiguity_triggered = "ambiguity" in triggers
     ambiguity_raw = 0.76 if ambiguity_triggered else 0.24
 
     depth_composed = min(0.40*complexity_raw + 0.32*depth_required + 0.18*question_type_score + 0.10*ambiguity_raw, 0.99)
@@ -315,7 +301,7 @@ def extract_signals(query):
     topical_domain = intent.replace("_", " ")  # intent doubles as primary domain
     if "tariff" in q or "trade" in q or "geopolit" in q or "policy" in q:
         topical_domain = topical_domain + " + geopolitics"
-    if re.search(r"\b(earnings|revenue|profit|q[1-4])\b", q):
+    if "earnings" in triggers:
         topical_domain = topical_domain + " + earnings"
 
     # Trending detection (FB §3.1): heuristic = breaking + real-time
@@ -422,6 +408,9 @@ def extract_signals(query):
     }
 
 
+TIER_Q_FIT = {"premium": 1.0, "mid": 0.82, "wire": 0.76, "free": 0.52}
+
+
 def score_source(sigs, src, learned_boost=None):
     intent     = sigs["intent"]
     freshness  = sigs["freshness"]
@@ -453,7 +442,7 @@ def score_source(sigs, src, learned_boost=None):
     if learned_boost:
         boost = min(0.98, boost + learned_boost.get(src["name"], 0))
     q_fit = (
-        {"premium": 1.0, "mid": 0.82, "wire": 0.76, "free": 0.52}.get(src["type"], 0.6)
+        TIER_Q_FIT.get(src["type"], 0.6)
         if credibility["composed"] > 0.70
         else 1.0
     )
@@ -469,6 +458,191 @@ def score_source(sigs, src, learned_boost=None):
     }
 
 
+CATALOG_PREFILTER_MIN = int(os.environ.get("CATALOG_PREFILTER_MIN", "256"))
+PRICE_BANDS = (1.0, 3.0)        # paid band edges; band 0 is free
+FRESH_BANDS = (4, 12, 24, 48)   # freshH edges where freshnessFit steps (see score_source)
+_PREFILTER_EPS = 1e-9
+
+
+def price_band(price):
+    """0 for free sources, then 1.. for each PRICE_BANDS interval."""
+    return 0 if price == 0 else bisect.bisect_right(PRICE_BANDS, price) + 1
+
+
+def fresh_band(fresh_h):
+    return bisect.bisect_left(FRESH_BANDS, fresh_h)
+
+
+class SourceCatalog:
+    """
+    Indexed, column-oriented view of a source list.
+
+    Columns (authority, price, freshH, freshness fit per regime) are compact arrays indexed
+    by source id (position in the list). Indexes:
+      - topic_ids: cos_sim token of a source's topics -> ids. Sources sharing no token with
+        an intent label have semantic exactly 0.28, so only indexed ids need cos_sim.
+      - by_type / by_price_band: ids per tier and per price band.
+      - cells: (type, price band, freshness band) -> ids sorted by authority. Within a cell
+        every non-topical, non-boosted source shares semantic, freshness fit and qFit, so
+        the sources that can clear Gate 1's utility floor are a suffix found by bisection.
+    candidates() uses them to drop sources that cannot pass Gate 1 (too_stale, low_utility)
+    before scoring; catalogs smaller than prefilter_min are scored in full so allScored
+    keeps every source. score() produces exactly the numbers score_source would.
+    """
+
+    def __init__(self, sources, prefilter_min=None):
+        self.sources = sources
+        self.prefilter_min = CATALOG_PREFILTER_MIN if prefilter_min is None else prefilter_min
+        n = len(sources)
+        self.names = [s["name"] for s in sources]
+        self.auth = array("d", (s["auth"] for s in sources))
+        self.price = array("d", (s["price"] for s in sources))
+        self.fresh_h = array("d", (s["freshH"] for s in sources))
+        self.types = [s["type"] for s in sources]
+        self.q_fit_by_tier = array("d", (TIER_Q_FIT.get(t, 0.6) for t in self.types))
+        f_required = []
+        for s in sources:
+            f_fit = 1.0 if s["freshH"] <= 4 else 0.55 if s["freshH"] <= 12 else 0.28 if s["freshH"] <= 24 else 0.05
+            if s["price"] == 0:
+                f_fit *= 0.25
+            f_required.append(f_fit)
+        self.f_fit_required = array("d", f_required)
+        self.f_fit_recent = array("d", (0.90 if s["freshH"] <= 48 else 0.72 for s in sources))
+
+        self.ids_by_name = {}
+        self.topic_ids = {}
+        self.by_type = {}
+        self.by_price_band = {}
+        cells = {}
+        for i, s in enumerate(sources):
+            self.ids_by_name.setdefault(s["name"], []).append(i)
+            for token in set(w for w in " ".join(s["topics"]).lower().split() if len(w) > 2):
+                self.topic_ids.setdefault(token, []).append(i)
+            band = price_band(s["price"])
+            self.by_type.setdefault(s["type"], []).append(i)
+            self.by_price_band.setdefault(band, []).append(i)
+            cells.setdefault((s["type"], band, fresh_band(s["freshH"])), []).append(i)
+        self.cells = {}
+        for key, ids in cells.items():
+            ids.sort(key=lambda i: self.auth[i])
+            fresh = [self.fresh_h[i] for i in ids]
+            self.cells[key] = (array("l", ids), array("d", (self.auth[i] for i in ids)), min(fresh), max(fresh))
+        self.authority_order = sorted(range(n), key=lambda i: -self.auth[i])
+        self._semantic = {}
+        self._static_boost = {}
+
+    def __len__(self):
+        return len(self.sources)
+
+    def top_by_authority(self, k):
+        return [self.sources[i] for i in self.authority_order[:k]]
+
+    def semantic(self, intent):
+        """{id: semantic} for sources sharing a topic token with the intent label; others are 0.28."""
+        col = self._semantic.get(intent)
+        if col is None:
+            label = intent.replace("_", " ")
+            ids = set()
+            for token in set(w for w in label.lower().split() if len(w) > 2):
+                ids.update(self.topic_ids.get(token, ()))
+            col = {i: min(cos_sim(label, " ".join(self.sources[i]["topics"])) * 3.2 + 0.28, 0.96) for i in sorted(ids)}
+            self._semantic[intent] = col
+        return col
+
+    def static_boost(self, intent):
+        """{id: DOMAIN_BOOST} for the intent; absent ids have no static boost."""
+        col = self._static_boost.get(intent)
+        if col is None:
+            col = {i: b for name, b in DOMAIN_BOOST.get(intent, {}).items() for i in self.ids_by_name.get(name, ())}
+            self._static_boost[intent] = col
+        return col
+
+    def _f_col(self, sigs):
+        freshness = sigs["freshness"]
+        if freshness["required"]:
+            return self.f_fit_required
+        if freshness["composed"] > 0.4:
+            return self.f_fit_recent
+        return None  # neutral: 0.78 everywhere
+
+    def candidates(self, sigs, learned_boost=None):
+        """
+        Ids (ascending) of every source that can pass Gate 1 for these signals. Sources not
+        returned are guaranteed too_stale or low_utility; the rest still go through Gate 1.
+        """
+        n = len(self.sources)
+        if n < self.prefilter_min:
+            return range(n)
+        intent = sigs["intent"]
+        max_fresh = sigs["maxFreshnessHours"]
+        fresh_h = self.fresh_h
+        semantic = self.semantic(intent)
+        # Sources whose semantic or boost differ from the cell baseline are checked individually
+        special = set(semantic)
+        special.update(self.static_boost(intent))
+        for name in learned_boost or ():
+            special.update(self.ids_by_name.get(name, ()))
+        out = [i for i in special if fresh_h[i] <= max_fresh]
+        if intent == "breaking_news":
+            # Gate 1 requires semantic >= 0.35, which needs topic overlap
+            return sorted(i for i in out if i in semantic)
+
+        floor = sigs["qualityThreshold"] - 0.12
+        f_col = self._f_col(sigs)
+        tiered = sigs["credibility"]["composed"] > 0.70
+        for (tier, band, f_band), (ids, auths, min_fresh, cell_max_fresh) in self.cells.items():
+            if min_fresh > max_fresh:
+                continue
+            f_fit = 0.78 if f_col is None else f_col[ids[0]]
+            q_fit = TIER_Q_FIT.get(tier, 0.6) if tiered else 1.0
+            base = 0.28*0.28 + 0.24*f_fit + 0.14*0.5 + 0.10*q_fit
+            start = bisect.bisect_left(auths, (floor - base) / 0.24 - _PREFILTER_EPS)
+            if cell_max_fresh > max_fresh:
+                out.extend(i for i in ids[start:] if fresh_h[i] <= max_fresh and i not in special)
+            else:
+                out.extend(i for i in ids[start:] if i not in special)
+        out.sort()
+        return out
+
+    def score(self, sigs, learned_boost=None, ids=None):
+        """score_source for the given ids (default: all); returns score dicts in the same order."""
+        if ids is None:
+            ids = range(len(self.sources))
+        f_col = self._f_col(sigs)
+        q_col = self.q_fit_by_tier if sigs["credibility"]["composed"] > 0.70 else None
+        semantic = self.semantic(sigs["intent"])
+        static = self.static_boost(sigs["intent"])
+        names, auth = self.names, self.auth
+        out = []
+        for i in ids:
+            sem = semantic.get(i, 0.28)
+            a = auth[i]
+            f_fit = 0.78 if f_col is None else f_col[i]
+            q_fit = 1.0 if q_col is None else q_col[i]
+            boost = static.get(i, 0)
+            if learned_boost:
+                boost = min(0.98, boost + learned_boost.get(names[i], 0))
+            out.append({
+                "semantic":     sem,
+                "authority":    a,
+                "freshnessFit": f_fit,
+                "domainBoost":  0.5 + boost,
+                "qFit":         q_fit,
+                "utility":      min(0.28*sem + 0.24*a + 0.24*f_fit + 0.14*(0.5+boost) + 0.10*q_fit, 0.99),
+            })
+        return out
+
+    def scored(self, sigs, learned_boost=None):
+        """Gate 1 candidates merged with their scores (and sourceId), as optimize() builds them."""
+        ids = self.candidates(sigs, learned_boost)
+        sources = self.sources
+        return [{**sources[i], "sourceId": i, **sc} for i, sc in zip(ids, self.score(sigs, learned_boost, ids))]
+
+
+SOURCE_CATALOG = SourceCatalog(SOURCES)
+CATALOG_DOCUMENT = catalog_document(SOURCES)  # GET /catalog; sourceId is the index in SOURCES
+
+
 def compute_bid_ceiling(sigs: dict) -> float:
     """
     Per-query value ceiling (max bid) based on scoring signals.
@@ -485,18 +659,65 @@ def compute_bid_ceiling(sigs: dict) -> float:
     return round(base + (cap - base) * factor, 4)
 
 
+QUERY_CACHE = QueryCache()
+
+
+def _query_entry(query):
+    """QUERY_CACHE entry for the query, running extract_signals only on a miss."""
+    normalized = normalize_query(query)
+    entry = QUERY_CACHE.get(normalized)
+    if entry is None:
+        with stage_timer("signals"):
+            entry = QueryEntry(normalized, extract_signals(normalized))
+        QUERY_CACHE.put(entry)
+    return entry
+
+
 def optimize(query, customer_id="default"):
-    sigs   = extract_signals(query)
-    budget = 12.0
-    bid_ceiling = compute_bid_ceiling(sigs)
+    return _optimize_entry(_query_entry(query), customer_id)
 
+
+def _optimize_entry(entry, customer_id="default"):
+    """optimize() from the query's signals on: learned boosts, scoring, Gates 1–3."""
     # Learned publisher performance for this intent (citation rate / value per dollar)
-    store = get_metrics_store()
-    learned_boost = store.get_learned_domain_boost(sigs["intent"])
+    with stage_timer("boost_lookup"):
+        learned_boost = get_metrics_store().get_learned_domain_boost(entry.sigs["intent"])
+    return _optimize_scored(entry, learned_boost, customer_id)
+
 
-    scored = [{**s, **score_source(sigs, s, learned_boost)} for s in SOURCES]
+def _optimize_scored(entry, learned_boost, customer_id="default"):
+    """Scoring and Gates 1–3 once learned boosts are known (no I/O)."""
+    sigs  = entry.sigs
+    with stage_timer("scoring"):
+        scored = QUERY_CACHE.scored_for(entry, learned_boost)
+        if scored is None:
+            scored = SOURCE_CATALOG.scored(sigs, learned_boost)
+            QUERY_CACHE.store_scored(entry, learned_boost, scored)
+    return _plan_purchase(sigs, scored, customer_id)
 
-    # Add bidding fields: bid closer to ask (realistic); our_bid = ask × (0.72 + 0.28 × utility)
+
+def optimize_batch(queries, customer_id="default"):
+    """
+    optimize() for many queries at once: signals for every query, learned boosts fetched
+    once per distinct intent, and each query's candidates scored on SOURCE_CATALOG's columns.
+    Returns one optimize()-shaped result per query, in order. Shares QUERY_CACHE with optimize().
+    """
+    entries = [_query_entry(q) for q in queries]
+    store = get_metrics_store()
+    boosts = {intent: store.get_learned_domain_boost(intent) for intent in dict.fromkeys(e.sigs["intent"] for e in entries)}
+    results = []
+    for entry in entries:
+        learned_boost = boosts[entry.sigs["intent"]]
+        scored = QUERY_CACHE.scored_for(entry, learned_boost)
+        if scored is None:
+            scored = SOURCE_CATALOG.scored(entry.sigs, learned_boost)
+            QUERY_CACHE.store_scored(entry, learned_boost, scored)
+        results.append(_plan_purchase(entry.sigs, scored, customer_id))
+    return results
+
+
+def _simulate_bids(scored):
+    """Add bidding fields: bid closer to ask (realistic); our_bid = ask × (0.72 + 0.28 × utility)"""
     for s in scored:
         if s["price"] == 0:
             s["our_bid"] = 0
@@ -522,27 +743,15 @@ def optimize(query, customer_id="default"):
                 "percentile": pct,
             }
 
-    # GATE 1: Eligibility (hard filters)
-    eligible, ineligible = [], []
-    intent = sigs["intent"]
-    for s in scored:
-        reasons = []
-        if s["freshH"] > sigs["maxFreshnessHours"]:
-            reasons.append("too_stale")
-        if s["utility"] < sigs["qualityThreshold"] - 0.12:
-            reasons.append("low_utility")
-        # breaking_news: require topic overlap with news/current events (exclude tech/academic-only)
-        if intent == "breaking_news" and s.get("semantic", 0) < 0.35:
-            reasons.append("low_utility")
-        if reasons:
-            ineligible.append({**s, "reason": reasons[0]})
-        else:
-            eligible.append(s)
 
-    # GATE 2: Value rank among eligible
-    eligible.sort(key=lambda s: s["utility"] / max(s["price"], 0.01), reverse=True)
+GATE3_SOLVER = os.environ.get("GATE3_SOLVER", "optimal")
+GATE3_TIME_BUDGET_MS = float(os.environ.get("GATE3_TIME_BUDGET_MS", "5"))
+# Utility a dollar of price costs the optimal solver: a source is bought only if worth its price
+GATE3_PRICE_WEIGHT = float(os.environ.get("GATE3_PRICE_WEIGHT", "0.1"))
 
-    # GATE 3: Select with diversity
+
+def _select_greedy(eligible, sigs, budget):
+    """Legacy Gate 3: walk the value ranking, stop after max(minSources + 1, 2) picks."""
     selected, rejected = [], []
     spent      = 0.0
     used_types = set()
@@ -569,8 +778,86 @@ def optimize(query, customer_id="default"):
         used_names.add(c["name"])
         if len(selected) >= max(sigs["minSources"] + 1, 2):
             break
+    return selected, rejected, spent
+
+
+def _select_optimal(eligible, sigs, budget):
+    """
+    Gate 3 via selection.solve_selection: the set with the most utility net of
+    GATE3_PRICE_WEIGHT * price under the same budget, pick count, REDUNDANT and tier rules
+    as the greedy gate. Selected sources keep their value-rank order; every other eligible
+    source is listed as rejected with the rule that keeps it out of the chosen set
+    ("lower_value" if none does).
+    """
+    result = solve_selection(
+        eligible, budget, sigs["minSources"], max(sigs["minSources"] + 1, 2),
+        redundant=REDUNDANT, time_budget_ms=GATE3_TIME_BUDGET_MS, price_weight=GATE3_PRICE_WEIGHT,
+    )
+    chosen = set(result.indices)
+    selected = [eligible[i] for i in result.indices]
+    spent = sum(s["price"] for s in selected)
+    used_names = {s["name"] for s in selected}
+    used_types = {s["type"] for s in selected if s["type"] != "free"}
+    rejected = []
+    for i, c in enumerate(eligible):
+        if i in chosen:
+            continue
+        if spent + c["price"] > budget:
+            reason = "over_budget"
+        elif any((c["name"] == a and b in used_names) or (c["name"] == b and a in used_names) for a, b in REDUNDANT):
+            reason = "redundant"
+        elif c["type"] in used_types:
+            reason = "dup_tier"
+        else:
+            reason = "lower_value"
+        rejected.append({**c, "reason": reason})
+        if len(rejected) >= 4:
+            break
+    return selected, rejected, spent, {"solver": "branch_and_bound", **result.to_dict()}
+
 
-    naive      = sorted(SOURCES, key=lambda s: -s["auth"])[:3]
+def _plan_purchase(sigs, scored, customer_id, catalog=None):
+    """
+    Bid simulation and Gates 1–3 over already-scored sources; returns the optimize() result.
+    scored may be a pre-filtered subset of catalog (default SOURCE_CATALOG).
+    """
+    if catalog is None:
+        catalog = SOURCE_CATALOG
+    budget = 12.0
+    bid_ceiling = compute_bid_ceiling(sigs)
+    with stage_timer("bidding"):
+        _simulate_bids(scored)
+
+    with stage_timer("gates_1_2"):
+        # GATE 1: Eligibility (hard filters)
+        eligible, ineligible = [], []
+        intent = sigs["intent"]
+        for s in scored:
+            reasons = []
+            if s["freshH"] > sigs["maxFreshnessHours"]:
+                reasons.append("too_stale")
+            if s["utility"] < sigs["qualityThreshold"] - 0.12:
+                reasons.append("low_utility")
+            # breaking_news: require topic overlap with news/current events (exclude tech/academic-only)
+            if intent == "breaking_news" and s.get("semantic", 0) < 0.35:
+                reasons.append("low_utility")
+            if reasons:
+                ineligible.append({**s, "reason": reasons[0]})
+            else:
+                eligible.append(s)
+
+        # GATE 2: Value rank among eligible
+        eligible.sort(key=lambda s: s["utility"] / max(s["price"], 0.01), reverse=True)
+
+    # GATE 3: Select with diversity
+    with stage_timer("gate3"):
+        if GATE3_SOLVER == "greedy":
+            selected, rejected, spent = _select_greedy(eligible, sigs, budget)
+            selection = {"solver": "greedy"}
+        else:
+            selected, rejected, spent, selection = _select_optimal(eligible, sigs, budget)
+
+    naive      = catalog.top_by_authority(3)
     naive_cost = sum(s["price"] for s in naive)
     naive_q    = sum(s["auth"] for s in naive) / len(naive)
     smart_q    = sum(s["utility"] for s in selected) / len(selected) if selected else 0
@@ -588,7 +875,10 @@ def optimize(query, customer_id="default"):
         "naiveQ":     naive_q,
         "savings":    naive_cost - spent,
         "savingsPct": (naive_cost - spent) / naive_cost * 100 if naive_cost > 0 else 0,
+        "optimalityGap": selection.get("gap"),
+        "selection":  selection,
         "customer_id": customer_id,
+        "prefiltered": len(catalog) - len(scored),
     }
 
 
@@ -613,41 +903,196 @@ def api_reference():
     return send_from_directory(".", "api-reference.html")
 
 
+@app.route("/catalog")
+def catalog_route():
+    """Static source catalog by sourceId (price terms, topics, domains); ETag is its version."""
+    resp = jsonify(CATALOG_DOCUMENT)
+    resp.set_etag(CATALOG_DOCUMENT["version"])
+    return resp.make_conditional(request)
+
+
+RESPONSE_STATS = ResponseStats()
+
+
+def _json_response(payload, profile):
+    """JSON response for an /optimize payload, recording its size and serialization time."""
+    body, serialize_ms = timed_dumps(app.json, payload)
+    RESPONSE_STATS.observe(profile, len(body), serialize_ms)
+    observe_stage("serialization", serialize_ms / 1e3)
+    return app.response_class(body, mimetype="application/json")
+
+
+def _request_profile(data):
+    return resolve_profile(data.get("profile") or request.args.get("profile"))
+
+
 @app.route("/optimize", methods=["POST"])
 def optimize_route():
     data = request.get_json() or {}
     query = data.get("query", "")
     customer_id = data.get("customer_id", "default")
-    result = optimize(query, customer_id=customer_id)
-
-    # Articles to scrape: show every search result (no filter by purchase plan).
-    # Each result is turned into an article; catalog domains get name+price, others get domain label + "—".
-    # COMMENTED OUT: search integration
-    # result["search_configured"] = is_search_configured()
-    # result["search_provider"] = get_search_provider_name()
-    # result["selected_articles"] = []
-    # if is_search_configured():
-    #     try:
-    #         search_results, provider_used = fetch_search_results(query, num=15)
-    #         result["selected_articles"] = _search_results_to_articles(search_results)
-    #         result["search_provider"] = provider_used
-    #         if not result["selected_articles"] and search_results:
-    #             app.logger.warning(
-    #                 "Search returned %s results but 0 articles (query %r). First result keys: %s",
-    #                 len(search_results), query[:40], list(search_results[0].keys()) if search_results else None,
-    #             )
-    #         elif not result["selected_articles"]:
-    #             app.logger.info(
-    #                 "Search returned 0 results for %r (provider %s). Tip: set BRAVE_API_KEY in .env for reliable search.",
-    #                 query[:40], provider_used,
-    #             )
-    #     except Exception as e:
-    #         app.logger.warning("Search failed for %r: %s", query[:50], e)
-    result["search_configured"] = False
-    result["search_provider"] = None
-    result["selected_articles"] = []
-
-    # Persist conversion event for learning (purchase decision; outcomes via /feedback)
+    profile = _request_profile(data)
+    if profile is None:
+        return jsonify({"ok": False, "error": "profile must be one of minimal, standard, debug"}), 400
+    try:
+        stream_format = _stream_format(data.get("stream"), request.headers.get("Accept", ""))
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    if stream_format:
+        return _stream_response(_optimize_events(query, customer_id, profile), stream_format)
+    # X-Debug-Timings: 1 adds per-stage durations (ms) to the response as "timings"
+    with collect_timings(wants_timings(request.headers.get("X-Debug-Timings"))) as timings:
+        result = optimize(query, customer_id=customer_id)
+
+        # Articles to scrape: show every search result (no filter by purchase plan).
+        # Each result is turned into an article; catalog domains get name+price, others get domain label + "—".
+        # COMMENTED OUT: search integration
+        # result["search_configured"] = is_search_configured()
+        # result["search_provider"] = get_search_provider_name()
+        # result["selected_articles"] = []
+        # if is_search_configured():
+        #     try:
+        #         search_results, provider_used = fetch_search_results(query, num=15, ttl_s=search_ttl(result["sigs"]))
+        #         result["selected_articles"] = _search_results_to_articles(search_results)
+        #         result["search_provider"] = provider_used
+        #         if not result["selected_articles"] and search_results:
+        #             app.logger.warning(
+        #                 "Search returned %s results but 0 articles (query %r). First result keys: %s",
+        #                 len(search_results), query[:40], list(search_results[0].keys()) if search_results else None,
+        #             )
+        #         elif not result["selected_articles"]:
+        #             app.logger.info(
+        #                 "Search returned 0 results for %r (provider %s). Tip: set BRAVE_API_KEY in .env for reliable search.",
+        #                 query[:40], provider_used,
+        #             )
+        #     except Exception as e:
+        #         app.logger.warning("Search failed for %r: %s", query[:50], e)
+        result["search_configured"] = False
+        result["search_provider"] = None
+        result["selected_articles"] = []
+
+        # Persist conversion event for learning (purchase decision; outcomes via /feedback).
+        # Written behind the response by the event writer's background thread.
+        with stage_timer("event_submit"):
+            get_event_writer().submit(_conversion_event(result, query, customer_id))
+    payload = shape_response(result, profile, CATALOG_DOCUMENT["version"])
+    if timings is not None:
+        payload["timings"] = timings
+    return _json_response(payload, profile)
+
+
+STREAM_MIMETYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def _stream_format(stream, accept):
+    """
+    "ndjson", "sse" or None (plain JSON). Streaming is requested with "stream": true (NDJSON),
+    "stream": "ndjson" / "sse", or an Accept header naming either media type. Raises
+    ValueError for any other "stream" value (the routes answer 400).
+    """
+    if isinstance(stream, str) and stream in STREAM_MIMETYPES:
+        return stream
+    if stream is not None and not isinstance(stream, bool):
+        raise ValueError('stream must be true, false, "ndjson" or "sse"')
+    if "text/event-stream" in accept:
+        return "sse"
+    if stream is True or "application/x-ndjson" in accept:
+        return "ndjson"
+    return None
+
+
+def _stream_frame(name, data, stream_format):
+    """One streamed event: an NDJSON line or an SSE frame."""
+    if stream_format == "sse":
+        return f"event: {name}\ndata: {app.json.dumps(data)}\n\n"
+    return app.json.dumps({"event": name, "data": data}) + "\n"
+
+
+def _stream_response(events, stream_format):
+    """Response that writes each (event, data) pair as it is produced, as NDJSON lines or SSE frames."""
+    def body():
+        for name, data in events:
+            yield _stream_frame(name, data, stream_format)
+
+    return Response(
+        stream_with_context(body()),
+        mimetype=STREAM_MIMETYPES[stream_format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _optimize_events(query, customer_id, profile="debug"):
+    """
+    /optimize in stages, for streaming: ("signals", sigs) as soon as extract_signals is done
+    (just the intent for the minimal profile), ("plan", the profile's response without sigs,
+    with event_id/query_id) once Gate 3 is done, then ("done", search summary). Search
+    integration is disabled, so there are no ("article", {...}) events yet (the commented-out
+    block would send them only after fetch_search_results returned the whole list).
+    A failure ends the stream with ("error", {"error": message}).
+    """
+    try:
+        entry = _query_entry(query)
+        yield "signals", {"intent": entry.sigs["intent"]} if profile == "minimal" else entry.sigs
+
+        result = _optimize_entry(entry, customer_id)
+        # Logged before the plan goes out, so its event_id is valid for /feedback straight away
+        with stage_timer("event_submit"):
+            get_event_writer().submit(_conversion_event(result, query, customer_id))
+        plan = shape_response(result, profile, CATALOG_DOCUMENT["version"])
+        yield "plan", {k: v for k, v in plan.items() if k != "sigs"}
+
+        # COMMENTED OUT: search integration (see optimize_route)
+        # search_provider_used = get_search_provider_name()
+        # article_count = 0
+        # if is_search_configured():
+        #     try:
+        #         search_results, search_provider_used = fetch_search_results(query, num=15, ttl_s=search_ttl(result["sigs"]))
+        #         for article in _search_results_to_articles(search_results):
+        #             article_count += 1
+        #             yield "article", article
+        #     except Exception as e:
+        #         app.logger.warning("Search failed for %r: %s", query[:50], e)
+        # yield "done", {"search_configured": is_search_configured(), "search_provider": search_provider_used, "article_count": article_count}
+        yield "done", {"search_configured": False, "search_provider": None, "article_count": 0}
+    except Exception as e:
+        app.logger.exception("Streaming optimize failed for %r", query[:50])
+        yield "error", {"error": str(e)}
+
+
+MAX_BATCH_QUERIES = 500
+
+
+@app.route("/optimize/batch", methods=["POST"])
+def optimize_batch_route():
+    """Optimize many queries in one call; each entry of "results" has the /optimize response shape."""
+    data = request.get_json() or {}
+    queries = data.get("queries")
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) for q in queries):
+        return jsonify({"ok": False, "error": "queries must be a non-empty list of strings"}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"ok": False, "error": f"at most {MAX_BATCH_QUERIES} queries per batch"}), 400
+    customer_id = data.get("customer_id", "default")
+    profile = _request_profile(data)
+    if profile is None:
+        return jsonify({"ok": False, "error": "profile must be one of minimal, standard, debug"}), 400
+    results = optimize_batch(queries, customer_id=customer_id)
+
+    events = []
+    for query, result in zip(queries, results):
+        # Search integration is disabled, as in /optimize
+        result["search_configured"] = False
+        result["search_provider"] = None
+        result["selected_articles"] = []
+        events.append(_conversion_event(result, query, customer_id))
+    # One log_events call: the batch's events commit together or not at all
+    get_event_writer().submit_batch(events)
+    version = CATALOG_DOCUMENT["version"]
+    shaped = [shape_response(r, profile, version) for r in results]
+    return _json_response({"results": shaped, "count": len(shaped)}, f"batch:{profile}")
+
+
+def _conversion_event(result, query, customer_id):
+    """Build the ConversionEvent for an optimize() result and stamp its event_id/query_id on the result."""
     event_id = str(uuid.uuid4())
     query_id = str(uuid.uuid4())
     selected_names = [s["name"] for s in result["selected"]]
@@ -664,47 +1109,138 @@ def optimize_route():
         total_cost=result["smartCost"],
         decision_confidence=round(avg_confidence, 4),
     )
-    get_metrics_store().log_event(event)
     result["event_id"] = event_id
     result["query_id"] = query_id
-
-    return jsonify(result)
+    return event
 
 
 @app.route("/feedback", methods=["POST"])
 def feedback_route():
     """Submit outcome feedback for a prior optimization (sources cited, quality, correction)."""
-    data = request.get_json() or {}
+    payload, status = record_feedback(request.get_json() or {})
+    return jsonify(payload), status
+
+
+# How long /feedback keeps looking for an event_id this worker never queued: with several
+# workers it may still be queued in another worker's EventWriter (committed within EVENT_FLUSH_MS).
+# Polled with read-only lookups; 0 answers 404 at once.
+FEEDBACK_LOOKUP_WAIT_MS = float(os.environ.get("FEEDBACK_LOOKUP_WAIT_MS", "0"))
+_FEEDBACK_LOOKUP_POLL_S = 0.05
+
+
+def record_feedback(data):
+    """/feedback for a parsed JSON body; returns (payload, HTTP status). Blocks on SQLite."""
     event_id = data.get("event_id")
     if not event_id:
-        return jsonify({"ok": False, "error": "event_id required"}), 400
-    sources_cited = data.get("sources_cited", [])
-    answer_quality = data.get("answer_quality")
-    user_rating = data.get("user_rating")
-    correction_made = data.get("correction_made", False)
-    ok = get_metrics_store().submit_feedback(
+        return {"ok": False, "error": "event_id required"}, 400
+    # The event may still be queued behind the response that returned its event_id
+    get_event_writer().wait_for_event(event_id, timeout=5.0)
+    store = get_metrics_store()
+    deadline = time.monotonic() + FEEDBACK_LOOKUP_WAIT_MS / 1000.0
+    while not store.has_event(event_id):
+        if time.monotonic() >= deadline:
+            return {"ok": False, "error": "event_id not found"}, 404
+        time.sleep(_FEEDBACK_LOOKUP_POLL_S)
+    ok = store.submit_feedback(
         event_id=event_id,
-        sources_cited=sources_cited,
-        answer_quality=answer_quality,
-        user_rating=user_rating,
-        correction_made=correction_made,
+        sources_cited=data.get("sources_cited", []),
+        answer_quality=data.get("answer_quality"),
+        user_rating=data.get("user_rating"),
+        correction_made=data.get("correction_made", False),
     )
     if not ok:
-        return jsonify({"ok": False, "error": "event_id not found"}), 404
-    return jsonify({"ok": True})
+        return {"ok": False, "error": "event_id not found"}, 404
+    return {"ok": True}, 200
 
 
 @app.route("/learn", methods=["GET"])
 def learn_route():
-    """Return learned publisher performance by query cluster (k-anonymity applied)."""
-    cluster = request.args.get("cluster")
-    min_sample = request.args.get("min_sample_size", type=int) or 5
-    payload = get_metrics_store().get_global_publisher_performance(
-        query_cluster=cluster or None,
-        min_sample_size=min_sample,
-    )
+    """
+    Return learned publisher performance by query cluster (k-anonymity applied).
+    Lifetime totals by default; ?days=N limits to the last N days and ?half_life_days=H
+    weights each day by 0.5 ** (age / H). ?customer_id=C counts only that customer's events,
+    archived ones included (lifetime totals only). ?publisher=P adds that publisher's
+    per-cluster breakdown.
+    """
+    payload, status = learn_payload(request.args)
+    return jsonify(payload), status
+
+
+def learn_payload(args):
+    """/learn body for query args (a werkzeug MultiDict); returns (payload, HTTP status). Blocks on SQLite."""
+    cluster = args.get("cluster")
+    min_sample = args.get("min_sample_size", type=int) or 5
+    days = args.get("days", type=int)
+    half_life = args.get("half_life_days", type=float)
+    if (days is not None or half_life) and args.get("customer_id"):
+        # Windowed reads come from the shared daily buckets, which are not kept per customer
+        return {"ok": False, "error": "customer_id cannot be combined with days or half_life_days"}, 400
+    if days is not None or half_life:
+        payload = get_metrics_store().get_recent_publisher_performance(
+            query_cluster=cluster or None,
+            days=days,
+            half_life_days=half_life or None,
+            min_sample_size=min_sample,
+        )
+    else:
+        payload = get_metrics_store().get_global_publisher_performance(
+            query_cluster=cluster or None,
+            min_sample_size=min_sample,
+            customer_id=args.get("customer_id") or None,
+        )
+    if args.get("publisher"):
+        payload["publisher"] = get_metrics_store().get_publisher_performance(
+            args.get("publisher"), query_cluster=cluster or None, min_sample_size=min_sample,
+        )
     payload["event_count"] = get_metrics_store().event_count()
-    return jsonify(payload)
+    payload["boost_cache"] = get_metrics_store().boost_cache_stats()
+    payload["query_cache"] = QUERY_CACHE.stats()
+    payload["storage"] = get_metrics_store().pool_stats()
+    payload["archive"] = get_metrics_store().archive_stats()
+    payload["retention"] = get_retention_worker().stats()
+    payload["event_writer"] = get_event_writer().stats()
+    payload["search"] = search_stats()
+    payload["responses"] = RESPONSE_STATS.stats()
+    payload["stages"] = stage_summary()
+    return payload, 200
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_route():
+    """Prometheus text exposition: stage, DB and search latency histograms plus component counters."""
+    return Response(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def _component_metrics():
+    """Stats the caches, storage, event writer and provider health already keep, as metric families."""
+    store = get_metrics_store()
+    yield from stats_families("optimizer_query_cache", "Query signal/score cache", QUERY_CACHE.stats(),
+                              counters=("hits", "misses", "score_hits", "score_misses", "evictions", "expirations"))
+    yield from stats_families("optimizer_boost_cache", "Learned boost cache", store.boost_cache_stats(),
+                              counters=("hits", "misses", "invalidations"))
+    yield from stats_families("optimizer_db", "Learning store connection pool", store.pool_stats(),
+                              counters=("connections_opened", "connections_closed", "checkouts", "write_transactions",
+                                        "contended_writes", "lock_wait_ms_total", "busy_errors", "write_retries",
+                                        "write_errors", "connections_lost", "checkout_wait_ms_total",
+                                        "checkout_errors"))
+    yield from stats_families("optimizer_event_writer", "Write-behind event logger", get_event_writer().stats(),
+                              counters=("written", "batches", "dropped", "sync_writes", "failed"))
+    yield from stats_families("optimizer_retention", "learning.db retention", get_retention_worker().stats(),
+                              counters=("passes", "errors", "bytes_reclaimed_total"))
+    cache = get_search_cache()
+    if cache is not None:
+        yield from stats_families("optimizer_search_cache", "Search result cache", cache.stats(),
+                                  counters=("fresh_hits", "stale_hits", "misses", "refreshes", "refresh_failures", "pruned"))
+    for name, st in get_provider_health().stats().items():
+        yield from stats_families("optimizer_search_provider", "Search provider health", {
+            "open": int(st["state"] != "closed"),
+            "error_rate": st["error_rate"],
+            "expected_time_ms": st["expected_time_ms"],
+            "trips": st["trips"],
+        }, counters=("trips",), labels={"provider": name})
+
+
+register_collector(_component_metrics)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,339 @@
+"""
+ASGI entry point: the optimizer's JSON API on an event loop.
+
+  uvicorn asgi:app --workers 4 --port 5001
+
+/optimize (plain and streaming), /feedback and /learn are served natively with the same
+request and response contracts as the Flask routes in app.py, whose helpers they share.
+Signal extraction, scoring and Gate 3 are CPU work and run on the loop; every blocking
+call goes to a bounded executor:
+  db      SQLite reads and writes (learned boosts, feedback, /learn, event logging)
+  search  search provider calls (when the search block is enabled)
+  wsgi    every other route (UI pages, /catalog, /optimize/batch), served by the Flask
+          app through a buffering WSGI bridge
+Each executor runs at most ASGI_<NAME>_WORKERS calls at once; further callers wait on the
+loop rather than in the pool's queue. /learn reports their load under "asgi", and /metrics
+(through the bridge) as optimizer_asgi_pool_*. Calls run in a copy of the caller's context,
+so stage timings taken on a pool thread land in the request's X-Debug-Timings block.
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MultiDict
+
+from app import (
+    CATALOG_DOCUMENT,
+    RESPONSE_STATS,
+    STREAM_MIMETYPES,
+    _conversion_event,
+    _optimize_events,
+    _optimize_scored,
+    _query_entry,
+    _stream_format,
+    _stream_frame,
+    app as flask_app,
+    learn_payload,
+    record_feedback,
+)
+from instrumentation import collect_timings, observe_stage, register_collector, stage_timer, stats_families, wants_timings
+from learning import get_event_writer, get_metrics_store
+from retention import get_retention_worker
+from response_profiles import resolve_profile, shape_response, timed_dumps
+
+ASGI_DB_WORKERS = int(os.environ.get("ASGI_DB_WORKERS", "8"))
+ASGI_SEARCH_WORKERS = int(os.environ.get("ASGI_SEARCH_WORKERS", "32"))
+ASGI_WSGI_WORKERS = int(os.environ.get("ASGI_WSGI_WORKERS", "4"))
+
+
+class Offload:
+    """A thread pool of `workers` threads behind an asyncio semaphore of the same size."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"asgi-{name}")
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Only touched from the event loop thread
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.wait_ms = 0.0
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        queued = time.perf_counter()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.wait_ms += (time.perf_counter() - queued) * 1e3
+        self.in_flight += 1
+        try:
+            # In the caller's context, so stage timings reach the request's collect_timings
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, contextvars.copy_context().run, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "avg_wait_ms": self.wait_ms / self.completed if self.completed else 0.0,
+        }
+
+
+DB = Offload("db", ASGI_DB_WORKERS)
+SEARCH = Offload("search", ASGI_SEARCH_WORKERS)
+WSGI = Offload("wsgi", ASGI_WSGI_WORKERS)
+
+
+class BadRequest(Exception):
+    pass
+
+
+class Request:
+    def __init__(self, scope: Dict[str, Any], body: bytes):
+        self.scope = scope
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.body = body
+        self.args = MultiDict(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+        self.headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", ())}
+
+    def json(self) -> Dict[str, Any]:
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise BadRequest("request body must be JSON")
+        if not isinstance(data, dict):
+            raise BadRequest("request body must be a JSON object")
+        return data
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _send(send, status: int, body: bytes, content_type: str = "application/json",
+                headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())] + (headers or []),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, payload: Any, status: int = 200) -> None:
+    await _send(send, status, flask_app.json.dumps_bytes(payload))
+
+
+# ─── Native routes ─────────────────────────────────────────────────────────
+async def optimize_endpoint(req: Request, send) -> None:
+    data = req.json()
+    query = data.get("query", "")
+    customer_id = data.get("customer_id", "default")
+    profile = resolve_profile(data.get("profile") or req.args.get("profile"))
+    if profile is None:
+        return await _send_json(send, {"ok": False, "error": "profile must be one of minimal, standard, debug"}, 400)
+    try:
+        stream_format = _stream_format(data.get("stream"), req.headers.get("accept", ""))
+    except ValueError as e:
+        return await _send_json(send, {"ok": False, "error": str(e)}, 400)
+    if stream_format:
+        return await _stream_optimize(send, query, customer_id, profile, stream_format)
+
+    with collect_timings(wants_timings(req.headers.get("x-debug-timings"))) as timings:
+        entry = _query_entry(query)
+        with stage_timer("boost_lookup"):
+            learned_boost = await DB.run(get_metrics_store().get_learned_domain_boost, entry.sigs["intent"])
+        result = _optimize_scored(entry, learned_boost, customer_id)
+
+        # COMMENTED OUT: search integration (see app.optimize_route); provider calls block, so they
+        # run on the search executor
+        # result["search_configured"] = is_search_configured()
+        # result["search_provider"] = get_search_provider_name()
+        # result["selected_articles"] = []
+        # if is_search_configured():
+        #     try:
+        #         search_results, provider_used = await SEARCH.run(
+        #             lambda: fetch_search_results(query, num=15, ttl_s=search_ttl(result["sigs"])))
+        #         result["selected_articles"] = _search_results_to_articles(search_results)
+        #         result["search_provider"] = provider_used
+        #     except Exception as e:
+        #         flask_app.logger.warning("Search failed for %r: %s", query[:50], e)
+        result["search_configured"] = False
+        result["search_provider"] = None
+        result["selected_articles"] = []
+
+        # The write-behind queue can block when full, so hand the event over off the loop
+        with stage_timer("event_submit"):
+            await DB.run(get_event_writer().submit, _conversion_event(result, query, customer_id))
+    payload = shape_response(result, profile, CATALOG_DOCUMENT["version"])
+    if timings is not None:
+        payload["timings"] = timings
+    body, serialize_ms = timed_dumps(flask_app.json, payload)
+    RESPONSE_STATS.observe(profile, len(body), serialize_ms)
+    observe_stage("serialization", serialize_ms / 1e3)
+    await _send(send, 200, body)
+
+
+async def _stream_optimize(send, query: str, customer_id: str, profile: str, stream_format: str) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", STREAM_MIMETYPES[stream_format].encode()),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ],
+    })
+    # Each stage may touch SQLite or search, so the generator is advanced on the db executor
+    events = _optimize_events(query, customer_id, profile)
+    while True:
+        event = await DB.run(next, events, None)
+        if event is None:
+            break
+        frame = _stream_frame(event[0], event[1], stream_format).encode()
+        await send({"type": "http.response.body", "body": frame, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def feedback_endpoint(req: Request, send) -> None:
+    payload, status = await DB.run(record_feedback, req.json())
+    await _send_json(send, payload, status)
+
+
+async def learn_endpoint(req: Request, send) -> None:
+    payload, status = await DB.run(learn_payload, req.args)
+    if status == 200:
+        payload["asgi"] = {pool.name: pool.stats() for pool in (DB, SEARCH, WSGI)}
+    await _send_json(send, payload, status)
+
+
+def _pool_metrics():
+    for pool in (DB, SEARCH, WSGI):
+        yield from stats_families("optimizer_asgi_pool", "ASGI executor", pool.stats(),
+                                  counters=("completed",), labels={"pool": pool.name})
+
+
+register_collector(_pool_metrics)
+
+
+ROUTES = {
+    ("POST", "/optimize"): optimize_endpoint,
+    ("POST", "/feedback"): feedback_endpoint,
+    ("GET", "/learn"): learn_endpoint,
+}
+
+
+# ─── Everything else: the Flask app through WSGI ───────────────────────────
+def _wsgi_environ(req: Request) -> Dict[str, Any]:
+    scope = req.scope
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": req.method,
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": req.path.encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(req.body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in req.headers.items():
+        key = name.upper().replace("-", "_")
+        if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[key] = value
+        else:
+            key = "HTTP_" + key
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # The body is already buffered; chunked requests get a length too
+    environ["CONTENT_LENGTH"] = str(len(req.body))
+    return environ
+
+
+def _call_wsgi(environ: Dict[str, Any]) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+    started: Dict[str, Any] = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+    chunks = flask_app(environ, start_response)
+    try:
+        body = b"".join(chunks)
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+    return started["status"], started["headers"], body
+
+
+async def _wsgi_endpoint(req: Request, send) -> None:
+    status, headers, body = await WSGI.run(_call_wsgi, _wsgi_environ(req))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+# ─── ASGI application ──────────────────────────────────────────────────────
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await DB.run(get_metrics_store)  # open the learning DB before the first request
+            await DB.run(get_retention_worker)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await DB.run(get_event_writer().flush, 5.0)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        raise ValueError(f"unsupported ASGI scope type {scope['type']!r}")
+    req = Request(scope, await _read_body(receive))
+    handler = ROUTES.get((req.method, req.path), _wsgi_endpoint)
+    try:
+        await handler(req, send)
+    except BadRequest as e:
+        await _send_json(send, {"ok": False, "error": str(e)}, 400)
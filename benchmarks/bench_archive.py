@@ -0,0 +1,142 @@
+"""
+Event archive scans vs the JSON columns of conversion_events.
+
+Builds --events synthetic events as day partitions of the columnar archive (event_archive)
+and times EventArchive.publisher_totals over all of them, for one cluster, and for one
+customer. For reference, the same per-(cluster, publisher) totals are computed the way an
+ad-hoc analysis of conversion_events has to: SELECT the JSON source lists and json.loads
+each row, over --sql-events rows. Reported per case: events scanned per second, and the
+archive's bytes per event.
+
+Usage:
+  python benchmarks/bench_archive.py --events 2000000 --json archive.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from event_archive import ArchivedEvent, EventArchive, np  # noqa: E402
+from results import write_results  # noqa: E402
+from signal_engine import INTENT_PROFILES  # noqa: E402
+
+PUBLISHERS = ["Reuters", "AP", "Bloomberg", "Financial Times", "WSJ", "NYT", "TechCrunch", "arXiv", "Brookings",
+              "The Verge", "Nature", "Lancet", "Politico", "Axios", "Economist"]
+CUSTOMERS = [f"customer-{i}" for i in range(50)]
+
+
+def synthetic_events(n, rng, start_day):
+    clusters = list(INTENT_PROFILES)
+    for i in range(n):
+        purchased = rng.sample(PUBLISHERS, rng.randint(1, 4))
+        cited = [p for p in purchased if rng.random() < 0.5]
+        feedback = rng.random() < 0.3
+        quality = rng.random() if feedback else None
+        yield ArchivedEvent(
+            event_id=f"ev-{i}", timestamp=(start_day + timedelta(seconds=i)).isoformat() + "Z",
+            customer_id=rng.choice(CUSTOMERS), query_text=f"synthetic query {i % 5000}",
+            cluster=rng.choice(clusters), total_cost=round(rng.uniform(0, 8), 3),
+            answer_quality=quality, user_rating=None, correction_made=False,
+            purchased=purchased, cited=cited if feedback else [],
+            contributed_quality={p: quality or 0.0 for p in purchased}, has_quality=feedback,
+        )
+
+
+def build_archive(root, n, per_partition, seed):
+    rng = random.Random(seed)
+    archive = EventArchive(root)
+    day = date(2025, 1, 1)
+    batch = []
+    for event in synthetic_events(n, rng, date(2025, 1, 1)):
+        batch.append(event)
+        if len(batch) >= per_partition:
+            archive.commit([archive.stage(day.toordinal(), batch)])
+            day += timedelta(days=1)
+            batch = []
+    if batch:
+        archive.commit([archive.stage(day.toordinal(), batch)])
+    return archive
+
+
+def json_scan(db_path):
+    """Per-(cluster, publisher) purchases/citations/cost the way the JSON columns allow."""
+    totals = {}
+    conn = sqlite3.connect(db_path)
+    for cluster, purchased_json, cited_json, cost in conn.execute(
+            "SELECT query_cluster, sources_purchased, sources_cited, total_cost FROM events"):
+        cited = set(json.loads(cited_json))
+        for pub in json.loads(purchased_json):
+            acc = totals.setdefault((cluster, pub), [0, 0, 0.0, 0])
+            acc[0] += 1
+            acc[1] += pub in cited
+            acc[2] += cost
+            acc[3] += 1
+    conn.close()
+    return totals
+
+
+def build_sql(db_path, n, seed):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE events (query_cluster TEXT, sources_purchased TEXT, sources_cited TEXT, total_cost REAL)")
+    conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?)", (
+        (e.cluster, json.dumps(e.purchased), json.dumps(e.cited), e.total_cost)
+        for e in synthetic_events(n, rng, date(2025, 1, 1))))
+    conn.commit()
+    conn.close()
+
+
+def timed_scan(fn, events):
+    start = time.perf_counter()
+    fn()
+    wall = time.perf_counter() - start
+    return {"events": events, "ops_per_s": events / wall, "scan_ms": wall * 1e3}
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--events", type=int, default=1_000_000, help="Archived events to scan")
+    p.add_argument("--per-partition", type=int, default=50_000, help="Events per day partition")
+    p.add_argument("--sql-events", type=int, default=100_000, help="Rows for the JSON-column reference scan")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--json", help="Write results to this file")
+    args = p.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_archive_")
+    start = time.perf_counter()
+    archive = build_archive(os.path.join(tmp, "archive"), args.events, args.per_partition, args.seed)
+    stats = archive.stats()
+    print(f"built {stats['events']} events in {stats['partitions']} partitions, {stats['bytes'] / 1e6:.1f} MB "
+          f"({stats['bytes'] / max(stats['events'], 1):.1f} B/event, {stats['compression_ratio']:.1f}x) "
+          f"in {time.perf_counter() - start:.1f} s; engine {'numpy' if np is not None else 'python'}")
+
+    results = {
+        "archive_full": timed_scan(lambda: archive.publisher_totals(), args.events),
+        "archive_cluster": timed_scan(lambda: archive.publisher_totals(query_cluster="breaking_news"), args.events),
+        "archive_customer": timed_scan(lambda: archive.publisher_totals(customer_id=CUSTOMERS[0]), args.events),
+    }
+    results["archive_full"]["bytes_per_event"] = stats["bytes"] / max(stats["events"], 1)
+    db_path = os.path.join(tmp, "events.db")
+    build_sql(db_path, args.sql_events, args.seed)
+    results["json_columns"] = timed_scan(lambda: json_scan(db_path), args.sql_events)
+    for name, r in results.items():
+        print(f"{name:>17}: {r['ops_per_s']:12,.0f} events/s  {r['scan_ms']:9.1f} ms for {r['events']:,} events")
+    if args.json:
+        write_results(args.json, "archive", results, {
+            "events": args.events, "per_partition": args.per_partition, "sql_events": args.sql_events,
+            "engine": "numpy" if np is not None else "python",
+        })
+        print(f"wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
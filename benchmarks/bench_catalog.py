@@ -0,0 +1,99 @@
+"""
+Benchmark: optimize()'s scoring + planning stage over large synthetic catalogs, scoring every
+source with score_source (full) vs SourceCatalog's Gate 1 pre-filter and column scoring.
+
+Before timing, checks that both paths select the same sources at the same cost and quality
+for every query (pre-filtering may only drop sources that Gate 1 would reject).
+
+Usage:
+  python benchmarks/bench_catalog.py                 # 10k and 100k sources
+  python benchmarks/bench_catalog.py --sizes 1000 10000 -q 100
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import SOURCES, SourceCatalog, _plan_purchase, extract_signals, score_source  # noqa: E402
+from bench_signals import SAMPLE_QUERIES, random_queries  # noqa: E402
+
+_TOPICS = (
+    "finance economics markets business politics geopolitics trade news general breaking culture "
+    "tech startups AI policy research science engineering reference history health medical clinical "
+    "analysis product sports travel food energy climate law regulation government education"
+).split()
+_TIERS = ("premium", "mid", "wire", "free")
+
+
+def synthetic_sources(n, seed=11):
+    """The real catalog plus n - len(SOURCES) generated publishers with unique names."""
+    rng = random.Random(seed)
+    out = list(SOURCES)
+    for i in range(max(n - len(SOURCES), 0)):
+        tier = rng.choices(_TIERS, weights=(1, 3, 1, 2))[0]
+        price = 0.0 if tier == "free" else round(rng.uniform(0.05, 5.0), 2)
+        out.append({
+            "name": f"Publisher {i:06d}",
+            "price": price,
+            "auth": round(rng.uniform(0.3, 0.97), 2),
+            "topics": rng.sample(_TOPICS, 3),
+            "freshH": rng.choice((1, 2, 3, 4, 6, 8, 12, 18, 24, 36, 48, 72, 168, 720)),
+            "type": tier,
+            "domains": [f"publisher{i}.example"],
+        })
+    return out
+
+
+def full_plan(sources, catalog, sigs, learned_boost):
+    scored = [{**s, **score_source(sigs, s, learned_boost)} for s in sources]
+    return _plan_purchase(sigs, scored, "bench", catalog=catalog)
+
+
+def catalog_plan(catalog, sigs, learned_boost):
+    return _plan_purchase(sigs, catalog.scored(sigs, learned_boost), "bench", catalog=catalog)
+
+
+def _summary(result):
+    return ([s["name"] for s in result["selected"]], result["smartCost"], result["smartQ"], result["naiveCost"])
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    p.add_argument("-q", "--queries", type=int, default=40, help="Queries timed per size")
+    args = p.parse_args()
+
+    all_sigs = [extract_signals(q) for q in SAMPLE_QUERIES + random_queries(args.queries)][:args.queries]
+    boosts = [{}, {"Reuters": 0.2, "Publisher 000042": 0.6}]
+    for n in args.sizes:
+        sources = synthetic_sources(n)
+        start = time.perf_counter()
+        catalog = SourceCatalog(sources, prefilter_min=0)
+        build_ms = (time.perf_counter() - start) * 1e3
+
+        full_s = cat_s = 0.0
+        candidates = 0
+        for i, sigs in enumerate(all_sigs):
+            lb = boosts[i % len(boosts)]
+            start = time.perf_counter()
+            a = full_plan(sources, catalog, sigs, lb)
+            full_s += time.perf_counter() - start
+            start = time.perf_counter()
+            b = catalog_plan(catalog, sigs, lb)
+            cat_s += time.perf_counter() - start
+            if _summary(a) != _summary(b):
+                raise SystemExit(f"Plan mismatch at n={n} for intent {sigs['intent']}: {_summary(a)} != {_summary(b)}")
+            candidates += len(b["allScored"])
+        k = len(all_sigs)
+        print(f"n={n:>7}: build {build_ms:8.1f} ms  full {full_s / k * 1e3:8.2f} ms/query  "
+              f"catalog {cat_s / k * 1e3:7.2f} ms/query  speedup x{full_s / cat_s:6.1f}  "
+              f"avg candidates {candidates / k:9.1f} ({candidates / k / n:.1%})  plans identical")
+
+
+if __name__ == "__main__":
+    main()
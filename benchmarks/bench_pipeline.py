@@ -0,0 +1,164 @@
+"""
+Microbenchmarks for each stage of the routing pipeline, on intent-balanced synthetic queries
+(query_gen), with results written as JSON for run-to-run comparison (results.py).
+
+Stages (per call unless noted):
+  extract_signals        signal extraction, uncached
+  query_entry_cached     _query_entry on a warm QUERY_CACHE
+  score_source           score_source over every catalog source (one call per query)
+  catalog_scored         SourceCatalog.scored: Gate 1 pre-filter + column scoring
+  plan_purchase          bids and Gates 1–3 over scored sources
+  gate3_select           Gate 3 alone (GATE3_SOLVER) on Gate 1–2 output
+  learned_boost          MetricsStore.get_learned_domain_boost, cache disabled
+  optimize               optimize() end to end, in process
+  log_event              MetricsStore.log_event, one transaction per event
+  log_events_batch       MetricsStore.log_events, per event in batches of --batch
+  event_writer_submit    EventWriter.submit (write-behind enqueue)
+With --threads N, log_event also runs from N threads at once (log_event_xN).
+
+Usage:
+  python benchmarks/bench_pipeline.py --json pipeline.json
+  python benchmarks/bench_pipeline.py --sources 10000 --per-intent 20 --json big.json
+  python benchmarks/results.py pipeline.json big.json
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app  # noqa: E402
+from bench_catalog import synthetic_sources  # noqa: E402
+from bench_selection import eligible_for  # noqa: E402
+from learning import EventWriter, MetricsStore  # noqa: E402
+from query_gen import intent_queries  # noqa: E402
+from results import write_results  # noqa: E402
+
+
+def summarize(latencies_s, wall_s=None):
+    lat = sorted(x * 1e6 for x in latencies_s)
+    n = len(lat)
+    total = wall_s if wall_s is not None else sum(latencies_s)
+    return {
+        "n": n,
+        "ops_per_s": n / total if total > 0 else 0.0,
+        "mean_us": sum(lat) / n,
+        "p50_us": lat[n // 2],
+        "p99_us": lat[int(0.99 * (n - 1))],
+    }
+
+
+def timed(fn, args_list, iterations):
+    lat = []
+    for _ in range(iterations):
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            lat.append(time.perf_counter() - start)
+    return summarize(lat)
+
+
+def timed_threads(fn, args_list, threads):
+    """Split args_list over `threads` threads; per-call latency, throughput over wall time."""
+    lat = []
+    lock = threading.Lock()
+
+    def worker(chunk):
+        mine = []
+        for args in chunk:
+            start = time.perf_counter()
+            fn(*args)
+            mine.append(time.perf_counter() - start)
+        with lock:
+            lat.extend(mine)
+
+    workers = [threading.Thread(target=worker, args=(args_list[k::threads],)) for k in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return summarize(lat, time.perf_counter() - start)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--per-intent", type=int, default=50, help="Synthetic queries per intent")
+    p.add_argument("-n", "--iterations", type=int, default=3, help="Passes over the query set per stage")
+    p.add_argument("--sources", type=int, default=0, help="Synthetic catalog size (default: the real catalog)")
+    p.add_argument("--batch", type=int, default=256, help="Events per log_events batch")
+    p.add_argument("--threads", type=int, default=4, help="Threads for the concurrent log_event case (1 skips it)")
+    p.add_argument("--json", help="Write results to this file")
+    args = p.parse_args()
+
+    queries = [q for _, q in intent_queries(args.per_intent)]
+    sources = synthetic_sources(args.sources) if args.sources else app.SOURCES
+    catalog = app.SourceCatalog(sources) if args.sources else app.SOURCE_CATALOG
+    tmp = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.environ["LEARNING_DB"] = os.path.join(tmp, "app.db")  # optimize()'s own store
+    store = MetricsStore(os.path.join(tmp, "learning.db"), boost_cache_ttl=0)
+    all_sigs = [app.extract_signals(q) for q in queries]
+    scored = [catalog.scored(s) for s in all_sigs]
+    results = {}
+
+    def record(name, r):
+        results[name] = r
+        print(f"{name:>22}: {r['ops_per_s']:11.0f} ops/s  mean {r['mean_us']:9.1f} us  "
+              f"p50 {r['p50_us']:9.1f} us  p99 {r['p99_us']:9.1f} us")
+
+    record("extract_signals", timed(app.extract_signals, [(q,) for q in queries], args.iterations))
+    for q in queries:
+        app._query_entry(q)
+    record("query_entry_cached", timed(app._query_entry, [(q,) for q in queries], args.iterations))
+    record("score_source", timed(lambda s: [app.score_source(s, src) for src in sources],
+                                 [(s,) for s in all_sigs], args.iterations))
+    record("catalog_scored", timed(catalog.scored, [(s,) for s in all_sigs], args.iterations))
+    # _plan_purchase adds bid fields in place; give it fresh copies each call
+    record("plan_purchase", timed(lambda s, sc: app._plan_purchase(s, [dict(x) for x in sc], "bench", catalog=catalog),
+                                  list(zip(all_sigs, scored)), args.iterations))
+    select = app._select_greedy if app.GATE3_SOLVER == "greedy" else app._select_optimal
+    eligible = [(eligible_for(catalog, s), s, 12.0) for s in all_sigs]
+    record("gate3_select", timed(select, eligible, args.iterations))
+
+    # Seed the store so boost reads aggregate real rows
+    results_for_events = [app._plan_purchase(s, [dict(x) for x in sc], "bench", catalog=catalog)
+                          for s, sc in zip(all_sigs, scored)]
+    events = lambda: [app._conversion_event(r, q, "bench") for r, q in zip(results_for_events, queries)]  # noqa: E731
+    store.log_events(events())
+    record("learned_boost", timed(store.get_learned_domain_boost, [(s["intent"],) for s in all_sigs], args.iterations))
+    if not args.sources:
+        record("optimize", timed(app.optimize, [(q,) for q in queries], args.iterations))
+
+    record("log_event", timed(store.log_event, [(e,) for e in events()], 1))
+    batch_events = [e for _ in range(max(1, args.iterations)) for e in events()]
+    batches = [batch_events[i:i + args.batch] for i in range(0, len(batch_events), args.batch)]
+    start = time.perf_counter()
+    for b in batches:
+        store.log_events(b)
+    wall = time.perf_counter() - start
+    results["log_events_batch"] = {"n": len(batch_events), "ops_per_s": len(batch_events) / wall,
+                                   "mean_us": wall / len(batch_events) * 1e6,
+                                   "batch_ms": wall / len(batches) * 1e3}
+    print(f"{'log_events_batch':>22}: {results['log_events_batch']['ops_per_s']:11.0f} ops/s  "
+          f"mean {results['log_events_batch']['mean_us']:9.1f} us/event  {results['log_events_batch']['batch_ms']:.2f} ms/batch")
+    if args.threads > 1:
+        record(f"log_event_x{args.threads}", timed_threads(store.log_event, [(e,) for e in events()], args.threads))
+    writer = EventWriter(store)
+    record("event_writer_submit", timed(writer.submit, [(e,) for e in events()], 1))
+    writer.close()
+
+    if args.json:
+        write_results(args.json, "pipeline", results, {
+            "per_intent": args.per_intent, "iterations": args.iterations, "sources": len(sources),
+            "batch": args.batch, "threads": args.threads, "gate3_solver": app.GATE3_SOLVER,
+        })
+        print(f"wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark: /optimize response size and serialization time per response profile and
+JSON encoder (stdlib json as Flask's default provider uses it, vs orjson).
+
+Usage:
+  python benchmarks/bench_response.py
+  python benchmarks/bench_response.py -q 200 --sources 1000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import SOURCES, SourceCatalog, _plan_purchase, extract_signals  # noqa: E402
+from bench_catalog import synthetic_sources  # noqa: E402
+from bench_signals import SAMPLE_QUERIES, random_queries  # noqa: E402
+from response_profiles import PROFILES, catalog_document, orjson, shape_response  # noqa: E402
+
+
+def stdlib_dumps(obj):
+    # Flask's DefaultJSONProvider settings
+    return json.dumps(obj, ensure_ascii=True, sort_keys=True).encode()
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("-q", "--queries", type=int, default=100)
+    p.add_argument("--sources", type=int, default=0, help="Synthetic catalog size (default: the real catalog)")
+    p.add_argument("--repeat", type=int, default=5, help="Serializations timed per response")
+    args = p.parse_args()
+
+    sources = synthetic_sources(args.sources) if args.sources else SOURCES
+    catalog = SourceCatalog(sources)
+    version = catalog_document(sources)["version"]
+    results = []
+    for q in (SAMPLE_QUERIES + random_queries(args.queries))[:args.queries]:
+        sigs = extract_signals(q)
+        r = _plan_purchase(sigs, catalog.scored(sigs), "bench", catalog=catalog)
+        r.update(event_id="e" * 36, query_id="q" * 36, search_configured=False, search_provider=None, selected_articles=[])
+        results.append(r)
+
+    encoders = [("json", stdlib_dumps)]
+    if orjson is not None:
+        encoders.append(("orjson", orjson.dumps))
+    print(f"{len(results)} responses, catalog of {len(sources)} sources")
+    base = None
+    for profile in reversed(PROFILES):
+        shaped = [shape_response(r, profile, version) for r in results]
+        for name, dumps in encoders:
+            nbytes = sum(len(dumps(s)) for s in shaped)
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                for s in shaped:
+                    dumps(s)
+            us = (time.perf_counter() - start) / (args.repeat * len(shaped)) * 1e6
+            if base is None:
+                base = (nbytes, us)
+            print(f"{profile:>8} {name:>6}: {nbytes / len(shaped):9.0f} bytes/response ({nbytes / base[0]:6.1%})  "
+                  f"{us:8.1f} us/serialize (x{base[1] / us:5.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: Gate 3 greedy selection vs the branch-and-bound solver on the eligible sets
+produced by real and synthetic catalogs.
+
+Reports, per catalog size: mean value (utility - price_weight * price, the solver's
+objective), smartQ (mean utility of the picks, as /optimize reports it) and spend of each
+plan, the solver's spend delta against greedy (negative = it saves money), how often it
+improves on greedy's value, solve latency (mean / p99), and how often the time budget ran out.
+The first size is the real catalog, so its spend/smartQ deltas are what /optimize changes.
+
+Usage:
+  python benchmarks/bench_selection.py
+  python benchmarks/bench_selection.py --sizes 10 1000 10000 -q 200 --budget-ms 5
+  python benchmarks/bench_selection.py --price-weight 0   # raw-utility objective
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import GATE3_PRICE_WEIGHT, REDUNDANT, SOURCES, SourceCatalog, _select_greedy, extract_signals  # noqa: E402
+from bench_catalog import synthetic_sources  # noqa: E402
+from bench_signals import SAMPLE_QUERIES, random_queries  # noqa: E402
+from selection import solve_selection  # noqa: E402
+
+BUDGET = 12.0
+
+
+def eligible_for(catalog, sigs):
+    """Gate 1 + Gate 2 as in _plan_purchase, without bid simulation."""
+    out = []
+    for s in catalog.scored(sigs):
+        if s["freshH"] > sigs["maxFreshnessHours"] or s["utility"] < sigs["qualityThreshold"] - 0.12:
+            continue
+        if sigs["intent"] == "breaking_news" and s.get("semantic", 0) < 0.35:
+            continue
+        out.append(s)
+    out.sort(key=lambda s: s["utility"] / max(s["price"], 0.01), reverse=True)
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", type=int, nargs="+", default=[len(SOURCES), 1_000, 10_000])
+    p.add_argument("-q", "--queries", type=int, default=200)
+    p.add_argument("--budget-ms", type=float, default=5.0, help="Solver latency budget")
+    p.add_argument("--price-weight", type=float, default=GATE3_PRICE_WEIGHT,
+                   help="Utility per dollar of price (default: GATE3_PRICE_WEIGHT)")
+    args = p.parse_args()
+    lam = args.price_weight
+
+    all_sigs = [extract_signals(q) for q in SAMPLE_QUERIES + random_queries(args.queries)][:args.queries]
+    for n in args.sizes:
+        catalog = SourceCatalog(synthetic_sources(n), prefilter_min=0)
+        # Keep full collections over the catalog's objects out of the solver timings
+        gc.collect()
+        gc.freeze()
+        g_val = o_val = g_q = o_q = g_cost = o_cost = 0.0
+        improved = timeouts = 0
+        latencies = []
+        for sigs in all_sigs:
+            eligible = eligible_for(catalog, sigs)
+            selected, _, spent = _select_greedy(eligible, sigs, BUDGET)
+            value = sum(s["utility"] - lam * s["price"] for s in selected)
+            g_val += value
+            g_q += sum(s["utility"] for s in selected) / len(selected) if selected else 0
+            g_cost += spent
+            start = time.perf_counter()
+            r = solve_selection(eligible, BUDGET, sigs["minSources"], max(sigs["minSources"] + 1, 2),
+                                redundant=REDUNDANT, time_budget_ms=args.budget_ms, price_weight=lam)
+            latencies.append((time.perf_counter() - start) * 1e3)
+            picks = [eligible[i] for i in r.indices]
+            o_val += r.objective
+            o_q += sum(s["utility"] for s in picks) / len(picks) if picks else 0
+            o_cost += sum(s["price"] for s in picks)
+            improved += r.objective > value + 1e-9
+            timeouts += r.status != "optimal"
+        k = len(all_sigs)
+        latencies.sort()
+        print(f"n={n:>6} price_weight={lam:g}: value greedy {g_val / k:.3f} optimal {o_val / k:.3f}  "
+              f"smartQ greedy {g_q / k:.3f} optimal {o_q / k:.3f} ({(o_q / g_q - 1) * 100 if g_q else 0:+.1f}%)  "
+              f"spend greedy ${g_cost / k:.2f} optimal ${o_cost / k:.2f} "
+              f"(delta ${(o_cost - g_cost) / k:+.2f}/query, {(o_cost / g_cost - 1) * 100 if g_cost else 0:+.1f}%)  "
+              f"improved {improved / k:.0%}  "
+              f"solve {sum(latencies) / k:.2f} ms mean / {latencies[int(0.99 * (k - 1))]:.2f} ms p99  "
+              f"time-limited {timeouts / k:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Load test: Flask (gunicorn, or the threaded dev server) vs the ASGI entry point (uvicorn).
+
+Closed-loop clients, one keep-alive connection each, send a mix of requests: /optimize on
+intent-balanced synthetic queries (query_gen), with a /feedback for one in FEEDBACK_EVERY of
+them, and /learn for one in LEARN_EVERY. Each concurrency level runs for --seconds; reported
+per server and level: throughput, p50/p99 latency and errors. Servers are either already
+running (--target NAME=URL) or started by the script (--spawn), each on its own port with a
+throwaway LEARNING_DB.
+
+Spawned servers search against a local stub provider (Brave-shaped JSON after
+--stub-search-ms) instead of the internet, with the search cache off. It only carries
+traffic when the search block in optimize_route is enabled.
+
+Usage:
+  python benchmarks/bench_serving.py --spawn flask-dev gunicorn uvicorn --concurrency 1 16 64 --json serving.json
+  python benchmarks/bench_serving.py --target flask=http://127.0.0.1:5001 --target asgi=http://127.0.0.1:5002
+"""
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from query_gen import intent_queries  # noqa: E402
+from results import write_results  # noqa: E402
+
+FEEDBACK_EVERY = 4
+LEARN_EVERY = 50
+
+SPAWN = {
+    "flask-dev": lambda port, workers: [sys.executable, "-c",
+                                        f"from app import app; app.run(port={port}, threaded=True)"],
+    "gunicorn": lambda port, workers: ["gunicorn", "-w", str(workers), "--threads", "8", "-b", f"127.0.0.1:{port}", "app:app"],
+    "uvicorn": lambda port, workers: ["uvicorn", "asgi:app", "--workers", str(workers), "--port", str(port), "--no-access-log"],
+}
+
+
+def start_stub_search(latency_ms):
+    """Local Brave-shaped search API answering after latency_ms; returns (server, base URL)."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency_ms / 1e3)
+            q = parse_qs(urlsplit(self.path).query).get("q", [""])[0]
+            results = [{"title": f"{q} ({i})", "url": f"https://{d}/{i}", "description": q}
+                       for i, d in enumerate(("reuters.com", "apnews.com", "bloomberg.com", "example.org"))]
+            body = json.dumps({"web": {"results": results}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/res/v1/web/search"
+
+
+def _request(conn, method, path, body=None):
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    resp = conn.getresponse()
+    data = resp.read()
+    if resp.status >= 400:
+        raise OSError(f"HTTP {resp.status} on {path}")
+    return data
+
+
+def _client(base, queries, profile, stop, latencies, errors, seed):
+    parts = urlsplit(base)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+    i = seed
+    while not stop.is_set():
+        i += 1
+        start = time.perf_counter()
+        try:
+            if i % LEARN_EVERY == 0:
+                _request(conn, "GET", "/learn")
+            else:
+                data = json.loads(_request(conn, "POST", "/optimize", {"query": queries[i % len(queries)], "profile": profile}))
+                if i % FEEDBACK_EVERY == 0:
+                    _request(conn, "POST", "/feedback", {"event_id": data["event_id"], "sources_cited": []})
+            latencies.append((time.perf_counter() - start) * 1e3)
+        except Exception:
+            errors.append(1)
+            conn.close()
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+    conn.close()
+
+
+def run_level(base, concurrency, seconds, queries, profile):
+    stop = threading.Event()
+    latencies, errors = [], []
+    threads = [threading.Thread(target=_client, args=(base, queries, profile, stop, latencies, errors, k * 7919), daemon=True)
+               for k in range(concurrency)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join(timeout=30)
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": n,
+        "errors": len(errors),
+        "rps": n / seconds,
+        "p50_ms": latencies[n // 2] if n else None,
+        "p99_ms": latencies[int(0.99 * (n - 1))] if n else None,
+    }
+
+
+def _wait_ready(base, timeout=20.0):
+    parts = urlsplit(base)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=2)
+            _request(conn, "GET", "/learn")
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"server at {base} did not come up")
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--target", action="append", default=[], help="NAME=URL of a running server")
+    p.add_argument("--spawn", nargs="*", default=[], choices=sorted(SPAWN), help="Servers to start")
+    p.add_argument("--workers", type=int, default=4, help="Worker processes for spawned gunicorn/uvicorn")
+    p.add_argument("--port", type=int, default=5301, help="First port for spawned servers")
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--profile", default="minimal")
+    p.add_argument("--per-intent", type=int, default=50, help="Synthetic queries per intent")
+    p.add_argument("--stub-search-ms", type=float, default=300.0, help="Latency of the stub search provider")
+    p.add_argument("--json", help="Write results to this file")
+    args = p.parse_args()
+
+    targets = [tuple(t.split("=", 1)) for t in args.target]
+    procs = []
+    tmp = tempfile.mkdtemp(prefix="bench_serving_")
+    stub, stub_url = start_stub_search(args.stub_search_ms)
+    try:
+        for k, name in enumerate(args.spawn):
+            cmd = SPAWN[name](args.port + k, args.workers)
+            if shutil.which(cmd[0]) is None and cmd[0] != sys.executable:
+                print(f"skipping {name}: {cmd[0]} is not installed")
+                continue
+            env = {**os.environ, "LEARNING_DB": os.path.join(tmp, f"{name}.db"), "SEARCH_CACHE_ENABLED": "0",
+                   "BRAVE_API_KEY": "stub", "BRAVE_SEARCH_URL": stub_url, "RETENTION_INTERVAL_S": "0"}
+            procs.append(subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            targets.append((name, f"http://127.0.0.1:{args.port + k}"))
+        if not targets:
+            raise SystemExit("nothing to test: pass --target or --spawn")
+
+        queries = [q for _, q in intent_queries(args.per_intent)]
+        results = {}
+        for name, base in targets:
+            _wait_ready(base)
+            for c in args.concurrency:
+                r = run_level(base, c, args.seconds, queries, args.profile)
+                results[f"{name} c={c}"] = r
+                print(f"{name:>10} c={c:<4} {r['rps']:8.1f} req/s  p50 {r['p50_ms'] or 0:8.2f} ms  "
+                      f"p99 {r['p99_ms'] or 0:8.2f} ms  errors {r['errors']}")
+        if args.json:
+            write_results(args.json, "serving", results, {
+                "seconds": args.seconds, "profile": args.profile, "workers": args.workers,
+                "per_intent": args.per_intent, "stub_search_ms": args.stub_search_ms,
+            })
+            print(f"wrote {args.json}")
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait(timeout=10)
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
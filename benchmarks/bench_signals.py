@@ -0,0 +1,97 @@
+"""
+Microbenchmark: compiled signal engine (app.extract_signals) vs the pre-engine
+implementation (legacy_signals.extract_signals_legacy).
+
+Also checks that both produce identical output on every query before timing.
+
+Usage:
+  python benchmarks/bench_signals.py            # default 2000 iterations per query set
+  python benchmarks/bench_signals.py -n 10000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import extract_signals  # noqa: E402
+from legacy_signals import extract_signals_legacy  # noqa: E402
+
+SAMPLE_QUERIES = [
+    "What did the Fed announce today about interest rates?",
+    "NVIDIA Q3 2025 earnings revenue and profit breakdown",
+    "How does the EU AI Act regulation affect providers of general purpose models?",
+    "Should I take ibuprofen after a clinical trial of a new drug?",
+    "Latest GPT model release features and benchmark specs",
+    "Explain the history and background of the Bretton Woods system",
+    "what's happening in iran",
+    "Tariff impact on semiconductor supply chains versus domestic policy debate",
+    "official website for the SEC filing portal",
+    "how to sign up for a brokerage account, step by step guide",
+    "Comprehensive in-depth analysis of Apple vs Microsoft cloud strategy",
+    "breaking: merger announced between two major banks hours ago",
+    "",
+    "ok",
+]
+
+_VOCAB = (
+    "today latest breaking just announced earnings revenue profit q1 q2 q3 q4 2019 2023 2024 2025 2026 "
+    "should i we take invest buy sell policy regulation law act compliance clinical trial fda phase 2 "
+    "how does to explain why what is are the happened happening history overview versus vs. or either "
+    "impact effect official site guide tutorial comprehensive detailed in-depth deep dive $100 percent % "
+    "ipo ceo merger vote election launch down 5 up 3 the a in on Apple Tesla NVIDIA EU SEC Fed Iran "
+    "what's q12025 basispoints basis points a$5 5%5 in-depth sign-up _q1 ſell İstanbul ÜBER"
+).split()
+_SEPARATORS = [" ", " ", " ", "  ", "\n", ", ", "-", "."]
+
+
+def random_queries(n, seed=7):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        words = [rng.choice(_VOCAB) for _ in range(rng.randint(1, 16))]
+        if rng.random() < 0.3:
+            words = [w.upper() if rng.random() < 0.3 else w.capitalize() for w in words]
+        out.append("".join(w + rng.choice(_SEPARATORS) for w in words).strip())
+    return out
+
+
+def check_equivalence(queries):
+    for q in queries:
+        a, b = extract_signals(q), extract_signals_legacy(q)
+        if a != b:
+            raise SystemExit(f"Output mismatch for query {q!r}")
+
+
+def bench(fn, queries, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for q in queries:
+            fn(q)
+    elapsed = time.perf_counter() - start
+    calls = iterations * len(queries)
+    return elapsed / calls * 1e6, calls / elapsed
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("-n", "--iterations", type=int, default=2000, help="Passes over the sample query set")
+    args = p.parse_args()
+
+    fuzz = random_queries(5000)
+    check_equivalence(SAMPLE_QUERIES + fuzz)
+    print(f"equivalence: {len(SAMPLE_QUERIES) + len(fuzz)} queries identical")
+
+    for label, queries, n in (("sample", SAMPLE_QUERIES, args.iterations), ("random", fuzz[:200], max(args.iterations // 20, 1))):
+        legacy_us, legacy_qps = bench(extract_signals_legacy, queries, n)
+        engine_us, engine_qps = bench(extract_signals, queries, n)
+        print(f"{label:>7}: legacy {legacy_us:7.1f} us/query ({legacy_qps:8.0f} q/s)  "
+              f"engine {engine_us:7.1f} us/query ({engine_qps:8.0f} q/s)  speedup x{legacy_us / engine_us:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Learning storage backends under a multi-node workload, checked for consistency.
+
+Each of --nodes threads (or, with --processes, forked processes like gunicorn workers) plays
+one app node with its own store instance: it logs --events synthetic events in
+EventWriter-sized batches (re-logging some), then submits feedback on events that other
+nodes logged, some of it twice. The run is repeated per backend: SQLite (every node opens
+the same file) and, with --pg-url, PostgreSQL (every node its own pool, in a scratch schema
+that is dropped afterwards). Afterwards each backend must report the
+purchase/citation/event counts the workload implies for every (cluster, publisher), its
+check_aggregates must pass, and the backends must agree with each other; the script exits
+non-zero otherwise. Reported per backend: events logged and feedback applied per second.
+
+Usage:
+  python benchmarks/bench_storage.py
+  python benchmarks/bench_storage.py --processes --nodes 8
+  python benchmarks/bench_storage.py --pg-url postgresql://localhost/learning --nodes 8 --json storage.json
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from learning import ConversionEvent, MetricsStore  # noqa: E402
+from results import write_results  # noqa: E402
+from signal_engine import INTENT_PROFILES  # noqa: E402
+
+PUBLISHERS = ["Reuters", "AP", "Bloomberg", "Financial Times", "WSJ", "NYT", "TechCrunch", "arXiv", "Brookings",
+              "The Verge", "Nature", "Lancet"]
+
+
+def workload(nodes, events_per_node, seed):
+    """Per node: (events to log, feedback to submit), plus the events as finally logged and cited."""
+    rng = random.Random(seed)
+    clusters = list(INTENT_PROFILES)
+    start = date.today() - timedelta(days=20)
+    logged, feedback = [[] for _ in range(nodes)], [[] for _ in range(nodes)]
+    final = {}
+    for node in range(nodes):
+        for i in range(events_per_node):
+            event_id = f"n{node}-e{i}"
+            cluster = rng.choice(clusters)
+            day = start + timedelta(days=rng.randrange(21))
+            event = ConversionEvent(
+                event_id=event_id, query_id=event_id, query_text=f"query {i % 500}", customer_id=f"c{rng.randrange(20)}",
+                timestamp=f"{day.isoformat()}T12:00:00Z", query_cluster=cluster, intent=cluster,
+                sources_purchased=rng.sample(PUBLISHERS, rng.randint(1, 4)), total_cost=round(rng.uniform(0, 5), 2),
+            )
+            logged[node].append(event)
+            if rng.random() < 0.05:
+                # Re-logged (a retry after a timeout): replaces the first copy, never adds to it
+                event = ConversionEvent(**{**event.to_dict(), "sources_purchased": rng.sample(PUBLISHERS, 2)})
+                logged[node].append(event)
+            final[event_id] = (cluster, event.sources_purchased, [])
+    for event_id, (cluster, purchased, _) in list(final.items()):
+        if rng.random() < 0.6:
+            # Feedback arrives at another node than the one that logged the event
+            node = (int(event_id[1:event_id.index("-")]) + 1) % nodes
+            for _ in range(2 if rng.random() < 0.2 else 1):
+                cited = [p for p in purchased if rng.random() < 0.5] + (["Unbought"] if rng.random() < 0.1 else [])
+                feedback[node].append((event_id, cited, round(rng.random(), 3)))
+            final[event_id] = (cluster, purchased, cited)
+    return logged, feedback, final
+
+
+def expected_counts(final):
+    """(cluster, publisher) -> (purchases, citations, count) the workload should leave behind."""
+    out = {}
+    for cluster, purchased, cited in final.values():
+        for pub in purchased:
+            acc = out.setdefault((cluster, pub), [0, 0, 0])
+            acc[0] += 1
+            acc[1] += pub in cited
+            acc[2] += 1
+    return {key: tuple(v) for key, v in out.items()}
+
+
+def reported_counts(store):
+    perf = store.get_global_publisher_performance(min_sample_size=1)
+    return {
+        (cluster, pub): (s["purchase_count"], s["citation_count"], s["sample_size"])
+        for cluster, pubs in perf["by_cluster"].items() for pub, s in pubs.items()
+    }
+
+
+def run_node(store, logged, feedback, batch_size, barrier, marks):
+    """One node's workload. Every node finishes logging before any feedback is sent; one node stamps each phase."""
+    try:
+        if barrier.wait() == 0:
+            marks["start"] = time.perf_counter()
+        for j in range(0, len(logged), batch_size):
+            store.log_events(logged[j:j + batch_size])
+        if barrier.wait() == 0:
+            marks["logged"] = time.perf_counter()
+        for event_id, cited, quality in feedback:
+            if not store.submit_feedback(event_id, cited, answer_quality=quality):
+                raise RuntimeError(f"feedback for unknown event {event_id}")
+    except Exception:
+        barrier.abort()
+        raise
+    finally:
+        store.close()
+
+
+def run_backend(make_store, logged, feedback, batch_size, processes=False):
+    """Run the workload with one store per node (thread or process); returns (timings, a fresh store)."""
+    errors = []
+    if processes:
+        ctx = multiprocessing.get_context("fork")
+        barrier, marks = ctx.Barrier(len(logged)), ctx.Manager().dict()
+        workers = [
+            ctx.Process(target=lambda i=i: run_node(make_store(), logged[i], feedback[i], batch_size, barrier, marks))
+            for i in range(len(logged))
+        ]
+    else:
+        barrier, marks = threading.Barrier(len(logged)), {}
+
+        def node(i, store):
+            try:
+                run_node(store, logged[i], feedback[i], batch_size, barrier, marks)
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=node, args=(i, make_store())) for i in range(len(logged))]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    done = time.perf_counter()
+    if errors:
+        raise errors[0]
+    if any(getattr(w, "exitcode", 0) for w in workers):
+        raise RuntimeError("a node process failed")
+    log_s = marks["logged"] - marks["start"]
+    feedback_s = done - marks["logged"]
+    n_logged = sum(len(events) for events in logged)
+    n_feedback = sum(len(items) for items in feedback)
+    timings = {
+        "log": {"events": n_logged, "ops_per_s": n_logged / log_s, "wall_ms": log_s * 1e3},
+        "feedback": {"events": n_feedback, "ops_per_s": n_feedback / feedback_s, "wall_ms": feedback_s * 1e3},
+    }
+    return timings, make_store()
+
+
+def verify(name, store, expected):
+    """Problems found in one backend's state (empty when consistent)."""
+    problems = []
+    reported = reported_counts(store)
+    for key in sorted(set(expected) | set(reported)):
+        if expected.get(key) != reported.get(key):
+            problems.append(f"{name}: {key} expected {expected.get(key)}, reported {reported.get(key)}")
+    check = store.check_aggregates()
+    if not check["consistent"]:
+        problems.append(f"{name}: check_aggregates found {len(check['mismatches'])} aggregate and "
+                        f"{len(check['bucket_mismatches'])} bucket mismatches")
+    return problems, reported
+
+
+def postgres_store_factory(url):
+    """(factory, cleanup) for stores in a scratch schema of the database at url."""
+    import psycopg
+    from psycopg.conninfo import make_conninfo
+
+    from learning_pg import PostgresMetricsStore
+
+    schema = f"bench_storage_{uuid.uuid4().hex[:8]}"
+    with psycopg.connect(url, autocommit=True) as c:
+        c.execute(f"CREATE SCHEMA {schema}")
+    scoped = make_conninfo(url, options=f"-c search_path={schema}")
+
+    def cleanup():
+        with psycopg.connect(url, autocommit=True) as c:
+            c.execute(f"DROP SCHEMA {schema} CASCADE")
+
+    return (lambda: PostgresMetricsStore(scoped, boost_cache_ttl=0, min_size=1, max_size=2)), cleanup
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--nodes", type=int, default=4, help="Concurrent nodes (one store instance each)")
+    p.add_argument("--events", type=int, default=2000, help="Events logged per node")
+    p.add_argument("--batch", type=int, default=256, help="Events per log_events call (EVENT_BATCH_SIZE)")
+    p.add_argument("--processes", action="store_true", help="Run nodes as forked processes instead of threads")
+    p.add_argument("--pg-url", default=os.environ.get("LEARNING_DB_URL"),
+                   help="PostgreSQL to test against (default: LEARNING_DB_URL; SQLite only when unset)")
+    p.add_argument("--seed", type=int, default=11)
+    p.add_argument("--json", help="Write results to this file")
+    args = p.parse_args()
+
+    logged, feedback, final = workload(args.nodes, args.events, args.seed)
+    expected = expected_counts(final)
+    tmp = tempfile.mkdtemp(prefix="bench_storage_")
+    backends = {"sqlite": (lambda: MetricsStore(os.path.join(tmp, "learning.db"), boost_cache_ttl=0), lambda: None)}
+    if args.pg_url:
+        backends["postgres"] = postgres_store_factory(args.pg_url)
+
+    results, problems, reported = {}, [], {}
+    for name, (make_store, cleanup) in backends.items():
+        try:
+            timings, store = run_backend(make_store, logged, feedback, args.batch, args.processes)
+            found, reported[name] = verify(name, store, expected)
+            store.close()
+        finally:
+            cleanup()
+        problems += found
+        for phase, r in timings.items():
+            results[f"{name}_{phase}"] = r
+            print(f"{name:>8} {phase:>8}: {r['ops_per_s']:10,.0f}/s  {r['events']:7,} in {r['wall_ms']:8.1f} ms")
+        print(f"{name:>8}: {len(reported[name])} (cluster, publisher) rows, "
+              f"{'consistent' if not found else f'{len(found)} problems'}")
+    if len(reported) > 1 and len(set(map(lambda r: tuple(sorted(r.items())), reported.values()))) > 1:
+        problems.append("backends disagree on purchase/citation counts")
+    for line in problems[:20]:
+        print(line, file=sys.stderr)
+    if args.json:
+        write_results(args.json, "storage", results, {
+            "nodes": args.nodes, "events_per_node": args.events, "batch": args.batch, "processes": args.processes,
+            "backends": list(backends), "consistent": not problems,
+        })
+        print(f"wrote {args.json}")
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
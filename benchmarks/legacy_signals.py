@@ -0,0 +1,313 @@
+"""
+Pre-engine signal extraction, kept verbatim as the reference implementation for
+bench_signals.py (speed comparison and output-equivalence check). Not used by the app.
+"""
+
+import math
+import re
+
+
+def cos_sim(a, b):
+    wa = set(w for w in a.lower().split() if len(w) > 2)
+    wb = set(w for w in b.lower().split() if len(w) > 2)
+    if not wa or not wb:
+        return 0
+    inter = len(wa & wb)
+    return inter / math.sqrt(len(wa) * len(wb))
+
+
+def extract_signals_legacy(query):
+    q = query.lower()
+    words = q.split()
+
+    # ── Intent classification ──────────────────────────────────
+    intent_profiles = {
+        "financial_analysis": "earnings revenue profit stock market investment quarterly financial economics gdp tariff semiconductor fund",
+        "breaking_news":      "today latest breaking just announced hours minutes update urgent happened morning",
+        "tech_product":       "product launch release features review specs benchmark model gpt llm capabilities version",
+        "explainer":          "how does explain history background context overview understand mechanism works",
+        "policy":             "regulation law policy act eu government legislation compliance requirement providers",
+        "medical_clinical":   "clinical trial drug treatment therapy patient study health symptoms diagnosis results should take",
+    }
+    intent_scores = {k: cos_sim(q, v) for k, v in intent_profiles.items()}
+    sorted_intents = sorted(intent_scores.items(), key=lambda x: -x[1])
+    intent = sorted_intents[0][0]
+    top_intent_score = sorted_intents[0][1]
+    # "What happened in X" / entity-heavy ambiguous -> prefer news/wire
+    has_entity = bool(re.search(r"\b[A-Z][a-z]{2,}\b", query))
+    what_happened = bool(re.search(r"\bwhat('s|\s+is|\s+happened|\s+happening)\b", q))
+    # Override: (1) "what happened/happening" implies news even with lowercase "iran"; (2) ambiguous + entity
+    if what_happened or (top_intent_score < 0.12 and has_entity):
+        intent = "breaking_news"
+        top_intent_score = 0.5
+    semantic_raw = min(top_intent_score * 3.8 + 0.22, 0.98)
+
+    # ── DIMENSION 1: RELEVANCE ────────────────────────────────
+    entity_re = r'\b([A-Z][a-z]{1,}(?:\s[A-Z][a-z]{1,})*|[A-Z]{2,6})\b'
+    raw_entities = re.findall(entity_re, query)
+    skip = {'The', 'A', 'An', 'In', 'On', 'At', 'Is', 'It', 'If', 'Do', 'Be', 'We', 'My'}
+    entities = [e for e in raw_entities if len(e) > 1 and e not in skip]
+    entity_density_raw = min(len(entities) / 7, 1.0)
+
+    specific_markers = r'\b(q[1-4]|20[2-9]\d|\$[\d]+|percent|%|basis\s*points|ipo|ceo|cfo|merger|acquisition|exactly|specific|detail|result)\b'
+    specific_triggered = bool(re.search(specific_markers, q, re.IGNORECASE))
+    specificity_raw = 0.88 if specific_triggered else (0.65 if len(words) > 9 else 0.38)
+
+    templates = [
+        (r'\b(earnings|revenue|profit)\b.*\b(q[1-4]|quarter|annual)\b', "<company>_earnings_<period>", 0.22),
+        (r'\b(what\s+did|said|announced|statement)\b',                   "<speaker>_statement",         0.18),
+        (r'\b(clinical\s+trial|phase\s+[123]|fda)\b',                    "<medical_trial>",              0.20),
+        (r'\b(today|this\s+morning|just|breaking)\b',                    "<breaking_event>",             0.15),
+        (r'\b(compliance|regulation|act|law|requirement)\b',             "<policy_query>",               0.12),
+        (r'\b(should\s+i|should\s+we)\b',                                "<decision_query>",             0.10),
+    ]
+    matched_template = None
+    for pattern, label, boost in templates:
+        if re.search(pattern, query, re.IGNORECASE):
+            matched_template = {"label": label, "boost": boost}
+            break
+    template_boost_raw = 0.5 + (matched_template["boost"] if matched_template else 0)
+
+    relevance_composed = min(0.38*semantic_raw + 0.25*entity_density_raw + 0.22*specificity_raw + 0.15*template_boost_raw, 0.99)
+
+    # ── DIMENSION 2: CREDIBILITY ──────────────────────────────
+    high_stakes_pat = r'\b(should\s+i|should\s+we|invest|buy|sell|treatment|diagnosis|legal|liability|compliance|prescription|recommend)\b'
+    med_stakes_pat  = r'\b(impact|affect|influence|result|consequence|implication|effect)\b'
+    if re.search(high_stakes_pat, q, re.IGNORECASE):
+        stakes_raw   = 0.95
+        stakes_level = "high"
+    elif re.search(med_stakes_pat, q, re.IGNORECASE):
+        stakes_raw   = 0.68
+        stakes_level = "medium"
+    else:
+        stakes_raw   = 0.38
+        stakes_level = "low"
+
+    sensitivity_pat = r'\b(medical|clinical|legal|financial\s+advice|investment\s+advice|drug|diagnosis|prescription|liability|should\s+i\s+take)\b'
+    if re.search(sensitivity_pat, q, re.IGNORECASE):
+        sensitivity_raw   = 0.92
+        sensitivity_level = "high"
+    elif re.search(r'\b(finance|earnings|revenue|profit)\b', q, re.IGNORECASE):
+        sensitivity_raw   = 0.72
+        sensitivity_level = "finance"
+    else:
+        sensitivity_raw   = 0.30
+        sensitivity_level = "general"
+
+    controversy_pat     = r'\b(policy|regulation|debate|controversial|ban|restrict|versus|vs\.|disagree|dispute|different\s+views)\b'
+    controversy_triggered = bool(re.search(controversy_pat, q, re.IGNORECASE))
+    controversy_raw     = 0.78 if controversy_triggered else 0.28
+
+    corroboration_raw = min(stakes_raw*0.5 + controversy_raw*0.3 + (0.25 if intent == "breaking_news" else 0), 1.0)
+
+    credibility_composed = min(0.38*stakes_raw + 0.28*sensitivity_raw + 0.22*corroboration_raw + 0.12*controversy_raw, 0.99)
+
+    # ── DIMENSION 3: FRESHNESS ────────────────────────────────
+    now_pat    = r'\b(today|this\s+morning|just|breaking|right\s+now|announced|hours\s+ago|minutes\s+ago|tonight|yesterday)\b'
+    recent_pat = r'\b(this\s+week|this\s+month|latest|recent|new|2025|2026|q[1-4]\s*202[456])\b'
+    archive_pat= r'\b(history|background|how\s+does|explain|what\s+is|overview|2020|2019|2018|originally)\b'
+
+    if re.search(now_pat, q, re.IGNORECASE):
+        velocity_raw   = 1.0
+        velocity_level = "real-time"
+    elif re.search(recent_pat, q, re.IGNORECASE):
+        velocity_raw   = 0.74
+        velocity_level = "recent"
+    elif re.search(archive_pat, q, re.IGNORECASE):
+        velocity_raw   = 0.12
+        velocity_level = "archival"
+    else:
+        velocity_raw   = 0.38
+        velocity_level = "neutral"
+
+    time_markers = []
+    if re.search(now_pat, q, re.IGNORECASE):
+        time_markers.append("real-time (<4h)")
+    if re.search(recent_pat, q, re.IGNORECASE):
+        time_markers.append("recent (<7d)")
+    if re.search(r'\b(q[1-4])\b', q, re.IGNORECASE):
+        time_markers.append("quarterly")
+    if re.search(r'\b(202[3456])\b', q):
+        time_markers.append("year-specific")
+    temporal_raw = min(velocity_raw + len(time_markers)*0.04, 1.0)
+
+    event_pat        = r'\b(earnings|ipo|merger|acquisition|rate\s+decision|vote|election|launch|announcement|profit\s+warning|down\s+\d|up\s+\d)\b'
+    event_triggered  = bool(re.search(event_pat, q, re.IGNORECASE))
+    event_urgency_raw = 0.82 if event_triggered else 0.22
+
+    half_life_map = {
+        "financial_analysis": 0.88,
+        "breaking_news":      1.0,
+        "tech_product":       0.58,
+        "explainer":          0.10,
+        "policy":             0.42,
+        "medical_clinical":   0.36,
+    }
+    decay_raw = half_life_map.get(intent, 0.40)
+
+    freshness_composed = min(0.42*velocity_raw + 0.26*temporal_raw + 0.22*event_urgency_raw + 0.10*decay_raw, 0.99)
+    freshness_required = freshness_composed > 0.52
+    if freshness_required:
+        max_freshness_hours = 4 if velocity_raw >= 0.9 else 12
+    elif freshness_composed > 0.4:
+        max_freshness_hours = 48
+    else:
+        max_freshness_hours = 9999
+
+    # ── DIMENSION 4: DEPTH ────────────────────────────────────
+    analytical_pat      = r'\b(analyze|analysis|impact|implication|compare|versus|tradeoff|why\s+is|explain\s+why|how\s+does|what\s+are\s+the)\b'
+    analytical_triggered = bool(re.search(analytical_pat, q, re.IGNORECASE))
+    complexity_raw = min(0.60*(0.88 if analytical_triggered else 0.35) + 0.40*(len(words)/18), 0.99)
+
+    depth_pat             = r'\b(comprehensive|detailed|in-depth|full\s+analysis|thorough|breakdown|deep\s+dive|specific|exactly)\b'
+    depth_keywords_triggered = bool(re.search(depth_pat, q, re.IGNORECASE))
+    if depth_keywords_triggered:
+        depth_required = 0.92
+    elif complexity_raw > 0.62:
+        depth_required = 0.72
+    else:
+        depth_required = 0.32
+
+    nav_pat  = r'\b(official|site|website|page|homepage|portal)\b'
+    trans_pat= r'\b(how\s+to|steps\s+to|guide|tutorial|sign\s+up)\b'
+    if re.search(nav_pat, q, re.IGNORECASE):
+        question_type = "navigational"
+    elif re.search(trans_pat, q, re.IGNORECASE):
+        question_type = "transactional"
+    else:
+        question_type = "informational"
+    question_type_score = {"informational": 0.65, "navigational": 0.30, "transactional": 0.48}[question_type]
+
+    ambiguity_pat      = r'\b(or|versus|vs\.|either|unclear|depends|different\s+views|perspective|both\s+sides)\b'
+    ambiguity_triggered = bool(re.search(ambiguity_pat, q, re.IGNORECASE))
+    ambiguity_raw = 0.76 if ambiguity_triggered else 0.24
+
+    depth_composed = min(0.40*complexity_raw + 0.32*depth_required + 0.18*question_type_score + 0.10*ambiguity_raw, 0.99)
+
+    # ── Derived thresholds ────────────────────────────────────
+    quality_threshold = min(0.60 + credibility_composed*0.30 + depth_composed*0.08, 0.96)
+    min_sources = 2 if corroboration_raw > 0.60 else 1
+
+    # ── Facebook-paper style: Query Understanding Stack (Fig 3) ──
+    # Content type needed (purchase intent)
+    content_type_map = {
+        "breaking_news": "real-time news",
+        "financial_analysis": "analysis + data",
+        "tech_product": "product/review content",
+        "explainer": "background / reference",
+        "policy": "policy / regulatory",
+        "medical_clinical": "clinical / medical",
+    }
+    freshness_requirement = (
+        "real-time" if velocity_raw >= 0.9 else
+        "24h" if velocity_raw >= 0.6 else
+        "7days" if velocity_raw >= 0.3 else "evergreen"
+    )
+    topical_domain = intent.replace("_", " ")  # intent doubles as primary domain
+    if "tariff" in q or "trade" in q or "geopolit" in q or "policy" in q:
+        topical_domain = topical_domain + " + geopolitics"
+    if re.search(r"\b(earnings|revenue|profit|q[1-4])\b", q):
+        topical_domain = topical_domain + " + earnings"
+
+    # Trending detection (FB §3.1): heuristic = breaking + real-time
+    trending_signal = intent == "breaking_news" and velocity_raw >= 0.9
+
+    # Query cluster: richer segment for routing/learning (e.g. financial_earnings_geopolitical)
+    cluster_parts = [intent]
+    if matched_template and matched_template.get("label"):
+        cluster_parts.append(matched_template["label"].replace("<", "").replace(">", "").replace("_", ""))
+    if controversy_triggered:
+        cluster_parts.append("multi_perspective")
+    query_cluster = "_".join(cluster_parts)[:48]
+
+    # Routing rules fired (decision flow that drives tier/source selection)
+    routing_rules_fired = []
+    if freshness_required and velocity_raw >= 0.9:
+        routing_rules_fired.append("premium_real_time")
+    if corroboration_raw > 0.60:
+        routing_rules_fired.append("corroboration_required")
+    if credibility_composed > 0.75:
+        routing_rules_fired.append("authoritative_required")
+    if intent in ("financial_analysis", "medical_clinical", "policy") and sensitivity_raw > 0.5:
+        routing_rules_fired.append("domain_specialist_preferred")
+    if not freshness_required and velocity_raw < 0.4:
+        routing_rules_fired.append("free_first_ok")
+    if depth_required > 0.7:
+        routing_rules_fired.append("depth_required")
+
+    # Tier strategy (which content tiers we consider)
+    if quality_threshold >= 0.88 and (freshness_required or intent in ("financial_analysis", "medical_clinical")):
+        tier_strategy = "premium_required"
+    elif not freshness_required and quality_threshold < 0.75:
+        tier_strategy = "free_first_then_mid"
+    else:
+        tier_strategy = "balanced_premium_and_mid"
+
+    query_understanding = {
+        "purchase_intent": {
+            "content_type_needed": content_type_map.get(intent, intent),
+            "topical_domain": topical_domain.strip(),
+            "freshness_requirement": freshness_requirement,
+            "quality_threshold": round(quality_threshold, 3),
+        },
+        "entity_linking": entities,
+        "intent_template": matched_template["label"] if matched_template else None,
+        "trending_signal": trending_signal,
+        "query_cluster": query_cluster,
+        "routing_rules_fired": routing_rules_fired,
+        "tier_strategy": tier_strategy,
+    }
+
+    return {
+        "queryUnderstanding": query_understanding,
+        "intent":          intent,
+        "intentScores":    intent_scores,
+        "entities":        entities,
+        "matchedTemplate": matched_template,
+        "relevance": {
+            "semantic":         semantic_raw,
+            "entityDensity":    entity_density_raw,
+            "specificity":      specificity_raw,
+            "specificTriggered": specific_triggered,
+            "wordCount":        len(words),
+            "templateBoost":    template_boost_raw,
+            "composed":         relevance_composed,
+        },
+        "credibility": {
+            "stakes":             stakes_raw,
+            "stakesLevel":        stakes_level,
+            "sensitivity":        sensitivity_raw,
+            "sensitivityLevel":   sensitivity_level,
+            "corroboration":      corroboration_raw,
+            "controversy":        controversy_raw,
+            "controversyTriggered": controversy_triggered,
+            "composed":           credibility_composed,
+        },
+        "freshness": {
+            "velocity":          velocity_raw,
+            "velocityLevel":     velocity_level,
+            "temporalMarkers":   temporal_raw,
+            "timeMarkers":       time_markers,
+            "eventUrgency":      event_urgency_raw,
+            "eventTriggered":    event_triggered,
+            "decayRate":         decay_raw,
+            "composed":          freshness_composed,
+            "required":          freshness_required,
+            "maxFreshnessHours": max_freshness_hours,
+        },
+        "depth": {
+            "complexity":             complexity_raw,
+            "analyticalTriggered":    analytical_triggered,
+            "wordCount":              len(words),
+            "depthRequired":          depth_required,
+            "depthKeywordsTriggered": depth_keywords_triggered,
+            "questionType":           question_type,
+            "questionTypeScore":      question_type_score,
+            "ambiguity":              ambiguity_raw,
+            "ambiguityTriggered":     ambiguity_triggered,
+            "composed":               depth_composed,
+        },
+        "qualityThreshold": quality_threshold,
+        "minSources":       min_sources,
+        "maxFreshnessHours": max_freshness_hours,
+    }
@@ -0,0 +1,115 @@
+"""
+Synthetic query generator covering every intent extract_signals classifies.
+
+Queries are built from per-intent templates filled with topic words, entities, time
+phrases and modifiers, then kept only if extract_signals assigns the intended intent, so
+a generated set has exactly the requested mix. Deterministic for a given seed.
+
+  from query_gen import intent_queries
+  queries = intent_queries(50)            # 50 per intent, list of (intent, query)
+
+  python benchmarks/query_gen.py -n 5     # print a sample
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import extract_signals  # noqa: E402
+from signal_engine import INTENT_PROFILES  # noqa: E402
+
+ENTITIES = ["Apple", "NVIDIA", "Tesla", "Microsoft", "the Fed", "the ECB", "OpenAI", "Pfizer", "the SEC", "Iran", "China",
+            "the EU", "Amazon", "Moderna", "Google", "Boeing", "the IMF", "Japan", "Anthropic", "Novartis"]
+SUFFIXES = ["", "", "", " for investors", " in Europe", " and what it means", " for small businesses", " vs last year"]
+TIME = ["today", "this morning", "just now", "hours ago", "this week", "in Q3 2025", "yesterday", "", "", ""]
+MODIFIERS = ["detailed", "in-depth", "exactly", "comprehensive", "quick", "", "", ""]
+
+TEMPLATES = {
+    "financial_analysis": [
+        "{entity} {time} earnings revenue and profit breakdown",
+        "{mod} analysis of {entity} stock market investment outlook",
+        "how did {entity} quarterly financial results affect the fund {time}",
+        "tariff impact on semiconductor revenue and gdp for {entity}",
+    ],
+    "breaking_news": [
+        "what happened with {entity} {time}",
+        "breaking: {entity} announced an urgent update {time}",
+        "latest news on {entity} just announced hours ago",
+        "{entity} update this morning",
+    ],
+    "tech_product": [
+        "{entity} new model release features and specs",
+        "{mod} review of the latest {entity} product launch",
+        "gpt llm benchmark capabilities of the new {entity} version",
+        "{entity} launch: release specs and benchmark review",
+    ],
+    "explainer": [
+        "explain the history and background of {entity}",
+        "how does {entity} work, an overview of the mechanism",
+        "{mod} overview to understand the context of {entity}",
+        "background and history: how does {entity} work",
+    ],
+    "policy": [
+        "how does the EU AI act regulation affect {entity}",
+        "{entity} compliance requirement under the new government legislation",
+        "policy debate over the law regulating {entity} providers",
+        "{mod} guide to {entity} regulation and policy requirement",
+    ],
+    "medical_clinical": [
+        "should I take the drug from the {entity} clinical trial",
+        "{entity} therapy treatment results for patient symptoms",
+        "clinical study of the new drug from {entity}: diagnosis and health results",
+        "{mod} treatment and therapy options after a clinical diagnosis",
+    ],
+}
+
+INTENTS = tuple(INTENT_PROFILES)
+
+
+def _fill(template, rng):
+    text = template.format(entity=rng.choice(ENTITIES), time=rng.choice(TIME), mod=rng.choice(MODIFIERS))
+    text = " ".join((text + rng.choice(SUFFIXES)).split())
+    if rng.random() < 0.2:
+        text = text[0].upper() + text[1:] + "?"
+    return text
+
+
+def intent_queries(per_intent=50, seed=13, max_attempts=50):
+    """
+    [(intent, query)]: per_intent queries for each intent, each classified as that intent.
+    Queries are distinct while the templates allow; beyond that, kept queries repeat.
+    """
+    rng = random.Random(seed)
+    out = []
+    for intent in INTENTS:
+        kept, seen = [], set()
+        for _ in range(per_intent * max_attempts):
+            if len(kept) >= per_intent:
+                break
+            q = _fill(rng.choice(TEMPLATES[intent]), rng)
+            if q in seen:
+                continue
+            seen.add(q)
+            if extract_signals(q)["intent"] == intent:
+                kept.append(q)
+        if not kept:
+            raise RuntimeError(f"no template produced a {intent} query")
+        out.extend((intent, kept[i % len(kept)]) for i in range(per_intent))
+    rng.shuffle(out)
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("-n", "--per-intent", type=int, default=5)
+    p.add_argument("--seed", type=int, default=13)
+    args = p.parse_args()
+    for intent, q in sorted(intent_queries(args.per_intent, args.seed)):
+        print(f"{intent:>18}  {q}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Replay logged conversion events through the current extract_signals/optimize and report how
+the plans differ from the ones originally bought, and how fast the pipeline runs.
+
+Events are streamed out of conversion_events in rowid order, --chunk rows at a time, over a
+read-only connection; each chunk is replayed in a worker process (--workers) and comes back
+as a summary, so memory stays flat however many events the DB holds. At most two chunks
+per worker are in flight.
+
+Per event the replay compares the new plan with the logged one: same source set or not,
+intent changes, cost delta, which sources were added or dropped, and (for events with
+feedback) how many of the sources the answer cited the new plan would still buy. Workers
+run with the query cache off, so timings are for uncached signal extraction and planning.
+Learned boosts are read from the replayed DB (its aggregates as of now, not as of each
+event) unless --no-boosts.
+
+Usage:
+  python benchmarks/replay.py learning.db
+  python benchmarks/replay.py learning.db --workers 8 --limit 1000000 --json replay.json
+  python benchmarks/replay.py learning.db --since 2025-06-01 --examples 20
+  python benchmarks/results.py replay_before.json replay.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from results import write_results  # noqa: E402
+
+TOP_SOURCES = 10
+
+_app = None
+_use_boosts = True
+
+
+def iter_event_chunks(db_path, chunk_size=2000, limit=None, since=None):
+    """Lists of (event_id, query_text, customer_id, intent, purchased, total_cost, cited), by rowid."""
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        last_rowid = 0
+        remaining = limit
+        while remaining is None or remaining > 0:
+            n = chunk_size if remaining is None else min(chunk_size, remaining)
+            rows = conn.execute("""
+                SELECT rowid, event_id, query_text, customer_id, intent, sources_purchased, total_cost, sources_cited
+                FROM conversion_events WHERE rowid > ? AND timestamp >= ? ORDER BY rowid LIMIT ?
+            """, (last_rowid, since or "", n)).fetchall()
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+            yield [(r[1], r[2], r[3], r[4], json.loads(r[5] or "[]"), r[6] or 0.0, json.loads(r[7] or "[]"))
+                   for r in rows]
+    finally:
+        conn.close()
+
+
+def _init_worker(db_path, use_boosts, seed):
+    """Import app in the worker with the replayed DB for boosts and the query cache off."""
+    global _app, _use_boosts
+    os.environ["LEARNING_DB"] = os.path.abspath(db_path)
+    os.environ["QUERY_CACHE_SIZE"] = "0"
+    import app
+    _app = app
+    _use_boosts = use_boosts
+    random.seed(seed + os.getpid())  # bid simulation draws other bidders at random
+
+
+def _empty_summary():
+    return {
+        "events": 0, "skipped": 0, "identical": 0, "changed": 0, "intent_changed": 0,
+        "old_cost": 0.0, "new_cost": 0.0, "cost_up": 0, "cost_down": 0,
+        "with_feedback": 0, "cited": 0, "cited_kept": 0,
+        "signals_s": 0.0, "plan_s": 0.0,
+        "added": Counter(), "dropped": Counter(), "intents": Counter(), "examples": [],
+    }
+
+
+def replay_chunk(rows, max_examples=0):
+    """Replay one chunk in this worker; returns its summary (see _merge)."""
+    app = _app
+    out = _empty_summary()
+    for event_id, query, customer_id, old_intent, old_sources, old_cost, cited in rows:
+        if not query:
+            out["skipped"] += 1
+            continue
+        start = time.perf_counter()
+        entry = app._query_entry(query)
+        mid = time.perf_counter()
+        if _use_boosts:
+            result = app._optimize_entry(entry, customer_id or "default")
+        else:
+            result = app._optimize_scored(entry, {}, customer_id or "default")
+        out["plan_s"] += time.perf_counter() - mid
+        out["signals_s"] += mid - start
+
+        new_sources = [s["name"] for s in result["selected"]]
+        new_intent = result["sigs"]["intent"]
+        new_cost = result["smartCost"]
+        old_set, new_set = set(old_sources), set(new_sources)
+        out["events"] += 1
+        out["old_cost"] += old_cost
+        out["new_cost"] += new_cost
+        if new_cost > old_cost + 1e-9:
+            out["cost_up"] += 1
+        elif new_cost < old_cost - 1e-9:
+            out["cost_down"] += 1
+        if new_intent != old_intent:
+            out["intent_changed"] += 1
+            out["intents"][f"{old_intent}->{new_intent}"] += 1
+        if cited:
+            out["with_feedback"] += 1
+            out["cited"] += len(cited)
+            out["cited_kept"] += sum(1 for name in cited if name in new_set)
+        if old_set == new_set:
+            out["identical"] += 1
+            continue
+        out["changed"] += 1
+        out["added"].update(new_set - old_set)
+        out["dropped"].update(old_set - new_set)
+        if len(out["examples"]) < max_examples:
+            out["examples"].append({
+                "event_id": event_id, "query": query[:120], "old_intent": old_intent, "new_intent": new_intent,
+                "old": old_sources, "new": new_sources, "cost_delta": round(new_cost - old_cost, 4),
+            })
+    return out
+
+
+def _merge(total, part, max_examples):
+    for key, value in part.items():
+        if key == "examples":
+            total[key].extend(value[:max(0, max_examples - len(total[key]))])
+        elif isinstance(value, Counter):
+            total[key].update(value)
+        else:
+            total[key] += value
+
+
+def run(db_path, workers, chunk_size, limit=None, since=None, use_boosts=True, max_examples=10, seed=13, progress=None):
+    """Replay the DB's events; returns (plan diff, throughput) dicts."""
+    total = _empty_summary()
+    read_s = 0.0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(db_path, use_boosts, seed)) as pool:
+        pending = set()
+        chunks = iter_event_chunks(db_path, chunk_size, limit, since)
+        while True:
+            read_start = time.perf_counter()
+            rows = next(chunks, None)
+            read_s += time.perf_counter() - read_start
+            if rows is not None:
+                pending.add(pool.submit(replay_chunk, rows, max_examples))
+            # Bounded in-flight work: wait once every worker has two chunks queued
+            while pending and (rows is None or len(pending) >= 2 * workers):
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    _merge(total, fut.result(), max_examples)
+                if progress:
+                    progress(total["events"] + total["skipped"], time.perf_counter() - start)
+                if rows is not None:
+                    break
+            if rows is None:
+                break
+    wall = time.perf_counter() - start
+
+    n = total["events"]
+    diff = {
+        "events": n,
+        "skipped_without_query": total["skipped"],
+        "identical_plans": total["identical"],
+        "changed_plans": total["changed"],
+        "changed_pct": 100.0 * total["changed"] / n if n else 0.0,
+        "intent_changed": total["intent_changed"],
+        "old_cost_total": round(total["old_cost"], 4),
+        "new_cost_total": round(total["new_cost"], 4),
+        "cost_delta_total": round(total["new_cost"] - total["old_cost"], 4),
+        "cost_delta_mean": (total["new_cost"] - total["old_cost"]) / n if n else 0.0,
+        "cost_increased": total["cost_up"],
+        "cost_decreased": total["cost_down"],
+        "events_with_feedback": total["with_feedback"],
+        "cited_sources": total["cited"],
+        "cited_still_purchased_pct": 100.0 * total["cited_kept"] / total["cited"] if total["cited"] else None,
+        "sources_added": dict(total["added"].most_common(TOP_SOURCES)),
+        "sources_dropped": dict(total["dropped"].most_common(TOP_SOURCES)),
+        "intent_transitions": dict(total["intents"].most_common()),
+        "examples": total["examples"],
+    }
+    throughput = {
+        "events": n,
+        "workers": workers,
+        "wall_s": wall,
+        "ops_per_s": n / wall if wall > 0 else 0.0,
+        "read_ms": read_s * 1e3,
+        "signals_mean_us": total["signals_s"] / n * 1e6 if n else 0.0,
+        "plan_mean_us": total["plan_s"] / n * 1e6 if n else 0.0,
+    }
+    return diff, throughput
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("db", nargs="?", default=os.environ.get("LEARNING_DB", os.path.join(ROOT, "learning.db")),
+                   help="Learning DB to replay (default: LEARNING_DB or learning.db)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--chunk", type=int, default=2000, help="Events read and replayed per task")
+    p.add_argument("--limit", type=int, help="Replay at most this many events")
+    p.add_argument("--since", help="Only events with timestamp >= this (ISO 8601, e.g. 2025-06-01)")
+    p.add_argument("--no-boosts", action="store_true", help="Plan without learned boosts")
+    p.add_argument("--examples", type=int, default=10, help="Changed plans to show")
+    p.add_argument("--json", help="Write results to this file")
+    args = p.parse_args()
+    if not os.path.exists(args.db):
+        raise SystemExit(f"no such database: {args.db}")
+
+    def progress(done, elapsed):
+        print(f"\r{done} events  {done / elapsed:,.0f}/s", end="", file=sys.stderr, flush=True)
+
+    diff, throughput = run(args.db, args.workers, args.chunk, args.limit, args.since,
+                           use_boosts=not args.no_boosts, max_examples=args.examples, progress=progress)
+    print(file=sys.stderr)
+    n = diff["events"]
+    print(f"replayed {n} events ({diff['skipped_without_query']} without query text) in {throughput['wall_s']:.2f} s: "
+          f"{throughput['ops_per_s']:,.0f} events/s on {args.workers} workers; per event signals "
+          f"{throughput['signals_mean_us']:.1f} us, plan {throughput['plan_mean_us']:.1f} us")
+    print(f"plans: {diff['identical_plans']} identical, {diff['changed_plans']} changed ({diff['changed_pct']:.1f}%), "
+          f"{diff['intent_changed']} with a different intent")
+    print(f"cost: {diff['old_cost_total']:.2f} -> {diff['new_cost_total']:.2f} ({diff['cost_delta_total']:+.2f}, "
+          f"{diff['cost_delta_mean']:+.4f}/event); {diff['cost_increased']} up, {diff['cost_decreased']} down")
+    if diff["cited_sources"]:
+        print(f"feedback: {diff['cited_still_purchased_pct']:.1f}% of {diff['cited_sources']} cited sources "
+              f"would still be bought ({diff['events_with_feedback']} events)")
+    for label, key in (("added", "sources_added"), ("dropped", "sources_dropped"), ("intent", "intent_transitions")):
+        if diff[key]:
+            print(f"{label:>8}: " + ", ".join(f"{k} {v}" for k, v in diff[key].items()))
+    for ex in diff["examples"]:
+        print(f"  {ex['query']!r}: {ex['old']} -> {ex['new']} ({ex['cost_delta']:+.3f})")
+    if args.json:
+        write_results(args.json, "replay", {"replay": throughput, "plan_diff": diff}, {
+            "db": os.path.abspath(args.db), "chunk": args.chunk, "limit": args.limit, "since": args.since,
+            "boosts": not args.no_boosts,
+        })
+        print(f"wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
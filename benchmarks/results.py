@@ -0,0 +1,95 @@
+"""
+Benchmark results as JSON, and comparison between two runs.
+
+A results file is {"suite", "environment", "results"}, where results maps a case name
+(e.g. "extract_signals" or "flask-dev c=32") to metrics. Higher is better for throughput
+metrics (ops_per_s, rps); lower is better for latency metrics (*_us, *_ms). compare()
+lists every shared metric whose relative change is worse than the threshold.
+
+  python benchmarks/results.py baseline.json current.json --threshold 0.10
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+HIGHER_IS_BETTER = ("ops_per_s", "rps")
+LOWER_IS_BETTER_SUFFIXES = ("_us", "_ms")
+
+
+def environment_info():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def write_results(path, suite, results, params=None):
+    doc = {"suite": suite, "environment": environment_info(), "params": params or {}, "results": results}
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _direction(metric):
+    if metric in HIGHER_IS_BETTER:
+        return 1
+    if metric.endswith(LOWER_IS_BETTER_SUFFIXES):
+        return -1
+    return 0
+
+
+def compare(baseline, current, threshold=0.10):
+    """[(case, metric, baseline value, current value, relative change)] for regressions."""
+    regressions = []
+    base_results = baseline["results"]
+    for case, metrics in current["results"].items():
+        base = base_results.get(case)
+        if not base:
+            continue
+        for metric, value in metrics.items():
+            direction = _direction(metric)
+            old = base.get(metric)
+            if not direction or not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old <= 0:
+                continue
+            change = (value - old) / old
+            if change * direction < -threshold:
+                regressions.append((case, metric, old, value, change))
+    return regressions
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    args = p.parse_args()
+    baseline, current = load_results(args.baseline), load_results(args.current)
+    print(f"baseline {baseline['environment'].get('commit')}  current {current['environment'].get('commit')}")
+    regressions = compare(baseline, current, args.threshold)
+    for case, metric, old, new, change in regressions:
+        print(f"REGRESSION {case} {metric}: {old:.4g} -> {new:.4g} ({change:+.1%})")
+    if not regressions:
+        print(f"no regressions beyond {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,595 @@
+"""
+Columnar archive tier for conversion events.
+
+Events older than ARCHIVE_AFTER_DAYS move out of SQLite (MetricsStore.archive_events) into
+compressed column files, one or more per UTC day:
+
+  <EVENT_ARCHIVE_DIR>/dictionary.json          publisher and cluster names; codes are list indexes
+  <EVENT_ARCHIVE_DIR>/2025-06-01.0000.col      one archived batch of that day's events
+
+A .col file is a magic line, a JSON header (row count, byte order, and each column's
+offset, length, array typecode and value count) and the columns, each zlib-compressed on
+its own so a scan reads and inflates only the columns it needs. Numeric columns are
+array.array buffers; strings (event ids, timestamps, customers, query text) are JSON lists.
+Purchased and cited publishers are integer-coded lists stored as offsets + codes. Each
+purchased entry carries its cited flag and the quality the event contributed to the
+aggregates (the recorded, noised value), so sums over the archive equal what the archived
+events added to global_aggregates.
+
+publisher_totals() is the query engine: per (cluster, publisher) or (cluster, day,
+publisher) totals over a day range, optionally for one cluster or customer. Partitions
+outside the day range are skipped by file name; each header also carries the file's
+per-(cluster, publisher) totals, so only customer-filtered queries read columns, with
+numpy when it is installed and plain loops otherwise.
+
+Files are written as .pending and renamed once the events are deleted from SQLite;
+recover() settles pending files left by a crash in between. rewrite() merges a day's small
+partitions into one (and can blank their query text for retention): the merged file lists
+the files it replaces, which are deleted before it is renamed into place, so after a crash
+recover() either drops it (all originals still there) or finishes the swap.
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from array import array
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "5000"))
+ARCHIVE_COMPRESS_LEVEL = 6
+# Compaction merges a day's partitions into files of up to this many events
+ARCHIVE_COMPACT_ROWS = int(os.environ.get("ARCHIVE_COMPACT_ROWS", "100000"))
+
+MAGIC = b"EVCOL1\n"
+_PARTITION_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})\.(\d{4})\.col$")
+
+# name -> array typecode, or "json" for a list of strings
+COLUMNS = {
+    "event_id": "json",
+    "timestamp": "json",
+    "customer_id": "json",
+    "query_text": "json",
+    "cluster": "I",            # code into dictionary["clusters"]
+    "total_cost": "d",
+    "answer_quality": "d",     # NaN = no feedback
+    "user_rating": "d",
+    "correction_made": "b",
+    "has_quality": "b",
+    "purchased_offsets": "I",  # rows + 1 offsets into the purchased_* columns
+    "purchased": "I",          # publisher codes
+    "purchased_cited": "b",
+    "purchased_quality": "d",  # contributed (noised) quality per purchased entry
+    "cited_offsets": "I",
+    "cited": "I",
+}
+SCAN_COLUMNS = ("cluster", "total_cost", "purchased_offsets", "purchased", "purchased_cited", "purchased_quality")
+
+
+@dataclass
+class ArchivedEvent:
+    """One event as handed to EventArchive.stage (see MetricsStore.archive_events)."""
+    event_id: str
+    timestamp: str
+    customer_id: str
+    query_text: str
+    cluster: str
+    total_cost: float
+    answer_quality: Optional[float]
+    user_rating: Optional[float]
+    correction_made: bool
+    purchased: List[str]
+    cited: List[str]
+    contributed_quality: Dict[str, float]  # publisher -> quality it added, summed over its entries
+    has_quality: bool
+
+
+def _nan_if_none(v: Optional[float]) -> float:
+    return float("nan") if v is None else float(v)
+
+
+class Dictionary:
+    """Append-only name <-> code tables shared by every partition."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tables: Dict[str, List[str]] = {"publishers": [], "clusters": []}
+        self._codes: Dict[str, Dict[str, int]] = {"publishers": {}, "clusters": {}}
+        self._mtime = None
+        self.reload()
+
+    def reload(self) -> None:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        with open(self.path) as f:
+            tables = json.load(f)
+        self.tables = {k: list(tables.get(k, [])) for k in ("publishers", "clusters")}
+        self._codes = {k: {name: i for i, name in enumerate(v)} for k, v in self.tables.items()}
+        self._mtime = mtime
+
+    def code(self, table: str, name: str) -> int:
+        codes = self._codes[table]
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(self.tables[table])
+            self.tables[table].append(name)
+        return code
+
+    def lookup(self, table: str, name: str) -> Optional[int]:
+        return self._codes[table].get(name)
+
+    def save(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.tables, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+
+def _encode(kind: str, values: Sequence) -> Tuple[bytes, int]:
+    if kind == "json":
+        raw = json.dumps(list(values), ensure_ascii=False).encode()
+    else:
+        raw = array(kind, values).tobytes()
+    return zlib.compress(raw, ARCHIVE_COMPRESS_LEVEL), len(raw)
+
+
+def _decode(kind: str, blob: bytes, byteorder: str):
+    raw = zlib.decompress(blob)
+    if kind == "json":
+        return json.loads(raw)
+    out = array(kind)
+    out.frombytes(raw)
+    if byteorder != sys.byteorder:
+        out.byteswap()
+    return out
+
+
+class Partition:
+    """One .col file: header on open, columns read and inflated on demand."""
+
+    def __init__(self, path: str):
+        self.path = path
+        name = os.path.basename(path)
+        self.day = date.fromisoformat(name[:10]).toordinal()
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an event archive partition")
+            size = int.from_bytes(f.read(4), "little")
+            self.header = json.loads(f.read(size))
+        self.data_offset = len(MAGIC) + 4 + size
+        self.rows: int = self.header["rows"]
+
+    def columns(self, names: Iterable[str]) -> Dict[str, Any]:
+        out = {}
+        cols = self.header["columns"]
+        with open(self.path, "rb") as f:
+            for name in names:
+                meta = cols[name]
+                f.seek(self.data_offset + meta["offset"])
+                out[name] = _decode(meta["type"], f.read(meta["length"]), self.header["byteorder"])
+        return out
+
+
+class EventArchive:
+    """Day-partitioned column files under root, plus the shared dictionary."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._partitions: Dict[str, Tuple[int, Partition]] = {}  # path -> (mtime, Partition)
+        self._dictionary: Optional[Dictionary] = None
+        self.last_scan: Dict[str, Any] = {}
+
+    @property
+    def dictionary(self) -> Dictionary:
+        if self._dictionary is None:
+            self._dictionary = Dictionary(os.path.join(self.root, "dictionary.json"))
+        else:
+            self._dictionary.reload()
+        return self._dictionary
+
+    # ─── Writing ───────────────────────────────────────────────────────────
+    def stage(self, day: int, events: List[ArchivedEvent], replaces: Sequence[str] = (),
+              query_text_redacted: bool = False) -> str:
+        """
+        Write one day's events to a new .pending partition file; returns its path. replaces
+        names the partition files this one supersedes (see rewrite).
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock:
+            d = self.dictionary
+            cols: Dict[str, List] = {name: [] for name in COLUMNS}
+            cols["purchased_offsets"].append(0)
+            cols["cited_offsets"].append(0)
+            for e in events:
+                cols["event_id"].append(e.event_id)
+                cols["timestamp"].append(e.timestamp)
+                cols["customer_id"].append(e.customer_id)
+                cols["query_text"].append(e.query_text)
+                cols["cluster"].append(d.code("clusters", e.cluster))
+                cols["total_cost"].append(float(e.total_cost))
+                cols["answer_quality"].append(_nan_if_none(e.answer_quality))
+                cols["user_rating"].append(_nan_if_none(e.user_rating))
+                cols["correction_made"].append(1 if e.correction_made else 0)
+                cols["has_quality"].append(1 if e.has_quality else 0)
+                cited = set(e.cited)
+                multiplicity: Dict[str, int] = {}
+                for pub in e.purchased:
+                    multiplicity[pub] = multiplicity.get(pub, 0) + 1
+                for pub in e.purchased:
+                    cols["purchased"].append(d.code("publishers", pub))
+                    cols["purchased_cited"].append(1 if pub in cited else 0)
+                    # A publisher bought twice splits its recorded quality evenly, keeping the sum
+                    cols["purchased_quality"].append(e.contributed_quality.get(pub, 0.0) / multiplicity[pub])
+                cols["purchased_offsets"].append(len(cols["purchased"]))
+                for pub in e.cited:
+                    cols["cited"].append(d.code("publishers", pub))
+                cols["cited_offsets"].append(len(cols["cited"]))
+            # Codes must be resolvable before any partition that uses them becomes visible
+            d.save()
+
+            blobs, header_cols, offset, raw_bytes = [], {}, 0, 0
+            for name, kind in COLUMNS.items():
+                blob, raw = _encode(kind, cols[name])
+                header_cols[name] = {"offset": offset, "length": len(blob), "type": kind, "count": len(cols[name]), "raw": raw}
+                blobs.append(blob)
+                offset += len(blob)
+                raw_bytes += raw
+            # Per-(cluster, publisher) totals of the file, so scans without a customer filter skip the columns
+            summary = [[cl, pub] + vals for (cl, pub), vals in sorted(_scan_python(cols, None, None).items())]
+            meta = {"rows": len(events), "byteorder": sys.byteorder, "raw_bytes": raw_bytes,
+                    "summary": summary, "columns": header_cols}
+            if replaces:
+                meta["replaces"] = [os.path.basename(p) for p in replaces]
+            if query_text_redacted:
+                meta["query_text_redacted"] = True
+            header = json.dumps(meta).encode()
+            iso = date.fromordinal(day).isoformat()
+            taken = {m.group(2) for m in (_PARTITION_RE.match(n.replace(".pending", "")) for n in os.listdir(self.root))
+                     if m and m.group(1) == iso}
+            seq = 0
+            while f"{seq:04d}" in taken:
+                seq += 1
+            path = os.path.join(self.root, f"{iso}.{seq:04d}.col.pending")
+            with open(path, "wb") as f:
+                f.write(MAGIC)
+                f.write(len(header).to_bytes(4, "little"))
+                f.write(header)
+                for blob in blobs:
+                    f.write(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            return path
+
+    @staticmethod
+    def commit(paths: Iterable[str]) -> None:
+        for path in paths:
+            try:
+                os.replace(path, path[:-len(".pending")])
+            except FileNotFoundError:
+                if not os.path.exists(path[:-len(".pending")]):
+                    raise
+                # Already committed by another process's recover()
+
+    @staticmethod
+    def discard(paths: Iterable[str]) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def recover(self, still_live: Callable[[List[str]], bool]) -> Dict[str, int]:
+        """
+        Settle .pending files from an interrupted archive run: if their events are gone from
+        SQLite (still_live(event_ids) is False) the delete committed and the file is kept,
+        otherwise it is dropped and the events will be archived again.
+        """
+        out = {"committed": 0, "discarded": 0}
+        if not os.path.isdir(self.root):
+            return out
+        for name in sorted(os.listdir(self.root)):
+            if not name.endswith(".col.pending"):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                part = Partition(path)
+                ids = part.columns(["event_id"])["event_id"]
+            except (ValueError, OSError, zlib.error):
+                part, ids = None, None  # torn write: the transaction never got to delete anything
+            replaces = part.header.get("replaces") if part is not None else None
+            if replaces:
+                # A rewrite: finish it once any original is gone, otherwise the originals stand
+                originals = [os.path.join(self.root, n) for n in replaces]
+                if all(os.path.exists(o) for o in originals):
+                    self.discard([path])
+                    out["discarded"] += 1
+                else:
+                    self.discard(originals)
+                    self.commit([path])
+                    out["committed"] += 1
+            elif ids and not still_live(ids):
+                self.commit([path])
+                out["committed"] += 1
+            else:
+                self.discard([path])
+                out["discarded"] += 1
+        return out
+
+    def rewrite(self, parts: List[Partition], redact_query_text: bool = False) -> Optional[Dict[str, int]]:
+        """
+        Replace partitions of one day with a single file holding all their events, with empty
+        query text if redact_query_text. Callers serialize rewrites and archiving (MetricsStore
+        holds the SQLite write lock). Returns None if a partition vanished meanwhile.
+        """
+        if not parts or any(not os.path.exists(p.path) for p in parts):
+            return None
+        day = parts[0].day
+        bytes_before = sum(os.path.getsize(p.path) for p in parts)
+        events: List[ArchivedEvent] = []
+        for part in parts:
+            events.extend(self.read_events(part))
+        redacted = sum(1 for e in events if e.query_text) if redact_query_text else 0
+        if redact_query_text:
+            for e in events:
+                e.query_text = ""
+        redacted_flag = redact_query_text or all(p.header.get("query_text_redacted") for p in parts)
+        path = self.stage(day, events, replaces=[p.path for p in parts], query_text_redacted=redacted_flag)
+        self.discard([p.path for p in parts])
+        self.commit([path])
+        return {"events": len(events), "partitions": len(parts), "bytes_before": bytes_before,
+                "bytes_after": os.path.getsize(path[:-len(".pending")]), "query_text_redacted": redacted}
+
+    def compaction_plan(
+        self,
+        redact_before_day: Optional[int] = None,
+        target_rows: int = ARCHIVE_COMPACT_ROWS,
+    ) -> List[Tuple[List[Partition], bool]]:
+        """
+        (partitions, redact) groups worth rewriting, oldest first: a day's partitions are
+        packed in order into groups of up to target_rows events, and a group is listed if it
+        merges several files or holds query text from before redact_before_day.
+        """
+        by_day: Dict[int, List[Partition]] = {}
+        for part in self.partitions():
+            by_day.setdefault(part.day, []).append(part)
+        plan = []
+        for day, parts in sorted(by_day.items()):
+            redact = redact_before_day is not None and day < redact_before_day
+            groups: List[List[Partition]] = []
+            rows = 0
+            for part in parts:
+                if not groups or rows + part.rows > target_rows:
+                    groups.append([])
+                    rows = 0
+                groups[-1].append(part)
+                rows += part.rows
+            for group in groups:
+                if len(group) > 1 or (redact and not all(p.header.get("query_text_redacted") for p in group)):
+                    plan.append((group, redact))
+        return plan
+
+    # ─── Reading ───────────────────────────────────────────────────────────
+    def read_events(self, part: Partition) -> List[ArchivedEvent]:
+        """Every event of a partition, as stage() was given it."""
+        cols = part.columns(COLUMNS)
+        d = self.dictionary
+        clusters, publishers = d.tables["clusters"], d.tables["publishers"]
+        p_off, c_off = cols["purchased_offsets"], cols["cited_offsets"]
+        out = []
+        for row in range(part.rows):
+            purchased, contributed = [], {}
+            for i in range(p_off[row], p_off[row + 1]):
+                pub = publishers[cols["purchased"][i]]
+                purchased.append(pub)
+                contributed[pub] = contributed.get(pub, 0.0) + cols["purchased_quality"][i]
+            aq, ur = cols["answer_quality"][row], cols["user_rating"][row]
+            out.append(ArchivedEvent(
+                event_id=cols["event_id"][row], timestamp=cols["timestamp"][row],
+                customer_id=cols["customer_id"][row], query_text=cols["query_text"][row],
+                cluster=clusters[cols["cluster"][row]], total_cost=cols["total_cost"][row],
+                answer_quality=None if aq != aq else aq, user_rating=None if ur != ur else ur,
+                correction_made=bool(cols["correction_made"][row]),
+                purchased=purchased, cited=[publishers[c] for c in cols["cited"][c_off[row]:c_off[row + 1]]],
+                contributed_quality=contributed, has_quality=bool(cols["has_quality"][row]),
+            ))
+        return out
+
+    def partitions(self, since_day: Optional[int] = None, until_day: Optional[int] = None) -> List[Partition]:
+        """Committed partitions whose day is in [since_day, until_day], oldest first."""
+        if not os.path.isdir(self.root):
+            return []
+        out = []
+        with self._lock:
+            seen = set()
+            for entry in sorted(os.scandir(self.root), key=lambda e: e.name):
+                m = _PARTITION_RE.match(entry.name)
+                if not m:
+                    continue
+                day = date.fromisoformat(m.group(1)).toordinal()
+                if (since_day is not None and day < since_day) or (until_day is not None and day > until_day):
+                    continue
+                seen.add(entry.path)
+                mtime = entry.stat().st_mtime_ns
+                cached = self._partitions.get(entry.path)
+                if cached is None or cached[0] != mtime:
+                    cached = self._partitions[entry.path] = (mtime, Partition(entry.path))
+                out.append(cached[1])
+            if since_day is None and until_day is None:
+                for path in set(self._partitions) - seen:
+                    del self._partitions[path]
+        return out
+
+    def event_count(self) -> int:
+        return sum(p.rows for p in self.partitions())
+
+    def publisher_totals(
+        self,
+        query_cluster: Optional[str] = None,
+        since_day: Optional[int] = None,
+        until_day: Optional[int] = None,
+        customer_id: Optional[str] = None,
+        by_day: bool = False,
+    ) -> Dict[Tuple, List[float]]:
+        """
+        (cluster, publisher) -> [purchases, citations, sum_quality, sum_cost, count] over the
+        archived events in the day range, the same quantities global_aggregates holds; keys
+        are (cluster, day, publisher) with by_day.
+        """
+        start = time.perf_counter()
+        # Partitions first: the dictionary is saved before a partition appears, so it covers them
+        parts = self.partitions(since_day, until_day)
+        d = self.dictionary
+        cluster_code = None
+        if query_cluster is not None:
+            cluster_code = d.lookup("clusters", query_cluster)
+            if cluster_code is None:
+                return {}
+        columns = SCAN_COLUMNS + (("customer_id",) if customer_id is not None else ())
+        totals: Dict[Tuple, List[float]] = {}
+        scanned = 0
+        columns_read = 0
+        for part in parts:
+            scanned += part.rows
+            if customer_id is None:
+                partial = {(r[0], r[1]): r[2:] for r in part.header["summary"]
+                           if cluster_code is None or r[0] == cluster_code}
+            else:
+                cols = part.columns(columns)
+                columns_read += 1
+                keep = [c == customer_id for c in cols["customer_id"]]
+                if np is not None:
+                    partial = _scan_numpy(cols, cluster_code, keep)
+                else:
+                    partial = _scan_python(cols, cluster_code, keep)
+            clusters, publishers = d.tables["clusters"], d.tables["publishers"]
+            for (cl, pub), vals in partial.items():
+                key = (clusters[cl], part.day, publishers[pub]) if by_day else (clusters[cl], publishers[pub])
+                acc = totals.get(key)
+                if acc is None:
+                    totals[key] = list(vals)
+                else:
+                    for i in range(5):
+                        acc[i] += vals[i]
+        self.last_scan = {"events": scanned, "ms": (time.perf_counter() - start) * 1e3, "partitions": len(parts),
+                          "partitions_scanned": columns_read, "engine": "numpy" if np is not None else "python"}
+        return totals
+
+    def stats(self) -> Dict[str, Any]:
+        parts = self.partitions()
+        stored = sum(os.path.getsize(p.path) for p in parts)
+        raw = sum(p.header.get("raw_bytes", 0) for p in parts)
+        return {
+            "dir": self.root,
+            "partitions": len(parts),
+            "events": sum(p.rows for p in parts),
+            "bytes": stored,
+            "compression_ratio": raw / stored if stored else None,
+            "oldest_day": date.fromordinal(parts[0].day).isoformat() if parts else None,
+            "newest_day": date.fromordinal(parts[-1].day).isoformat() if parts else None,
+            "query_text_redacted_partitions": sum(1 for p in parts if p.header.get("query_text_redacted")),
+            "publishers": len(self.dictionary.tables["publishers"]),
+            "engine": "numpy" if np is not None else "python",
+            "last_scan": self.last_scan or None,
+        }
+
+
+def _scan_python(cols: Dict[str, Any], cluster_code: Optional[int], keep: Optional[List[bool]]) -> Dict[Tuple[int, int], List[float]]:
+    out: Dict[Tuple[int, int], List[float]] = {}
+    offsets, pubs = cols["purchased_offsets"], cols["purchased"]
+    cited, quality = cols["purchased_cited"], cols["purchased_quality"]
+    for row, (cl, cost) in enumerate(zip(cols["cluster"], cols["total_cost"])):
+        if (cluster_code is not None and cl != cluster_code) or (keep is not None and not keep[row]):
+            continue
+        for i in range(offsets[row], offsets[row + 1]):
+            key = (cl, pubs[i])
+            acc = out.get(key)
+            if acc is None:
+                acc = out[key] = [0, 0, 0.0, 0.0, 0]
+            acc[0] += 1
+            acc[1] += cited[i]
+            acc[2] += quality[i]
+            acc[3] += cost
+            acc[4] += 1
+    return out
+
+
+def _scan_numpy(cols: Dict[str, Any], cluster_code: Optional[int], keep: Optional[List[bool]]) -> Dict[Tuple[int, int], List[float]]:
+    offsets = np.frombuffer(cols["purchased_offsets"], dtype=np.uint32)
+    counts = np.diff(offsets)
+    row_of = np.repeat(np.arange(len(counts)), counts)
+    clusters = np.frombuffer(cols["cluster"], dtype=np.uint32)[row_of].astype(np.int64)
+    pubs = np.frombuffer(cols["purchased"], dtype=np.uint32).astype(np.int64)
+    cited = np.frombuffer(cols["purchased_cited"], dtype=np.int8)
+    quality = np.frombuffer(cols["purchased_quality"], dtype=np.float64)
+    cost = np.frombuffer(cols["total_cost"], dtype=np.float64)[row_of]
+    mask = None
+    if cluster_code is not None:
+        mask = clusters == cluster_code
+    if keep is not None:
+        rows_kept = np.asarray(keep, dtype=bool)[row_of]
+        mask = rows_kept if mask is None else mask & rows_kept
+    if mask is not None:
+        clusters, pubs, cited, quality, cost = clusters[mask], pubs[mask], cited[mask], quality[mask], cost[mask]
+    if not len(pubs):
+        return {}
+    keys, inverse = np.unique(clusters * (int(pubs.max()) + 1) + pubs, return_inverse=True)
+    n = np.bincount(inverse)
+    sums = [np.bincount(inverse, weights=w) for w in (cited, quality, cost)]
+    width = int(pubs.max()) + 1
+    out = {}
+    for j, key in enumerate(keys.tolist()):
+        out[(key // width, key % width)] = [int(n[j]), int(sums[0][j]), float(sums[1][j]), float(sums[2][j]), int(n[j])]
+    return out
+
+
+def main():
+    import argparse
+
+    from learning import get_metrics_store
+
+    p = argparse.ArgumentParser(description="Event archive: move old events out of SQLite, inspect, scan")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    a = sub.add_parser("archive", help="Archive events older than --days")
+    a.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS)
+    a.add_argument("--batch", type=int, default=ARCHIVE_BATCH_SIZE)
+    a.add_argument("--max-batches", type=int)
+    sub.add_parser("stats", help="Partitions, events and size")
+    scan = sub.add_parser("scan", help="Publisher totals over the archive")
+    scan.add_argument("--cluster")
+    scan.add_argument("--customer")
+    args = p.parse_args()
+
+    store = get_metrics_store()
+    if args.cmd == "archive":
+        from learning import _today
+        out = store.archive_events(before_day=_today() - args.days, batch_size=args.batch, max_batches=args.max_batches)
+    elif args.cmd == "stats":
+        out = store.archive.stats()
+    else:
+        totals = store.archive.publisher_totals(query_cluster=args.cluster, customer_id=args.customer)
+        out = {"last_scan": store.archive.last_scan,
+               "totals": {f"{c}/{pub}": v for (c, pub), v in sorted(totals.items())}}
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Built-in instrumentation: latency histograms, counters and a Prometheus text exposition.
+
+  with stage_timer("scoring"):
+      ...
+
+Every stage_timer records its duration in optimizer_stage_seconds{stage=...}; MetricsStore
+calls, SQLite write-lock waits and search provider calls have histograms of their own, and
+provider fallbacks and breaker skips are counted. Observing is a perf_counter pair, a
+bisect and one short lock per histogram.
+
+Stats that other components already keep (query, boost and search caches, connection pool,
+event writer, provider health) are not counted twice: functions registered with
+register_collector turn them into metric families when /metrics is scraped.
+
+collect_timings() gathers one request's stage durations (ms) for the debug `timings` block;
+the current collector lives in a contextvar, so it follows the request across threads only
+when the context is copied (asgi.Offload does). Values are per process: with several
+workers, each worker's /metrics covers its own requests.
+
+METRICS_ENABLED=0 stops recording into histograms and counters; per-request timings and
+collectors still work.
+"""
+
+import bisect
+import contextvars
+import functools
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+# Seconds; pipeline stages run in tens of microseconds, search calls in seconds
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (name, type, help, [(name suffix, labels, value)])
+MetricFamily = Tuple[str, str, str, List[Tuple[str, Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Bucketed latency distribution per label-value tuple (Prometheus histogram semantics)."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}  # key -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Tuple[List[int], float, int]]:
+        with self._lock:
+            return {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+
+    def quantile(self, counts: List[int], count: int, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None past the last bucket)."""
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for bound, n in zip(self.buckets, counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+    def families(self) -> Iterable[MetricFamily]:
+        samples = []
+        for key, (counts, total, count) in sorted(self.snapshot().items()):
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                samples.append(("_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, count))
+        yield self.name, "histogram", self.help, samples
+
+
+class Counter:
+    """Monotonic count per label-value tuple."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def families(self) -> Iterable[MetricFamily]:
+        with self._lock:
+            items = sorted(self._values.items())
+        yield self.name, "counter", self.help, [("", dict(zip(self.labels, k)), v) for k, v in items]
+
+
+_metrics: List[Any] = []
+_collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+_registry_lock = threading.Lock()
+
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    h = Histogram(name, help, labels, buckets)
+    with _registry_lock:
+        _metrics.append(h)
+    return h
+
+
+def counter(name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+    c = Counter(name, help, labels)
+    with _registry_lock:
+        _metrics.append(c)
+    return c
+
+
+def register_collector(fn: Callable[[], Iterable[MetricFamily]]) -> None:
+    """fn() yields (name, type, help, [(suffix, labels, value)]) families, read on every scrape."""
+    with _registry_lock:
+        _collectors.append(fn)
+
+
+STAGE_SECONDS = histogram("optimizer_stage_seconds", "Duration of each optimize pipeline stage", ("stage",))
+DB_OP_SECONDS = histogram("optimizer_db_op_seconds", "MetricsStore call duration by operation", ("op",))
+DB_LOCK_WAIT_SECONDS = histogram("optimizer_db_lock_wait_seconds", "Wait for the SQLite write lock (BEGIN IMMEDIATE)")
+SEARCH_CALL_SECONDS = histogram("optimizer_search_provider_seconds", "Search provider call duration by outcome",
+                                ("provider", "outcome"))
+SEARCH_FALLBACKS = counter("optimizer_search_fallbacks_total",
+                           "Provider calls that failed or came back empty while another provider was still to try",
+                           ("provider",))
+SEARCH_BREAKER_SKIPS = counter("optimizer_search_breaker_skips_total",
+                               "Providers skipped because their circuit breaker was open", ("provider",))
+
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("timings", default=None)
+
+
+class stage_timer:
+    """Context manager timing one pipeline stage (histogram + current request's timings)."""
+
+    __slots__ = ("stage", "_start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self) -> "stage_timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        observe_stage(self.stage, time.perf_counter() - self._start)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Record a stage duration measured elsewhere."""
+    STAGE_SECONDS.observe(seconds, stage)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds * 1e3
+
+
+def timed(hist: Histogram, *label_values: str) -> Callable:
+    """Decorator recording each call's duration in hist under label_values."""
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - start, *label_values)
+        return wrapper
+    return decorate
+
+
+def wants_timings(header_value: Optional[str]) -> bool:
+    """True when the X-Debug-Timings request header asks for the timings block."""
+    return (header_value or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class collect_timings:
+    """
+    `with collect_timings(enabled) as timings:` gathers the stages timed inside the block into
+    a {stage: ms} dict (None when not enabled), plus "total" once the block exits.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.timings: Optional[Dict[str, float]] = {} if enabled else None
+
+    def __enter__(self) -> Optional[Dict[str, float]]:
+        if self.timings is not None:
+            self._token = _timings.set(self.timings)
+            self._start = time.perf_counter()
+        return self.timings
+
+    def __exit__(self, *exc: Any) -> None:
+        if self.timings is None:
+            return
+        _timings.reset(self._token)
+        self.timings["total"] = (time.perf_counter() - self._start) * 1e3
+        for stage, ms in self.timings.items():
+            self.timings[stage] = round(ms, 3)
+
+
+def stage_summary() -> Dict[str, Dict[str, Any]]:
+    """Per stage: count, avg_ms and bucket-bound p50_ms/p95_ms/p99_ms (for /learn and admin.html)."""
+    out = {}
+    for (stage,), (counts, total, count) in STAGE_SECONDS.snapshot().items():
+        q = {p: STAGE_SECONDS.quantile(counts, count, p / 100) for p in (50, 95, 99)}
+        out[stage] = {
+            "count": count,
+            "avg_ms": total / count * 1e3 if count else 0.0,
+            **{f"p{p}_ms": v * 1e3 if v is not None else None for p, v in q.items()},
+        }
+    return out
+
+
+def stats_families(prefix: str, help: str, stats: Dict[str, Any], counters: Sequence[str] = (),
+                   labels: Optional[Dict[str, str]] = None) -> List[MetricFamily]:
+    """
+    Metric families for the numeric entries of a component's stats() dict: keys listed in
+    counters become <prefix>_<key>_total counters, other numbers <prefix>_<key> gauges.
+    """
+    labels = labels or {}
+    out = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if key in counters:
+            name = f"{prefix}_{key}" if key.endswith("_total") else f"{prefix}_{key}_total"
+            out.append((name, "counter", f"{help}: {key}", [("", labels, value)]))
+        else:
+            out.append((f"{prefix}_{key}", "gauge", f"{help}: {key}", [("", labels, value)]))
+    return out
+
+
+def render_prometheus() -> str:
+    """Every registered metric and collector in the Prometheus text exposition format."""
+    with _registry_lock:
+        sources = [m.families for m in _metrics] + list(_collectors)
+    merged: Dict[str, Tuple[str, str, List]] = {}
+    for source in sources:
+        try:
+            families = list(source())
+        except Exception:
+            continue  # one broken collector must not take the endpoint down
+        for name, kind, help, samples in families:
+            if name in merged:
+                merged[name][2].extend(samples)
+            else:
+                merged[name] = (kind, help, list(samples))
+    lines = []
+    for name, (kind, help, samples) in merged.items():
+        lines.append(f"# HELP {name} {_escape(help)}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -3,22 +3,63 @@ Learning system: persist conversion events and aggregate publisher value by quer
 Learn which publishers deliver value for which query types (citation rate, quality, cost).
 """
 
+import atexit
 import hashlib
 import json
+import logging
+import math
 import os
+import queue
 import random
 import sqlite3
+import threading
+import time
 import uuid
+from contextlib import contextmanager
 from dataclasses import asdict, dataclass, field
-from datetime import datetime
+from datetime import date, datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
+from event_archive import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ArchivedEvent, EventArchive
+from instrumentation import DB_LOCK_WAIT_SECONDS, DB_OP_SECONDS, timed
+
+# Where learning is stored: "sqlite" (LEARNING_DB, per node) or "postgres" (LEARNING_DB_URL, shared)
+LEARNING_BACKEND = os.environ.get("LEARNING_BACKEND", "sqlite").strip().lower()
 # K-anonymity: only report aggregates when at least this many events per (cluster, publisher)
 MIN_SAMPLE_SIZE = 5
 # Differential privacy: scale of Laplace noise (higher = more privacy, noisier)
 DP_EPSILON = 1.0
 DP_SENSITIVITY = 0.1
+# Seconds a learned domain boost stays cached per cluster (0 disables the cache)
+BOOST_CACHE_TTL = float(os.environ.get("BOOST_CACHE_TTL", "30"))
+# How long a connection waits on SQLite's write lock before raising "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# A write transaction that waited longer than this for the lock counts as contended
+LOCK_WAIT_CONTENDED_MS = 1.0
+# Learned boosts weight recent days more when set (half-life in days); 0 = lifetime totals
+BOOST_HALF_LIFE_DAYS = float(os.environ.get("BOOST_HALF_LIFE_DAYS", "0"))
+# Days of daily buckets a decayed read scans, in half-lives (weight beyond is < 0.4%)
+DECAY_HORIZON_HALF_LIVES = 8
+# Write-behind event logging (see EventWriter)
+EVENT_WRITE_BEHIND = os.environ.get("EVENT_WRITE_BEHIND", "1").strip().lower() not in ("0", "false", "no", "off")
+EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", "10000"))
+EVENT_BATCH_SIZE = int(os.environ.get("EVENT_BATCH_SIZE", "256"))
+EVENT_FLUSH_MS = float(os.environ.get("EVENT_FLUSH_MS", "50"))
+EVENT_QUEUE_FULL = os.environ.get("EVENT_QUEUE_FULL", "block").strip().lower()  # "block" or "drop"
+EVENT_BLOCK_TIMEOUT_MS = float(os.environ.get("EVENT_BLOCK_TIMEOUT_MS", "1000"))
+# Events per write transaction when filling event_sources for events logged before it existed
+SOURCES_BACKFILL_BATCH = int(os.environ.get("SOURCES_BACKFILL_BATCH", "2000"))
+# Pause between background backfill batches, so live writes get the lock in between
+SOURCES_BACKFILL_PAUSE_S = 0.05
+# Rows per write transaction when retention redacts query text or prunes daily buckets
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", "5000"))
+# Pages freed per write transaction by incremental_vacuum
+VACUUM_STEP_PAGES = 1000
+# Snapshot scans rebuild_aggregates tries before scanning under the write lock (events archived meanwhile)
+REBUILD_ATTEMPTS = 3
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -72,28 +113,572 @@ class ConversionEvent:
         return cls(**{k: v for k, v in d.items() if k in cls.__dataclass_fields__})
 
 
+def _performance_by_cluster(rows) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """(cluster, publisher, purchases, citations, sum_quality, sum_cost, count) rows -> by_cluster stats."""
+    by_cluster: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for cluster, publisher, purchases, citations, sum_q, sum_cost, count in rows:
+        if cluster not in by_cluster:
+            by_cluster[cluster] = {}
+        avg_cost = sum_cost / count if count else 0
+        avg_quality = sum_q / count if count else 0
+        value_per_dollar = avg_quality / avg_cost if (count and avg_cost > 0) else 0
+        by_cluster[cluster][publisher] = {
+            "purchase_count": purchases,
+            "citation_count": citations,
+            "citation_rate": citations / purchases if purchases else 0,
+            "avg_quality": avg_quality,
+            "avg_cost": avg_cost,
+            "value_per_dollar": value_per_dollar,
+            "sample_size": count,
+        }
+    return by_cluster
+
+
 def _laplace_noise(scale: float) -> float:
     """Add Laplace noise for differential privacy."""
     u = random.random() - 0.5
     return -scale * (1.0 if u < 0 else -1.0) * (__import__("math").log(1 - 2 * abs(u)))
 
 
-class MetricsStore:
+def _outcome_quality(answer_quality: Optional[float], user_rating: Optional[float]) -> Optional[float]:
+    return answer_quality if answer_quality is not None else user_rating
+
+
+# (purchases, citations, quality, cost, count, has_quality) of an event that adds nothing
+_ZERO_CONTRIBUTION = (0, 0, 0.0, 0.0, 0, 0)
+
+
+def _event_contributions(
+    cluster: str,
+    purchased: List[str],
+    cited: List[str],
+    total_cost: float,
+    quality: Optional[float],
+    noisy: bool = True,
+) -> Dict[Tuple[str, str], Tuple]:
+    """
+    What one event adds to global_aggregates, per (cluster, publisher):
+    (purchases, citations, quality, cost, count, has_quality). Quality gets Laplace noise
+    unless noisy=False; the noised value is what gets recorded and later subtracted.
+    """
+    out: Dict[Tuple[str, str], Tuple] = {}
+    for pub in purchased:
+        cited_flag = 1 if pub in cited else 0
+        q = 0.0
+        if quality is not None:
+            q = quality + _laplace_noise(DP_SENSITIVITY / DP_EPSILON) if noisy else quality
+        prev = out.get((cluster, pub), _ZERO_CONTRIBUTION)
+        out[(cluster, pub)] = (
+            prev[0] + 1, prev[1] + cited_flag, prev[2] + q, prev[3] + total_cost, prev[4] + 1,
+            1 if quality is not None else 0,
+        )
+    return out
+
+
+def _source_rows(
+    event_id: str,
+    cluster: str,
+    purchased: List[str],
+    cited: List[str],
+    utilization: Dict[str, float],
+    ids: Dict[str, int],
+) -> List[Tuple]:
+    """event_sources rows of one event: every publisher it bought, cited or reported utilization for."""
+    bought, cited_set = set(purchased), set(cited)
+    return [
+        (event_id, ids[name], cluster, 1 if name in bought else 0, 1 if name in cited_set else 0, utilization.get(name))
+        for name in dict.fromkeys([*purchased, *cited, *utilization])
+    ]
+
+
+def _event_day(timestamp: str) -> int:
+    """Daily bucket of an event timestamp: the UTC date's proleptic ordinal."""
+    try:
+        return datetime.fromisoformat(timestamp.rstrip("Z")).date().toordinal()
+    except (AttributeError, ValueError):
+        return datetime.utcnow().date().toordinal()
+
+
+def _today() -> int:
+    return datetime.utcnow().date().toordinal()
+
+
+def _add_to(table: Dict[Tuple, Any], key: Tuple, vals: Sequence[float]) -> List[float]:
+    """Add vals to the five aggregate columns of table[key] (a row starts at zero); returns the row."""
+    acc = table.get(key)
+    if not isinstance(acc, list):
+        acc = table[key] = list(acc) if acc is not None else [0, 0, 0.0, 0.0, 0]
+    for i in range(5):
+        acc[i] += vals[i]
+    return acc
+
+
+def _chunks(items: List[Any], size: int) -> Iterator[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _delta_rows(deltas: Dict[Tuple[str, int, str], List]) -> Tuple[List[Tuple], List[Tuple]]:
+    """(cluster, day, publisher) deltas -> (aggregate_buckets rows, global_aggregates rows), zero rows dropped."""
+    bucket_rows = [key + tuple(d) for key, d in sorted(deltas.items()) if key[1] and any(d)]
+    totals: Dict[Tuple[str, str], List] = {}
+    for (cluster, _, pub), d in deltas.items():
+        acc = totals.setdefault((cluster, pub), [0, 0, 0.0, 0.0, 0])
+        for i in range(5):
+            acc[i] += d[i]
+    return bucket_rows, [key + tuple(d) for key, d in sorted(totals.items()) if any(d)]
+
+
+_AGGREGATE_COLUMNS = ("total_purchases", "total_citations", "sum_quality", "sum_cost", "count")
+
+
+def _aggregate_mismatches(
+    current: Dict[Tuple, Tuple],
+    rebuilt: Dict[Tuple, List],
+    key_names: Tuple[str, ...] = ("query_cluster", "publisher"),
+) -> List[Dict[str, Any]]:
+    """Rows whose counts differ, or whose sums differ beyond float rounding."""
+    out = []
+    for key in sorted(set(current) | set(rebuilt)):
+        cur = tuple(current.get(key, _ZERO_CONTRIBUTION[:5]))
+        new = tuple(rebuilt.get(key, _ZERO_CONTRIBUTION[:5]))
+        counts_differ = (cur[0], cur[1], cur[4]) != (new[0], new[1], new[4])
+        sums_differ = any(abs(cur[i] - new[i]) > 1e-6 * max(1.0, abs(cur[i]), abs(new[i])) for i in (2, 3))
+        if counts_differ or sums_differ:
+            out.append({
+                **dict(zip(key_names, key)),
+                "incremental": dict(zip(_AGGREGATE_COLUMNS, cur)),
+                "rebuilt": dict(zip(_AGGREGATE_COLUMNS, new)),
+            })
+    return out
+
+
+class BoostCache:
+    """
+    In-process cache of learned domain boosts keyed by query cluster.
+    Entries expire after ttl seconds. Feedback drops its cluster's entry at once; new events
+    only reach a cached boost when it expires, so a busy cluster keeps hitting the cache.
+    A per-key generation counter keeps a read that raced with a write from caching stale data.
+    """
+
+    def __init__(self, ttl: float = BOOST_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, tuple] = {}  # cluster -> (expires_at, generation, boost)
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, cluster: str) -> Tuple[Optional[Dict[str, float]], int]:
+        """Return (cached boost or None, generation to pass back to put)."""
+        with self._lock:
+            gen = self._generations.get(cluster, 0)
+            entry = self._entries.get(cluster)
+            if entry is not None and entry[0] > time.monotonic() and entry[1] == gen:
+                self.hits += 1
+                return dict(entry[2]), gen
+            self.misses += 1
+            return None, gen
+
+    def put(self, cluster: str, boost: Dict[str, float], generation: int) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if self._generations.get(cluster, 0) != generation:
+                return
+            self._entries[cluster] = (time.monotonic() + self.ttl, generation, dict(boost))
+
+    def invalidate(self, clusters) -> None:
+        with self._lock:
+            for cluster in clusters:
+                self._generations[cluster] = self._generations.get(cluster, 0) + 1
+                if self._entries.pop(cluster, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for cluster in list(self._entries):
+                self._generations[cluster] = self._generations.get(cluster, 0) + 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+                "ttl_seconds": self.ttl,
+            }
+
+
+class PublisherIds:
+    """
+    Publisher names interned to integer ids (the publishers table), with an in-process map
+    of ids already looked up. Ids are never reassigned, so cached ones stay valid; the map is
+    cleared when a write transaction rolls back, because ids that transaction inserted go
+    with it.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, c: sqlite3.Connection, names) -> Dict[str, int]:
+        """name -> publisher_id, inserting unknown names. Call inside a write transaction."""
+        out: Dict[str, int] = {}
+        missing = []
+        with self._lock:
+            for name in names:
+                pid = self._ids.get(name)
+                if pid is None:
+                    missing.append(name)
+                else:
+                    out[name] = pid
+        if missing:
+            missing = list(dict.fromkeys(missing))
+            c.executemany("INSERT OR IGNORE INTO publishers (name) VALUES (?)", [(n,) for n in missing])
+            found = {}
+            for chunk in _chunks(missing, 500):
+                found.update((name, pid) for pid, name in c.execute(
+                    f"SELECT publisher_id, name FROM publishers WHERE name IN ({','.join('?' * len(chunk))})", chunk))
+            with self._lock:
+                self._ids.update(found)
+            out.update(found)
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class ConnectionPool:
+    """
+    One long-lived SQLite connection per thread, configured for concurrent writers:
+    WAL journal (readers never block the writer), synchronous=NORMAL and a busy timeout.
+    Because connections stay open, sqlite3's per-connection statement cache prepares each
+    SQL string once. Connections of exited threads are closed when new ones are opened,
+    and the pool starts fresh after fork (gunicorn --preload).
+    """
+
+    def __init__(self, db_path: str, busy_timeout_ms: int = SQLITE_BUSY_TIMEOUT_MS):
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._conns: Dict[int, Tuple[threading.Thread, sqlite3.Connection]] = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._rollback_hooks: List[Any] = []
+        self._stats = {
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "write_transactions": 0,
+            "contended_writes": 0,
+            "lock_wait_ms_total": 0.0,
+            "lock_wait_ms_max": 0.0,
+            "busy_errors": 0,
+        }
+
+    def _open(self) -> sqlite3.Connection:
+        c = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000.0,
+            check_same_thread=False,  # only the owning thread uses it; closing may happen elsewhere
+            cached_statements=128,
+        )
+        # Only takes effect in a new database (before its first table); see MetricsStore.incremental_vacuum
+        c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        c.execute("PRAGMA journal_mode=WAL")
+        c.execute("PRAGMA synchronous=NORMAL")
+        c.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return c
+
+    def get(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use."""
+        if os.getpid() != self._pid:
+            # Forked child: never reuse the parent's connections
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._conns = {}
+                    self._pid = os.getpid()
+        ident = threading.get_ident()
+        entry = self._conns.get(ident)
+        thread = threading.current_thread()
+        if entry is not None and entry[0] is thread:
+            self._stats["checkouts"] += 1
+            return entry[1]
+        conn = self._open()
+        with self._lock:
+            for other_ident, (t, c) in list(self._conns.items()):
+                if not t.is_alive() or other_ident == ident:
+                    del self._conns[other_ident]
+                    c.close()
+                    self._stats["connections_closed"] += 1
+            self._conns[ident] = (thread, conn)
+            self._stats["connections_opened"] += 1
+            self._stats["checkouts"] += 1
+        return conn
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """
+        Write transaction on this thread's connection. BEGIN IMMEDIATE takes the write lock
+        up front (waiting up to the busy timeout), so the wait is measured and the
+        transaction cannot fail later on a read-to-write lock upgrade.
+        """
+        c = self.get()
+        start = time.perf_counter()
+        try:
+            c.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            with self._lock:
+                self._stats["busy_errors"] += 1
+            raise
+        waited_ms = (time.perf_counter() - start) * 1000.0
+        DB_LOCK_WAIT_SECONDS.observe(waited_ms / 1000.0)
+        with self._lock:
+            s = self._stats
+            s["write_transactions"] += 1
+            s["lock_wait_ms_total"] += waited_ms
+            s["lock_wait_ms_max"] = max(s["lock_wait_ms_max"], waited_ms)
+            if waited_ms > LOCK_WAIT_CONTENDED_MS:
+                s["contended_writes"] += 1
+        try:
+            yield c
+            c.commit()
+        except BaseException:
+            for hook in self._rollback_hooks:
+                hook()  # before the rollback releases the lock
+            c.rollback()
+            raise
+
+    def on_rollback(self, hook) -> None:
+        """Call hook() whenever a write transaction is rolled back (while it still holds the lock)."""
+        self._rollback_hooks.append(hook)
+
+    def close(self) -> None:
+        with self._lock:
+            for _, c in self._conns.values():
+                c.close()
+                self._stats["connections_closed"] += 1
+            self._conns = {}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["open_connections"] = len(self._conns)
+        writes = out["write_transactions"]
+        out["lock_wait_ms_avg"] = out["lock_wait_ms_total"] / writes if writes else 0.0
+        out["busy_timeout_ms"] = self.busy_timeout_ms
+        return out
+
+
+class LearningStore:
+    """
+    What the app needs from learning storage: log conversion events, apply feedback, and read
+    publisher performance and learned boosts. MetricsStore keeps it in a local SQLite file;
+    learning_pg.PostgresMetricsStore in a PostgreSQL server that every node shares, so all
+    nodes learn into the same aggregates (LEARNING_BACKEND, see get_metrics_store).
+
+    Implementations provide the writes, lifetime reads and _bucket_rows; boost caching and
+    the windowed/decayed performance math live here. Both record each event's contribution
+    so re-logging and repeated feedback replace it instead of adding to it.
+    """
+
+    # Errors EventWriter treats as transient (one retry before dropping a batch)
+    write_errors: Tuple[type, ...] = (sqlite3.Error,)
+    boost_cache: BoostCache
+    boost_half_life_days: float
+
+    def log_event(self, event: ConversionEvent) -> None:
+        raise NotImplementedError
+
+    def log_events(self, events: List[ConversionEvent]) -> None:
+        raise NotImplementedError
+
+    def submit_feedback(
+        self,
+        event_id: str,
+        sources_cited: List[str],
+        answer_quality: Optional[float] = None,
+        user_rating: Optional[float] = None,
+        correction_made: bool = False,
+    ) -> bool:
+        raise NotImplementedError
+
+    def get_global_publisher_performance(
+        self,
+        query_cluster: Optional[str] = None,
+        min_sample_size: int = MIN_SAMPLE_SIZE,
+        customer_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def get_publisher_performance(
+        self, publisher: str, query_cluster: Optional[str] = None, min_sample_size: int = MIN_SAMPLE_SIZE,
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def event_count(self) -> int:
+        raise NotImplementedError
+
+    def has_event(self, event_id: str) -> bool:
+        """Whether event_id is a live (feedback-able) event; a read, no write lock."""
+        raise NotImplementedError
+
+    def check_aggregates(self) -> Dict[str, Any]:
+        """Whether the aggregate tables match a rebuild from the recorded events (see rebuild_aggregates)."""
+        raise NotImplementedError
+
+    def rebuild_aggregates(self, apply: bool = True) -> Dict[str, Any]:
+        """Recompute the aggregate tables from the recorded events; apply=False only reports the differences."""
+        raise NotImplementedError
+
+    def _bucket_rows(self, query_cluster: Optional[str], first_day: int) -> List[Tuple]:
+        """(cluster, publisher, day, purchases, citations, sum_quality, sum_cost, count) for days >= first_day."""
+        raise NotImplementedError
+
+    def pool_stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def archive_stats(self) -> Dict[str, Any]:
+        return {}
+
+    def storage_stats(self) -> Dict[str, Any]:
+        return {}
+
+    def close(self) -> None:
+        pass
+
+    @timed(DB_OP_SECONDS, "get_recent_publisher_performance")
+    def get_recent_publisher_performance(
+        self,
+        query_cluster: Optional[str] = None,
+        days: Optional[int] = 30,
+        half_life_days: Optional[float] = None,
+        min_sample_size: int = MIN_SAMPLE_SIZE,
+    ) -> Dict[str, Any]:
+        """
+        Publisher performance over the last `days` daily buckets (today included), in the same
+        shape as get_global_publisher_performance. With half_life_days, each day's totals are
+        weighted by 0.5 ** (age_days / half_life_days); days then defaults to
+        DECAY_HORIZON_HALF_LIVES half-lives. Reads at most days × publishers bucket rows, so the
+        cost does not depend on how much history the database holds.
+        k-anonymity applies to the unweighted event count in the window.
+        """
+        if days is None:
+            days = int(math.ceil((half_life_days or 0) * DECAY_HORIZON_HALF_LIVES)) or 30
+        today = _today()
+        first_day = today - max(days, 1) + 1
+        rows = self._bucket_rows(query_cluster, first_day)
+
+        sums: Dict[Tuple[str, str], List[float]] = {}
+        for cluster, publisher, day, purchases, citations, sum_q, sum_cost, count in rows:
+            w = 0.5 ** (max(today - day, 0) / half_life_days) if half_life_days else 1.0
+            acc = sums.setdefault((cluster, publisher), [0.0, 0.0, 0.0, 0.0, 0.0, 0])
+            acc[0] += w * purchases
+            acc[1] += w * citations
+            acc[2] += w * sum_q
+            acc[3] += w * sum_cost
+            acc[4] += w * count
+            acc[5] += count
+        weighted = [
+            (cluster, publisher) + tuple(acc[:5])
+            for (cluster, publisher), acc in sums.items()
+            if acc[5] >= min_sample_size
+        ]
+        by_cluster = _performance_by_cluster(weighted)
+        for (cluster, publisher), acc in sums.items():
+            if acc[5] >= min_sample_size:
+                by_cluster[cluster][publisher]["events_in_window"] = acc[5]
+        return {
+            "by_cluster": by_cluster,
+            "min_sample_size": min_sample_size,
+            "window_days": days,
+            "half_life_days": half_life_days,
+        }
+
+    @timed(DB_OP_SECONDS, "get_learned_domain_boost")
+    def get_learned_domain_boost(self, query_cluster: str) -> Dict[str, float]:
+        """
+        Return a boost map (publisher -> boost in [0, 1]) for the given cluster,
+        derived from citation_rate and value_per_dollar. Use to blend with static DOMAIN_BOOST.
+        Served from boost_cache when fresh; see boost_cache_stats() for hit/miss counters.
+        With boost_half_life_days > 0 the boost follows decayed recent performance instead
+        of lifetime totals.
+        """
+        cached, generation = self.boost_cache.get(query_cluster)
+        if cached is not None:
+            return cached
+        boost = self._compute_learned_domain_boost(query_cluster)
+        self.boost_cache.put(query_cluster, boost, generation)
+        return boost
+
+    def _compute_learned_domain_boost(self, query_cluster: str) -> Dict[str, float]:
+        if self.boost_half_life_days > 0:
+            perf = self.get_recent_publisher_performance(
+                query_cluster=query_cluster, days=None, half_life_days=self.boost_half_life_days,
+            )
+        else:
+            perf = self.get_global_publisher_performance(query_cluster=query_cluster)
+        cluster_data = perf.get("by_cluster", {}).get(query_cluster, {})
+        boost = {}
+        for pub, stats in cluster_data.items():
+            rate = stats["citation_rate"]
+            vpd = stats.get("value_per_dollar") or 0
+            # Normalize to roughly 0–0.4 range so we can add to static boosts
+            boost[pub] = min(0.4, rate * 0.3 + (min(vpd, 2.0) / 2.0) * 0.2)
+        return boost
+
+    def boost_cache_stats(self) -> Dict[str, Any]:
+        return self.boost_cache.stats()
+
+
+class MetricsStore(LearningStore):
     """
-    Persist conversion events and maintain global aggregates by (query_cluster, publisher).
+    Persist conversion events and maintain global aggregates by (query_cluster, publisher)
+    in a local SQLite file (the default LearningStore).
     Privacy: k-anonymity (only report when N >= MIN_SAMPLE_SIZE), optional DP noise.
     """
 
-    def __init__(self, db_path: Optional[str] = None):
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        boost_cache_ttl: Optional[float] = None,
+        boost_half_life_days: float = BOOST_HALF_LIFE_DAYS,
+        archive_dir: Optional[str] = None,
+    ):
         self.db_path = db_path or os.environ.get("LEARNING_DB", "learning.db")
+        self.boost_half_life_days = boost_half_life_days
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.boost_cache = BoostCache(BOOST_CACHE_TTL if boost_cache_ttl is None else boost_cache_ttl)
+        self._pool = ConnectionPool(self.db_path)
+        self.publisher_ids = PublisherIds()
+        self._pool.on_rollback(self.publisher_ids.clear)
+        self._closed = False
+        # Columnar tier for events older than ARCHIVE_AFTER_DAYS (see archive_events)
+        self.archive = EventArchive(
+            archive_dir or os.environ.get("EVENT_ARCHIVE_DIR") or str(Path(self.db_path).with_suffix(".archive"))
+        )
         self._init_schema()
+        if not self._backfill_state()["complete"]:
+            threading.Thread(target=self._backfill_in_background, name="event-sources-backfill", daemon=True).start()
 
     def _conn(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path)
+        """This thread's pooled connection (use for reads; writes go through self._pool.write())."""
+        return self._pool.get()
 
     def _init_schema(self) -> None:
         with self._conn() as c:
+            had_sources = c.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'event_sources'").fetchone() is not None
             c.executescript("""
                 CREATE TABLE IF NOT EXISTS conversion_events (
                     event_id TEXT PRIMARY KEY,
@@ -129,72 +714,229 @@ class MetricsStore:
                     count INTEGER NOT NULL DEFAULT 0,
                     PRIMARY KEY (query_cluster, publisher)
                 );
+
+                -- What each event added to global_aggregates (so feedback can replace it exactly)
+                CREATE TABLE IF NOT EXISTS event_contributions (
+                    event_id TEXT NOT NULL,
+                    query_cluster TEXT NOT NULL,
+                    publisher TEXT NOT NULL,
+                    purchases INTEGER NOT NULL,
+                    citations INTEGER NOT NULL,
+                    quality REAL NOT NULL,
+                    cost REAL NOT NULL,
+                    count INTEGER NOT NULL,
+                    has_quality INTEGER NOT NULL DEFAULT 0,
+                    day INTEGER,
+                    PRIMARY KEY (event_id, publisher)
+                );
+
+                -- Daily rollups of global_aggregates (day = UTC date ordinal of the event)
+                CREATE TABLE IF NOT EXISTS aggregate_buckets (
+                    query_cluster TEXT NOT NULL,
+                    day INTEGER NOT NULL,
+                    publisher TEXT NOT NULL,
+                    total_purchases INTEGER NOT NULL DEFAULT 0,
+                    total_citations INTEGER NOT NULL DEFAULT 0,
+                    sum_quality REAL NOT NULL DEFAULT 0,
+                    sum_cost REAL NOT NULL DEFAULT 0,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (query_cluster, day, publisher)
+                );
+                CREATE INDEX IF NOT EXISTS idx_buckets_day ON aggregate_buckets(day);
+
+                -- Publisher names interned to integer ids (never reassigned)
+                CREATE TABLE IF NOT EXISTS publishers (
+                    publisher_id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE
+                );
+
+                -- Each event's sources, one row per publisher it bought, cited or has utilization for
+                CREATE TABLE IF NOT EXISTS event_sources (
+                    event_id TEXT NOT NULL,
+                    publisher_id INTEGER NOT NULL,
+                    query_cluster TEXT NOT NULL,
+                    purchased INTEGER NOT NULL DEFAULT 0,
+                    cited INTEGER NOT NULL DEFAULT 0,
+                    utilization REAL,
+                    PRIMARY KEY (event_id, publisher_id)
+                ) WITHOUT ROWID;
+                -- Covers per-publisher reads (event_id rides along as the primary key)
+                CREATE INDEX IF NOT EXISTS idx_event_sources_publisher
+                    ON event_sources(publisher_id, query_cluster, purchased, cited, utilization);
+
+                CREATE TABLE IF NOT EXISTS store_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
             """)
+            if not had_sources:
+                # Events already logged get their event_sources rows from backfill_event_sources()
+                c.execute("""
+                    INSERT OR IGNORE INTO store_meta (key, value)
+                    SELECT 'event_sources_backfill_until', COALESCE(MAX(rowid), 0) FROM conversion_events
+                """)
+                c.execute("INSERT OR IGNORE INTO store_meta (key, value) VALUES ('event_sources_backfill_rowid', 0)")
+            columns = {r[1] for r in c.execute("PRAGMA table_info(event_contributions)")}
+            if "day" not in columns:
+                # Contributions recorded before daily buckets existed; rebuild_aggregates() fills day in
+                c.execute("ALTER TABLE event_contributions ADD COLUMN day INTEGER")
 
+    @contextmanager
+    def _aggregate_write(self) -> Iterator[Tuple[sqlite3.Connection, Dict[Tuple[str, int, str], List]]]:
+        """
+        Write transaction plus the aggregate deltas its changes accumulate, merged per
+        (cluster, day, publisher) and upserted into the canonical tables before commit: a
+        batch of events touching the same hot (cluster, publisher) rows updates each once.
+        """
+        deltas: Dict[Tuple[str, int, str], List] = {}
+        with self._pool.write() as c:
+            yield c, deltas
+            self._write_deltas(c, deltas)
+
+    @timed(DB_OP_SECONDS, "log_event")
     def log_event(self, event: ConversionEvent) -> None:
         """Store one conversion event and update global aggregates."""
-        with self._conn() as c:
-            c.execute("""
-                INSERT OR REPLACE INTO conversion_events (
-                    event_id, query_id, customer_id, timestamp,
-                    query_text, query_hash, query_cluster, intent,
-                    sources_purchased, total_cost, decision_confidence,
-                    sources_cited, citation_rate, utilization_by_source,
-                    answer_quality, user_rating, correction_made, cost_efficiency
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                event.event_id,
-                event.query_id,
-                event.customer_id,
-                event.timestamp,
-                event.query_text,
-                event.query_hash,
-                event.query_cluster,
-                event.intent,
-                json.dumps(event.sources_purchased),
-                event.total_cost,
-                event.decision_confidence,
-                json.dumps(event.sources_cited),
-                event.citation_rate,
-                json.dumps(event.utilization_by_source),
-                event.answer_quality,
-                event.user_rating,
-                1 if event.correction_made else 0,
-                event.cost_efficiency,
-            ))
-            self._update_global_aggregates(c, event)
-
-    def _update_global_aggregates(self, c: sqlite3.Connection, event: ConversionEvent) -> None:
-        """Update per-(cluster, publisher) aggregates. Quality/citations only when we have feedback."""
+        with self._aggregate_write() as (c, deltas):
+            self._insert_event(c, event, deltas)
+
+    @timed(DB_OP_SECONDS, "log_events")
+    def log_events(self, events: List[ConversionEvent]) -> None:
+        """Store many conversion events (and their aggregate updates) in a single transaction."""
+        if not events:
+            return
+        with self._aggregate_write() as (c, deltas):
+            for event in events:
+                self._insert_event(c, event, deltas)
+
+    def _insert_event(self, c: sqlite3.Connection, event: ConversionEvent, deltas: Dict) -> None:
+        c.execute("""
+            INSERT OR REPLACE INTO conversion_events (
+                event_id, query_id, customer_id, timestamp,
+                query_text, query_hash, query_cluster, intent,
+                sources_purchased, total_cost, decision_confidence,
+                sources_cited, citation_rate, utilization_by_source,
+                answer_quality, user_rating, correction_made, cost_efficiency
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            event.event_id,
+            event.query_id,
+            event.customer_id,
+            event.timestamp,
+            event.query_text,
+            event.query_hash,
+            event.query_cluster,
+            event.intent,
+            json.dumps(event.sources_purchased),
+            event.total_cost,
+            event.decision_confidence,
+            json.dumps(event.sources_cited),
+            event.citation_rate,
+            json.dumps(event.utilization_by_source),
+            event.answer_quality,
+            event.user_rating,
+            1 if event.correction_made else 0,
+            event.cost_efficiency,
+        ))
+        self._record_sources(
+            c, event.event_id, event.query_cluster or event.intent,
+            event.sources_purchased, event.sources_cited, event.utilization_by_source,
+        )
+        self._update_global_aggregates(c, event, deltas)
+
+    def _record_sources(
+        self,
+        c: sqlite3.Connection,
+        event_id: str,
+        cluster: str,
+        purchased: List[str],
+        cited: List[str],
+        utilization: Dict[str, float],
+    ) -> None:
+        """Replace the event's event_sources rows."""
+        ids = self.publisher_ids.resolve(c, [*purchased, *cited, *utilization])
+        c.execute("DELETE FROM event_sources WHERE event_id = ?", (event_id,))
+        c.executemany("""
+            INSERT INTO event_sources (event_id, publisher_id, query_cluster, purchased, cited, utilization)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, _source_rows(event_id, cluster, purchased, cited, utilization, ids))
+
+    def _update_global_aggregates(self, c: sqlite3.Connection, event: ConversionEvent, deltas: Dict) -> None:
+        """
+        Update per-(cluster, publisher) aggregates by this event's contribution.
+        Quality/citations only when we have feedback. Re-logging an event_id replaces its
+        previous contribution instead of adding to it.
+        """
         cluster = event.query_cluster or event.intent
-        # At log time we usually have no outcomes; quality/citations are added in submit_feedback
-        quality = None
-        if event.answer_quality is not None:
-            quality = event.answer_quality + _laplace_noise(DP_SENSITIVITY / DP_EPSILON)
-
-        for pub in event.sources_purchased:
-            cited = 1 if pub in event.sources_cited else 0
-            if quality is not None:
-                c.execute("""
-                    INSERT INTO global_aggregates (query_cluster, publisher, total_purchases, total_citations, sum_quality, sum_cost, count)
-                    VALUES (?, ?, 1, ?, ?, ?, 1)
-                    ON CONFLICT(query_cluster, publisher) DO UPDATE SET
-                        total_purchases = total_purchases + 1,
-                        total_citations = total_citations + ?,
-                        sum_quality = sum_quality + ?,
-                        sum_cost = sum_cost + ?,
-                        count = count + 1
-                """, (cluster, pub, cited, quality, event.total_cost, cited, quality, event.total_cost))
-            else:
-                c.execute("""
-                    INSERT INTO global_aggregates (query_cluster, publisher, total_purchases, total_citations, sum_quality, sum_cost, count)
-                    VALUES (?, ?, 1, 0, 0, ?, 1)
-                    ON CONFLICT(query_cluster, publisher) DO UPDATE SET
-                        total_purchases = total_purchases + 1,
-                        sum_cost = sum_cost + ?,
-                        count = count + 1
-                """, (cluster, pub, event.total_cost, event.total_cost))
+        new = _event_contributions(
+            cluster, event.sources_purchased, event.sources_cited, event.total_cost,
+            _outcome_quality(event.answer_quality, event.user_rating),
+        )
+        old = self._recorded_contributions(c, event.event_id)
+        self._apply_contributions(c, event.event_id, old, new, _event_day(event.timestamp), deltas)
+
+    def _recorded_contributions(self, c: sqlite3.Connection, event_id: str) -> Dict[Tuple[str, str], Tuple]:
+        """(cluster, publisher) -> (purchases, citations, quality, cost, count, has_quality, day)"""
+        rows = c.execute("""
+            SELECT query_cluster, publisher, purchases, citations, quality, cost, count, has_quality, day
+            FROM event_contributions WHERE event_id = ?
+        """, (event_id,)).fetchall()
+        return {(r[0], r[1]): tuple(r[2:]) for r in rows}
 
+    def _apply_contributions(
+        self,
+        c: sqlite3.Connection,
+        event_id: str,
+        old: Dict[Tuple[str, str], Tuple],
+        new: Dict[Tuple[str, str], Tuple],
+        day: int,
+        deltas: Dict[Tuple[str, int, str], List],
+    ) -> None:
+        """
+        Add (new - old) to the transaction's aggregate deltas (see _aggregate_write) and record
+        new as the event's contribution. An old contribution without a day predates the
+        buckets and goes under day 0, which only counts toward global_aggregates.
+        """
+        for sign, contributions in ((1, new), (-1, old)):
+            for (cluster, pub), vals in contributions.items():
+                vday = day if sign > 0 else (vals[6] if len(vals) > 6 and vals[6] is not None else 0)
+                acc = deltas.setdefault((cluster, vday, pub), [0, 0, 0.0, 0.0, 0])
+                for i in range(5):
+                    acc[i] += sign * vals[i]
+        if old:
+            c.execute("DELETE FROM event_contributions WHERE event_id = ?", (event_id,))
+        c.executemany("""
+            INSERT INTO event_contributions (event_id, query_cluster, publisher, purchases, citations, quality, cost, count, has_quality, day)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(event_id,) + key + vals[:6] + (day,) for key, vals in new.items()])
+
+    @staticmethod
+    def _write_deltas(c: sqlite3.Connection, deltas: Dict[Tuple[str, int, str], List]) -> None:
+        """Upsert a transaction's (cluster, day, publisher) deltas into aggregate_buckets and global_aggregates."""
+        bucket_rows, rows = _delta_rows(deltas)
+        if bucket_rows:
+            c.executemany("""
+                INSERT INTO aggregate_buckets (query_cluster, day, publisher, total_purchases, total_citations, sum_quality, sum_cost, count)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(query_cluster, day, publisher) DO UPDATE SET
+                    total_purchases = total_purchases + excluded.total_purchases,
+                    total_citations = total_citations + excluded.total_citations,
+                    sum_quality = sum_quality + excluded.sum_quality,
+                    sum_cost = sum_cost + excluded.sum_cost,
+                    count = count + excluded.count
+            """, bucket_rows)
+        if rows:
+            c.executemany("""
+                INSERT INTO global_aggregates (query_cluster, publisher, total_purchases, total_citations, sum_quality, sum_cost, count)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(query_cluster, publisher) DO UPDATE SET
+                    total_purchases = total_purchases + excluded.total_purchases,
+                    total_citations = total_citations + excluded.total_citations,
+                    sum_quality = sum_quality + excluded.sum_quality,
+                    sum_cost = sum_cost + excluded.sum_cost,
+                    count = count + excluded.count
+            """, rows)
+
+    @timed(DB_OP_SECONDS, "submit_feedback")
     def submit_feedback(
         self,
         event_id: str,
@@ -203,114 +945,961 @@ class MetricsStore:
         user_rating: Optional[float] = None,
         correction_made: bool = False,
     ) -> bool:
-        """Update an existing event with outcome feedback; recomputes aggregates for that event."""
-        with self._conn() as c:
+        """
+        Update an existing event with outcome feedback and replace its aggregate contribution:
+        the previously recorded contribution is subtracted and the new one added, so repeated
+        or corrected feedback is never double-counted. Cited flags are updated in event_sources
+        as set operations, and the purchased publishers are read back from there.
+        """
+        with self._aggregate_write() as (c, deltas):
             row = c.execute(
-                "SELECT query_cluster, intent, sources_purchased, total_cost FROM conversion_events WHERE event_id = ?",
+                """SELECT query_cluster, intent, sources_purchased, total_cost, sources_cited, utilization_by_source,
+                          answer_quality, user_rating, timestamp
+                   FROM conversion_events WHERE event_id = ?""",
                 (event_id,),
             ).fetchone()
             if not row:
                 return False
-            cluster, intent, purchased_json, total_cost = row
-            purchased = json.loads(purchased_json)
+            cluster, intent, purchased_json, total_cost, prev_cited_json, utilization_json, prev_aq, prev_ur, timestamp = row
+            cluster = cluster or intent
+            if c.execute("SELECT 1 FROM event_sources WHERE event_id = ? LIMIT 1", (event_id,)).fetchone() is None:
+                # Logged before event_sources existed and not backfilled yet
+                self._record_sources(c, event_id, cluster, json.loads(purchased_json), json.loads(prev_cited_json),
+                                     json.loads(utilization_json))
+
+            # Cited flags as set operations on event_sources: clear them, then set the cited publishers'
+            cited_ids = self.publisher_ids.resolve(c, sources_cited)
+            c.execute("UPDATE event_sources SET cited = 0 WHERE event_id = ? AND cited = 1", (event_id,))
+            c.executemany("""
+                INSERT INTO event_sources (event_id, publisher_id, query_cluster, cited) VALUES (?, ?, ?, 1)
+                ON CONFLICT(event_id, publisher_id) DO UPDATE SET cited = 1
+            """, [(event_id, pid, cluster) for pid in set(cited_ids.values())])
+            c.execute("DELETE FROM event_sources WHERE event_id = ? AND purchased = 0 AND cited = 0 AND utilization IS NULL",
+                      (event_id,))
+            purchased, cited = [], []
+            for name, was_cited in c.execute("""
+                SELECT p.name, s.cited FROM event_sources s JOIN publishers p ON p.publisher_id = s.publisher_id
+                WHERE s.event_id = ? AND s.purchased = 1
+            """, (event_id,)):
+                purchased.append(name)
+                if was_cited:
+                    cited.append(name)
             citation_rate = len(sources_cited) / len(purchased) if purchased else 0.0
-            quality = answer_quality if answer_quality is not None else user_rating
+            quality = _outcome_quality(answer_quality, user_rating)
             cost_eff = (quality / total_cost) if (quality is not None and total_cost > 0) else None
 
+            old = self._recorded_contributions(c, event_id)
+            if not old:
+                # Event logged before contributions were tracked: assume it contributed what its row says
+                old = _event_contributions(
+                    cluster, purchased, json.loads(prev_cited_json), total_cost,
+                    _outcome_quality(prev_aq, prev_ur), noisy=False,
+                )
+
             c.execute("""
                 UPDATE conversion_events SET
                     sources_cited = ?, citation_rate = ?, answer_quality = ?, user_rating = ?, correction_made = ?, cost_efficiency = ?
                 WHERE event_id = ?
             """, (json.dumps(sources_cited), citation_rate, answer_quality, user_rating, 1 if correction_made else 0, cost_eff, event_id))
 
-            # Re-aggregate: we'd need to subtract old contribution and add new. For simplicity, we don't back-propagate
-            # old aggregates; we only add the new outcome. So we update aggregates with the delta in quality/citations.
-            # Actually the event was already counted in aggregates at log time with 0 quality/citations. So we need to
-            # add the delta: +quality, +citations for each cited source. Easiest: run a one-off aggregate update
-            # for this event only (add quality and citations as if we're now seeing the outcome).
-            for pub in purchased:
-                cited = 1 if pub in sources_cited else 0
-                if quality is not None:
-                    q = quality + _laplace_noise(DP_SENSITIVITY / DP_EPSILON)
-                    c.execute("""
-                        UPDATE global_aggregates SET
-                            total_citations = total_citations + ?,
-                            sum_quality = sum_quality + ?
-                        WHERE query_cluster = ? AND publisher = ?
-                    """, (cited, q, cluster, pub))
-                else:
-                    c.execute("""
-                        UPDATE global_aggregates SET
-                            total_citations = total_citations + ?
-                        WHERE query_cluster = ? AND publisher = ?
-                    """, (cited, cluster, pub))
+            new = _event_contributions(cluster, purchased, cited, total_cost, quality)
+            self._apply_contributions(c, event_id, old, new, _event_day(timestamp), deltas)
+        self.boost_cache.invalidate([cluster])
         return True
 
+    def rebuild_aggregates(self, chunk_size: int = 5000, apply: bool = True) -> Dict[str, Any]:
+        """
+        Recompute global_aggregates and the daily aggregate_buckets from the conversion_events
+        log, streaming chunk_size events at a time (memory grows with distinct
+        (cluster, publisher, day) rows, not with events).
+        Recorded per-event contributions supply the DP-noised quality; events logged before
+        contributions were tracked get one derived from their row (recorded when applying).
+        Archived events (archive_events) are added from the archive's columns.
+        Reports whether the rebuilt totals agree with the incrementally maintained tables;
+        with apply=True the tables are replaced by the rebuild. With apply=False (a pure
+        check) nothing is written and no write lock is held during the scan.
+
+        Applying scans a read snapshot without the write lock, then swaps the result in with
+        one short write transaction that also adds what writers changed in the tables since
+        the snapshot (their current totals minus the snapshot's), so events and feedback
+        that arrive during the scan are kept. The archive is not part of the snapshot: if
+        events were archived meanwhile, the scan is repeated, the last time under the write
+        lock (REBUILD_ATTEMPTS).
+        """
+        if not apply:
+            c = self._conn()
+            self._begin_snapshot(c)  # one read snapshot across all chunks
+            try:
+                scan = self._rebuild_scan(c, chunk_size, False)
+            finally:
+                c.rollback()
+            return self._rebuild_report(scan, apply)
+
+        for attempt in range(REBUILD_ATTEMPTS):
+            if attempt == REBUILD_ATTEMPTS - 1:
+                with self._pool.write() as c:
+                    self.archive.recover(self._events_live)
+                    scan = self._rebuild_scan(c, chunk_size, True)
+                    report = self._rebuild_report(scan, apply)
+                    self._rebuild_swap(c, scan, since_snapshot=False)
+                break
+            with self._pool.write() as c:
+                # Settle another archiver's staged files, so the archive matches learning.db
+                self.archive.recover(self._events_live)
+                generation = self._meta(c, "archive_batches")
+            c = self._conn()
+            self._begin_snapshot(c)
+            try:
+                if self._meta(c, "archive_batches") != generation:
+                    continue
+                scan = self._rebuild_scan(c, chunk_size, True)
+            finally:
+                c.rollback()
+            report = self._rebuild_report(scan, apply)
+            with self._pool.write() as c:
+                if self._meta(c, "archive_batches") == generation:
+                    self._rebuild_swap(c, scan, since_snapshot=True)
+                    break
+        self.boost_cache.clear()
+        return report
+
+    @staticmethod
+    def _begin_snapshot(c: sqlite3.Connection) -> None:
+        """BEGIN a read snapshot on c (it starts at the first read); learning.db's write lock is never taken."""
+        c.execute("BEGIN")
+        c.execute("SELECT COUNT(*) FROM store_meta").fetchone()
+
+    def _rebuild_scan(
+        self, c: sqlite3.Connection, chunk_size: int, apply: bool,
+    ) -> Dict[str, Any]:
+        """
+        Rebuilt totals from the event log and archive, and the current totals they are
+        compared with, both as c sees them. Writes nothing: the
+        contributions to record for untracked events and the contribution days to fill in are
+        returned for _rebuild_swap.
+        """
+        totals: Dict[Tuple[str, str], List[float]] = {}
+        bucket_totals: Dict[Tuple[str, int, str], List[float]] = {}
+        untracked: Dict[str, List[Tuple]] = {}
+        day_fixes: List[Tuple[int, str]] = []
+        scanned = 0
+        # Days dropped by prune_aggregate_buckets stay out of the daily buckets
+        pruned_before = int(self._meta(c, "aggregate_buckets_pruned_before") or 0)
+        last_rowid = 0
+        while True:
+            rows = c.execute("""
+                SELECT rowid, event_id, query_cluster, intent, sources_purchased, sources_cited,
+                       total_cost, answer_quality, user_rating, timestamp
+                FROM conversion_events WHERE rowid > ? ORDER BY rowid LIMIT ?
+            """, (last_rowid, chunk_size)).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            scanned += len(rows)
+            recorded: Dict[str, Dict[Tuple[str, str], Tuple]] = {}
+            placeholders = ",".join("?" * len(rows))
+            for r in c.execute(f"""
+                SELECT event_id, query_cluster, publisher, purchases, citations, quality, cost, count, has_quality, day
+                FROM event_contributions WHERE event_id IN ({placeholders})
+            """, [r[1] for r in rows]):
+                recorded.setdefault(r[0], {})[(r[1], r[2])] = tuple(r[3:])
+            for _, event_id, cluster, intent, purchased_json, cited_json, total_cost, aq, ur, ts in rows:
+                cluster = cluster or intent
+                day = _event_day(ts)
+                prev = recorded.get(event_id)
+                # Only events that get their contribution recorded now draw fresh noise
+                contrib = _event_contributions(
+                    cluster, json.loads(purchased_json), json.loads(cited_json), total_cost,
+                    _outcome_quality(aq, ur), noisy=prev is None and apply,
+                )
+                if prev is None:
+                    untracked[event_id] = [(event_id,) + key + vals + (day,) for key, vals in contrib.items()]
+                else:
+                    if any(v[6] is None for v in prev.values()):
+                        day_fixes.append((day, event_id))
+                    # Keep the recorded (noised) quality; everything else is re-derived from the event row
+                    contrib = {
+                        key: vals[:2] + (prev[key][2] if key in prev else vals[2],) + vals[3:]
+                        for key, vals in contrib.items()
+                    }
+                for key, vals in contrib.items():
+                    _add_to(totals, key, vals)
+                    if day >= pruned_before:
+                        _add_to(bucket_totals, (key[0], day, key[1]), vals)
+
+        # Archived events still count; the archive keeps the quality they contributed
+        for (cluster, day, pub), vals in self.archive.publisher_totals(by_day=True).items():
+            _add_to(totals, (cluster, pub), vals)
+            if day >= pruned_before:
+                _add_to(bucket_totals, (cluster, day, pub), vals)
+
+        current, current_buckets = self._current_aggregates(c, pruned_before)
+        return {
+            "totals": totals,
+            "bucket_totals": bucket_totals,
+            "current": current,
+            "current_buckets": current_buckets,
+            "untracked": untracked,
+            "day_fixes": day_fixes,
+            "events_scanned": scanned,
+            "events_archived": self.archive.last_scan.get("events", 0),
+        }
+
+    @staticmethod
+    def _current_aggregates(c: sqlite3.Connection, pruned_before: int) -> Tuple[Dict[Tuple, Tuple], Dict[Tuple, Tuple]]:
+        """global_aggregates and aggregate_buckets (from pruned_before) as c sees them."""
+        current = {
+            (r[0], r[1]): r[2:]
+            for r in c.execute("""
+                SELECT query_cluster, publisher, total_purchases, total_citations, sum_quality, sum_cost, count
+                FROM global_aggregates
+            """)
+        }
+        current_buckets = {
+            (r[0], r[1], r[2]): r[3:]
+            for r in c.execute("""
+                SELECT query_cluster, day, publisher, total_purchases, total_citations, sum_quality, sum_cost, count
+                FROM aggregate_buckets WHERE day >= ?
+            """, (pruned_before,))
+        }
+        return current, current_buckets
+
+    def _rebuild_swap(self, c: sqlite3.Connection, scan: Dict[str, Any], since_snapshot: bool) -> None:
+        """
+        Replace the aggregate tables with a rebuild, inside c's write transaction. With
+        since_snapshot, the scan read an earlier snapshot: what the tables gained since then is added on top, and the untracked events' contributions are
+        recorded only for events still without one.
+        """
+        totals, bucket_totals = scan["totals"], scan["bucket_totals"]
+        pruned_before = int(self._meta(c, "aggregate_buckets_pruned_before") or 0)
+        untracked = scan["untracked"]
+        if since_snapshot:
+            current, current_buckets = self._current_aggregates(c, pruned_before)
+            for now, then, rebuilt in ((current, scan["current"], totals),
+                                       (current_buckets, scan["current_buckets"], bucket_totals)):
+                for key in set(now) | set(then):
+                    delta = [a - b for a, b in zip(now.get(key, _ZERO_CONTRIBUTION[:5]), then.get(key, _ZERO_CONTRIBUTION[:5]))]
+                    if any(delta):
+                        _add_to(rebuilt, key, delta)
+            # Events archived, or given a contribution by feedback, after the snapshot
+            ids = list(untracked)
+            still_untracked = set()
+            for chunk in _chunks(ids, 500):
+                marks = ",".join("?" * len(chunk))
+                still_untracked.update(r[0] for r in c.execute(f"""
+                    SELECT event_id FROM conversion_events WHERE event_id IN ({marks})
+                    AND event_id NOT IN (SELECT event_id FROM event_contributions WHERE event_id IN ({marks}))
+                """, chunk + chunk))
+            untracked = {event_id: rows for event_id, rows in untracked.items() if event_id in still_untracked}
+        c.executemany("""
+            INSERT INTO event_contributions (event_id, query_cluster, publisher, purchases, citations, quality, cost, count, has_quality, day)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [row for rows in untracked.values() for row in rows])
+        c.executemany("UPDATE event_contributions SET day = ? WHERE event_id = ? AND day IS NULL", scan["day_fixes"])
+        c.execute("DELETE FROM global_aggregates")
+        c.executemany("""
+            INSERT INTO global_aggregates (query_cluster, publisher, total_purchases, total_citations, sum_quality, sum_cost, count)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [key + tuple(vals) for key, vals in totals.items()])
+        c.execute("DELETE FROM aggregate_buckets")
+        c.executemany("""
+            INSERT INTO aggregate_buckets (query_cluster, day, publisher, total_purchases, total_citations, sum_quality, sum_cost, count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [key + tuple(vals) for key, vals in bucket_totals.items() if key[1] >= pruned_before])
+
+    @staticmethod
+    def _rebuild_report(scan: Dict[str, Any], apply: bool) -> Dict[str, Any]:
+        mismatches = _aggregate_mismatches(scan["current"], scan["totals"])
+        bucket_mismatches = _aggregate_mismatches(
+            scan["current_buckets"], scan["bucket_totals"], key_names=("query_cluster", "day", "publisher"),
+        )
+        return {
+            "mismatches": mismatches,
+            "bucket_mismatches": bucket_mismatches,
+            "events_archived": scan["events_archived"],
+            "events_scanned": scan["events_scanned"],
+            "events_without_contributions": len(scan["untracked"]),
+            "aggregate_rows": len(scan["totals"]),
+            "consistent": not mismatches and not bucket_mismatches,
+            "applied": apply,
+        }
+
+    def check_aggregates(self, chunk_size: int = 5000) -> Dict[str, Any]:
+        """Compare global_aggregates with a streaming rebuild from the event log, without writing."""
+        return self.rebuild_aggregates(chunk_size=chunk_size, apply=False)
+
+    def archive_events(
+        self,
+        before_day: Optional[int] = None,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        max_batches: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Move events from UTC days before before_day (default: ARCHIVE_AFTER_DAYS ago) into the
+        columnar archive, oldest first, batch_size events per write transaction: the batch's
+        partition files are written and fsynced, its event and contribution rows deleted,
+        and the files made visible after the commit. Aggregates are not touched (archived
+        events keep counting), so learned boosts do not change. Feedback for an archived
+        event is no longer accepted.
+        """
+        archive = self.archive
+        with self._pool.write():
+            # Under the write lock, so another archiver's staged batch is either committed or not
+            archive.recover(self._events_live)
+        if before_day is None:
+            before_day = _today() - ARCHIVE_AFTER_DAYS
+        cutoff = date.fromordinal(before_day).isoformat()
+        report = {"before": cutoff, "archived": 0, "batches": 0, "partitions_written": 0}
+        while max_batches is None or report["batches"] < max_batches:
+            staged: List[str] = []
+            try:
+                with self._pool.write() as c:
+                    rows = c.execute("""
+                        SELECT event_id, timestamp, customer_id, query_text, query_cluster, intent, sources_purchased,
+                               sources_cited, total_cost, answer_quality, user_rating, correction_made
+                        FROM conversion_events WHERE timestamp < ? ORDER BY timestamp LIMIT ?
+                    """, (cutoff, batch_size)).fetchall()
+                    if not rows:
+                        break
+                    ids = [r[0] for r in rows]
+                    recorded: Dict[str, Dict[str, Tuple[float, int]]] = {}
+                    for chunk in _chunks(ids, 500):
+                        for event_id, pub, quality, has_quality in c.execute(f"""
+                            SELECT event_id, publisher, quality, has_quality FROM event_contributions
+                            WHERE event_id IN ({",".join("?" * len(chunk))})
+                        """, chunk):
+                            recorded.setdefault(event_id, {})[pub] = (quality, has_quality)
+                    by_day: Dict[int, List[ArchivedEvent]] = {}
+                    for (event_id, ts, customer_id, query_text, cluster, intent, purchased_json, cited_json,
+                         total_cost, aq, ur, correction) in rows:
+                        cluster = cluster or intent
+                        purchased, cited = json.loads(purchased_json), json.loads(cited_json)
+                        contrib = recorded.get(event_id)
+                        if contrib is None:
+                            # Logged before contributions were tracked: what its row says it added
+                            derived = _event_contributions(cluster, purchased, cited, total_cost,
+                                                           _outcome_quality(aq, ur), noisy=False)
+                            contrib = {pub: (vals[2], vals[5]) for (_, pub), vals in derived.items()}
+                        by_day.setdefault(_event_day(ts), []).append(ArchivedEvent(
+                            event_id=event_id, timestamp=ts, customer_id=customer_id, query_text=query_text,
+                            cluster=cluster, total_cost=total_cost, answer_quality=aq, user_rating=ur,
+                            correction_made=bool(correction), purchased=purchased, cited=cited,
+                            contributed_quality={pub: q for pub, (q, _) in contrib.items()},
+                            has_quality=any(h for _, h in contrib.values()),
+                        ))
+                    for day, events in sorted(by_day.items()):
+                        staged.append(archive.stage(day, events))
+                    # Tells a concurrent rebuild_aggregates that its archive scan is out of date
+                    self._set_meta(c, "archive_batches", int(self._meta(c, "archive_batches") or 0) + 1)
+                    for chunk in _chunks(ids, 500):
+                        marks = ",".join("?" * len(chunk))
+                        c.execute(f"DELETE FROM event_contributions WHERE event_id IN ({marks})", chunk)
+                        c.execute(f"DELETE FROM event_sources WHERE event_id IN ({marks})", chunk)
+                        c.execute(f"DELETE FROM conversion_events WHERE event_id IN ({marks})", chunk)
+            except BaseException:
+                archive.discard(staged)
+                raise
+            archive.commit(staged)
+            report["archived"] += len(rows)
+            report["batches"] += 1
+            report["partitions_written"] += len(staged)
+        return report
+
+    def _events_live(self, event_ids: List[str]) -> bool:
+        """True if any of the events is still in conversion_events."""
+        c = self._conn()
+        for chunk in _chunks(event_ids, 500):
+            if c.execute(f"SELECT 1 FROM conversion_events WHERE event_id IN ({','.join('?' * len(chunk))}) LIMIT 1",
+                         chunk).fetchone():
+                return True
+        return False
+
+    def archive_stats(self) -> Dict[str, Any]:
+        return self.archive.stats()
+
+    def backfill_event_sources(
+        self, batch_size: int = SOURCES_BACKFILL_BATCH, max_batches: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Fill event_sources for the events logged before the table existed, from their JSON
+        source lists: batch_size events per write transaction in rowid order, resuming where
+        the previous call stopped (progress is kept in store_meta). Events that already have
+        rows (feedback recorded them) are left alone. Started in the background when a store
+        opens a database that still needs it.
+        """
+        report = {"backfilled": 0, "batches": 0}
+        while max_batches is None or report["batches"] < max_batches:
+            with self._pool.write() as c:
+                last_rowid, until = self._backfill_progress(c)
+                if last_rowid >= until:
+                    break
+                rows = c.execute("""
+                    SELECT rowid, event_id, query_cluster, intent, sources_purchased, sources_cited, utilization_by_source
+                    FROM conversion_events WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?
+                """, (last_rowid, until, batch_size)).fetchall()
+                parsed = [(r[1], r[2] or r[3], json.loads(r[4]), json.loads(r[5]), json.loads(r[6])) for r in rows]
+                ids = self.publisher_ids.resolve(
+                    c, {name for _, _, purchased, cited, util in parsed for name in (*purchased, *cited, *util)})
+                c.executemany("""
+                    INSERT OR IGNORE INTO event_sources (event_id, publisher_id, query_cluster, purchased, cited, utilization)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, [row for event_id, cluster, purchased, cited, util in parsed
+                      for row in _source_rows(event_id, cluster, purchased, cited, util, ids)])
+                c.execute("UPDATE store_meta SET value = ? WHERE key = 'event_sources_backfill_rowid'",
+                          (rows[-1][0] if rows else until,))
+            report["backfilled"] += len(rows)
+            report["batches"] += 1
+        report.update(self._backfill_state())
+        return report
+
+    @staticmethod
+    def _backfill_progress(c: sqlite3.Connection) -> Tuple[int, int]:
+        """(last backfilled rowid, last rowid that needs it); done once the first reaches the second."""
+        meta = dict(c.execute("""
+            SELECT key, value FROM store_meta
+            WHERE key IN ('event_sources_backfill_rowid', 'event_sources_backfill_until')
+        """).fetchall())
+        return int(meta.get("event_sources_backfill_rowid", 0)), int(meta.get("event_sources_backfill_until", 0))
+
+    def _backfill_state(self) -> Dict[str, Any]:
+        last_rowid, until = self._backfill_progress(self._conn())
+        return {"complete": last_rowid >= until, "rowid": last_rowid, "until_rowid": until}
+
+    # ─── Retention (driven by retention.py) ───────────────────────────────
+    @staticmethod
+    def _meta(c: sqlite3.Connection, key: str) -> Optional[str]:
+        row = c.execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _set_meta(c: sqlite3.Connection, key: str, value: Any) -> None:
+        c.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)", (key, value))
+
+    def redact_query_text(
+        self, before_day: int, batch_size: int = RETENTION_BATCH_SIZE, max_batches: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Blank query_text of live events from UTC days before before_day (query_hash stays),
+        batch_size rows per write transaction. Walks idx_events_timestamp from a saved
+        (timestamp, rowid) position, so already redacted history is not rescanned; an event
+        logged later with an older timestamp than that position is left to the archive.
+        """
+        cutoff = date.fromordinal(before_day).isoformat()
+        report = {"before": cutoff, "redacted": 0, "batches": 0}
+        while max_batches is None or report["batches"] < max_batches:
+            with self._pool.write() as c:
+                last_ts, last_rowid = json.loads(self._meta(c, "query_text_redacted_through") or '["", 0]')
+                rows = c.execute("""
+                    SELECT rowid, timestamp FROM conversion_events
+                    WHERE (timestamp, rowid) > (?, ?) AND timestamp < ?
+                    ORDER BY timestamp, rowid LIMIT ?
+                """, (last_ts, last_rowid, cutoff, batch_size)).fetchall()
+                if not rows:
+                    break
+                for chunk in _chunks([r[0] for r in rows], 500):
+                    report["redacted"] += c.execute(
+                        f"UPDATE conversion_events SET query_text = '' WHERE query_text != '' AND rowid IN ({','.join('?' * len(chunk))})",
+                        chunk).rowcount
+                self._set_meta(c, "query_text_redacted_through", json.dumps([rows[-1][1], rows[-1][0]]))
+            report["batches"] += 1
+        return report
+
+    def prune_aggregate_buckets(
+        self, before_day: int, batch_size: int = RETENTION_BATCH_SIZE, max_batches: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Delete daily aggregate_buckets rows before before_day, batch_size rows per write
+        transaction. Lifetime totals (global_aggregates) are kept; windowed reads
+        (get_recent_publisher_performance) see nothing before the cutoff, and
+        rebuild_aggregates no longer recreates those days.
+        """
+        report = {"before": date.fromordinal(before_day).isoformat(), "pruned": 0, "batches": 0}
+        while max_batches is None or report["batches"] < max_batches:
+            with self._pool.write() as c:
+                if int(self._meta(c, "aggregate_buckets_pruned_before") or 0) < before_day:
+                    self._set_meta(c, "aggregate_buckets_pruned_before", before_day)
+                n = c.execute("""
+                    DELETE FROM aggregate_buckets WHERE rowid IN (
+                        SELECT rowid FROM aggregate_buckets WHERE day < ? LIMIT ?)
+                """, (before_day, batch_size)).rowcount
+            if not n:
+                break
+            report["pruned"] += n
+            report["batches"] += 1
+        return report
+
+    def compact_archive(
+        self,
+        redact_before_day: Optional[int] = None,
+        target_rows: Optional[int] = None,
+        max_groups: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Merge each archived day's small partitions into files of up to target_rows events
+        (default ARCHIVE_COMPACT_ROWS), blanking query text on days before redact_before_day.
+        Each group is rewritten under the write lock, which serializes it with archive_events
+        here and in other processes; aggregates are unaffected.
+        """
+        archive = self.archive
+        with self._pool.write():
+            archive.recover(self._events_live)
+        plan = archive.compaction_plan(redact_before_day, **({"target_rows": target_rows} if target_rows else {}))
+        report = {"groups": 0, "partitions_in": 0, "partitions_out": 0, "bytes_before": 0, "bytes_after": 0,
+                  "query_text_redacted": 0, "pending_groups": len(plan)}
+        for parts, redact in plan:
+            if max_groups is not None and report["groups"] >= max_groups:
+                break
+            with self._pool.write():
+                done = archive.rewrite(parts, redact_query_text=redact)
+            report["pending_groups"] -= 1
+            if done is None:
+                continue
+            report["groups"] += 1
+            report["partitions_in"] += done["partitions"]
+            report["partitions_out"] += 1
+            report["bytes_before"] += done["bytes_before"]
+            report["bytes_after"] += done["bytes_after"]
+            report["query_text_redacted"] += done["query_text_redacted"]
+        return report
+
+    def storage_stats(self) -> Dict[str, Any]:
+        """Database pages in use and free, and the auto_vacuum mode."""
+        c = self._conn()
+        page_size = c.execute("PRAGMA page_size").fetchone()[0]
+        pages = c.execute("PRAGMA page_count").fetchone()[0]
+        free = c.execute("PRAGMA freelist_count").fetchone()[0]
+        mode = c.execute("PRAGMA auto_vacuum").fetchone()[0]
+        return {
+            "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(mode, str(mode)),
+            "page_size": page_size,
+            "file_bytes": pages * page_size,
+            "free_bytes": free * page_size,
+        }
+
+    def incremental_vacuum(self, step_pages: int = VACUUM_STEP_PAGES, max_steps: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Return free pages to the filesystem, step_pages per write transaction. Needs
+        auto_vacuum=INCREMENTAL, which databases created by this version have; older ones
+        get it from enable_incremental_vacuum(). Otherwise free pages are only reused.
+        """
+        before = self.storage_stats()
+        steps = 0
+        if before["auto_vacuum"] == "incremental":
+            free = before["free_bytes"] // before["page_size"]
+            while free and (max_steps is None or steps < max_steps):
+                with self._pool.write() as c:
+                    # sqlite3 steps a statement without result columns only once: one page per call
+                    for _ in range(min(free, step_pages)):
+                        c.execute("PRAGMA incremental_vacuum(1)")
+                    free = c.execute("PRAGMA freelist_count").fetchone()[0]
+                steps += 1
+        after = self.storage_stats()
+        return {**after, "steps": steps, "bytes_reclaimed": before["file_bytes"] - after["file_bytes"]}
+
+    def enable_incremental_vacuum(self) -> Dict[str, Any]:
+        """
+        Switch an existing database to auto_vacuum=INCREMENTAL. This runs a full VACUUM,
+        which rewrites the file and blocks writers until it finishes: a maintenance-window
+        operation (python retention.py vacuum --enable-incremental).
+        """
+        before = self.storage_stats()
+        c = self._conn()
+        c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        c.execute("VACUUM")
+        after = self.storage_stats()
+        return {**after, "bytes_reclaimed": before["file_bytes"] - after["file_bytes"]}
+
+    def _backfill_in_background(self) -> None:
+        while not self._closed:
+            try:
+                if self.backfill_event_sources(max_batches=1)["complete"]:
+                    return
+            except sqlite3.Error:
+                logger.exception("event_sources backfill batch failed; retrying")
+                time.sleep(1.0)
+            time.sleep(SOURCES_BACKFILL_PAUSE_S)
+
+    @timed(DB_OP_SECONDS, "get_global_publisher_performance")
     def get_global_publisher_performance(
         self,
         query_cluster: Optional[str] = None,
         min_sample_size: int = MIN_SAMPLE_SIZE,
+        customer_id: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Return learned publisher performance by cluster.
         Only includes (cluster, publisher) with count >= min_sample_size (k-anonymity).
+        With customer_id, only that customer's events count: live events are summed from
+        their recorded contributions and archived ones by the archive's column scan.
         """
+        if customer_id is not None:
+            totals = self._customer_totals(customer_id, query_cluster)
+            rows = [key + tuple(vals) for key, vals in sorted(totals.items()) if vals[4] >= min_sample_size]
+            return {"by_cluster": _performance_by_cluster(rows), "min_sample_size": min_sample_size,
+                    "customer_id": customer_id}
         with self._conn() as c:
-            if query_cluster:
-                rows = c.execute("""
-                    SELECT query_cluster, publisher, total_purchases, total_citations, sum_quality, sum_cost, count
-                    FROM global_aggregates WHERE query_cluster = ? AND count >= ?
-                """, (query_cluster, min_sample_size)).fetchall()
-            else:
-                rows = c.execute("""
-                    SELECT query_cluster, publisher, total_purchases, total_citations, sum_quality, sum_cost, count
-                    FROM global_aggregates WHERE count >= ?
-                """, (min_sample_size,)).fetchall()
-
-        by_cluster: Dict[str, Dict[str, Dict[str, Any]]] = {}
-        for cluster, publisher, purchases, citations, sum_q, sum_cost, count in rows:
-            if cluster not in by_cluster:
-                by_cluster[cluster] = {}
-            avg_cost = sum_cost / count if count else 0
-            avg_quality = sum_q / count if count else 0
-            value_per_dollar = avg_quality / avg_cost if (count and avg_cost > 0) else 0
-            by_cluster[cluster][publisher] = {
+            rows = self._aggregate_rows(c, query_cluster, min_sample_size)
+        return {"by_cluster": _performance_by_cluster(rows), "min_sample_size": min_sample_size}
+
+    @staticmethod
+    def _aggregate_rows(c: sqlite3.Connection, query_cluster: Optional[str], min_sample_size: int) -> List[Tuple]:
+        if query_cluster:
+            return c.execute("""
+                SELECT query_cluster, publisher, total_purchases, total_citations, sum_quality, sum_cost, count
+                FROM global_aggregates WHERE query_cluster = ? AND count >= ?
+            """, (query_cluster, min_sample_size)).fetchall()
+        return c.execute("""
+            SELECT query_cluster, publisher, total_purchases, total_citations, sum_quality, sum_cost, count
+            FROM global_aggregates WHERE count >= ?
+        """, (min_sample_size,)).fetchall()
+
+    def _customer_totals(self, customer_id: str, query_cluster: Optional[str]) -> Dict[Tuple[str, str], List[float]]:
+        sql = """
+            SELECT ec.query_cluster, ec.publisher, SUM(ec.purchases), SUM(ec.citations), SUM(ec.quality),
+                   SUM(ec.cost), SUM(ec.count)
+            FROM conversion_events e JOIN event_contributions ec ON ec.event_id = e.event_id
+            WHERE e.customer_id = ?
+        """
+        params: List[Any] = [customer_id]
+        if query_cluster:
+            sql += " AND ec.query_cluster = ?"
+            params.append(query_cluster)
+        with self._conn() as c:
+            totals = {(r[0], r[1]): list(r[2:]) for r in c.execute(sql + " GROUP BY ec.query_cluster, ec.publisher", params)}
+        for key, vals in self.archive.publisher_totals(query_cluster=query_cluster or None, customer_id=customer_id).items():
+            acc = totals.setdefault(key, [0, 0, 0.0, 0.0, 0])
+            for i in range(5):
+                acc[i] += vals[i]
+        return totals
+
+    @timed(DB_OP_SECONDS, "get_publisher_performance")
+    def get_publisher_performance(
+        self,
+        publisher: str,
+        query_cluster: Optional[str] = None,
+        min_sample_size: int = MIN_SAMPLE_SIZE,
+    ) -> Dict[str, Any]:
+        """
+        One publisher across query clusters, grouped in SQL over event_sources' covering
+        index: purchases, citations of purchased copies, citations without a purchase, and
+        mean reported utilization. Archived events add their purchases and citations.
+        Only clusters with purchase_count >= min_sample_size are reported (k-anonymity).
+        """
+        sql = """
+            SELECT s.query_cluster, SUM(s.purchased), SUM(s.purchased * s.cited), SUM((1 - s.purchased) * s.cited),
+                   COUNT(s.utilization), SUM(s.utilization)
+            FROM publishers p JOIN event_sources s ON s.publisher_id = p.publisher_id
+            WHERE p.name = ?
+        """
+        params: List[Any] = [publisher]
+        if query_cluster:
+            sql += " AND s.query_cluster = ?"
+            params.append(query_cluster)
+        with self._conn() as c:
+            totals = {r[0]: list(r[1:]) for r in c.execute(sql + " GROUP BY s.query_cluster", params)}
+        for (cluster, pub), vals in self.archive.publisher_totals(query_cluster=query_cluster or None).items():
+            if pub == publisher:
+                acc = totals.setdefault(cluster, [0, 0, 0, 0, None])
+                acc[0] += vals[0]
+                acc[1] += vals[1]
+        by_cluster = {}
+        for cluster, (purchases, citations, unpurchased, util_n, util_sum) in sorted(totals.items()):
+            if purchases < min_sample_size:
+                continue
+            by_cluster[cluster] = {
                 "purchase_count": purchases,
                 "citation_count": citations,
                 "citation_rate": citations / purchases if purchases else 0,
-                "avg_quality": avg_quality,
-                "avg_cost": avg_cost,
-                "value_per_dollar": value_per_dollar,
-                "sample_size": count,
+                "cited_without_purchase": unpurchased,
+                "avg_utilization": util_sum / util_n if util_n else None,
             }
-        return {"by_cluster": by_cluster, "min_sample_size": min_sample_size}
+        return {
+            "publisher": publisher,
+            "by_cluster": by_cluster,
+            "min_sample_size": min_sample_size,
+            "backfill_complete": self._backfill_state()["complete"],
+        }
 
-    def get_learned_domain_boost(self, query_cluster: str) -> Dict[str, float]:
-        """
-        Return a boost map (publisher -> boost in [0, 1]) for the given cluster,
-        derived from citation_rate and value_per_dollar. Use to blend with static DOMAIN_BOOST.
-        """
-        perf = self.get_global_publisher_performance(query_cluster=query_cluster)
-        cluster_data = perf.get("by_cluster", {}).get(query_cluster, {})
-        boost = {}
-        for pub, stats in cluster_data.items():
-            rate = stats["citation_rate"]
-            vpd = stats.get("value_per_dollar") or 0
-            # Normalize to roughly 0–0.4 range so we can add to static boosts
-            boost[pub] = min(0.4, rate * 0.3 + (min(vpd, 2.0) / 2.0) * 0.2)
-        return boost
+    def _bucket_rows(self, query_cluster: Optional[str], first_day: int) -> List[Tuple]:
+        with self._conn() as c:
+            if query_cluster:
+                return c.execute("""
+                    SELECT query_cluster, publisher, day, total_purchases, total_citations, sum_quality, sum_cost, count
+                    FROM aggregate_buckets WHERE query_cluster = ? AND day >= ?
+                """, (query_cluster, first_day)).fetchall()
+            return c.execute("""
+                SELECT query_cluster, publisher, day, total_purchases, total_citations, sum_quality, sum_cost, count
+                FROM aggregate_buckets WHERE day >= ?
+            """, (first_day,)).fetchall()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool and write-lock wait statistics."""
+        return self._pool.stats()
+
+    def close(self) -> None:
+        self._closed = True
+        self._pool.close()
 
+    @timed(DB_OP_SECONDS, "event_count")
     def event_count(self) -> int:
+        """Events logged, archived ones included."""
         with self._conn() as c:
-            return c.execute("SELECT COUNT(*) FROM conversion_events").fetchone()[0]
+            live = c.execute("SELECT COUNT(*) FROM conversion_events").fetchone()[0]
+        return live + self.archive.event_count()
+
+    @timed(DB_OP_SECONDS, "has_event")
+    def has_event(self, event_id: str) -> bool:
+        """Whether event_id is in conversion_events (archived events take no feedback)."""
+        with self._conn() as c:
+            return c.execute("SELECT 1 FROM conversion_events WHERE event_id = ?", (event_id,)).fetchone() is not None
 
 
 # Singleton store for the app
-_store: Optional[MetricsStore] = None
+_store: Optional[LearningStore] = None
 
 
-def get_metrics_store() -> MetricsStore:
+def get_metrics_store() -> LearningStore:
+    """The process's store: SQLite at LEARNING_DB, or PostgreSQL at LEARNING_DB_URL with LEARNING_BACKEND=postgres."""
     global _store
     if _store is None:
-        _store = MetricsStore()
+        if LEARNING_BACKEND == "postgres":
+            from learning_pg import PostgresMetricsStore
+            _store = PostgresMetricsStore()
+        else:
+            _store = MetricsStore()
     return _store
+
+
+class EventWriter:
+    """
+    Write-behind logger for conversion events.
+    submit() enqueues into a bounded queue; a background thread group-commits batches via
+    MetricsStore.log_events, closing a batch at batch_size events or flush_ms after its first
+    event. When the queue is full, on_full="block" applies backpressure (waits up to
+    block_timeout_ms, then writes synchronously) and on_full="drop" sheds the event.
+    submit_batch() queues events that must commit together (one queue slot, never split
+    across log_events calls). close() (registered with atexit) drains everything still queued.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        store: LearningStore,
+        max_queue: int = EVENT_QUEUE_SIZE,
+        batch_size: int = EVENT_BATCH_SIZE,
+        flush_ms: float = EVENT_FLUSH_MS,
+        on_full: str = EVENT_QUEUE_FULL,
+        block_timeout_ms: float = EVENT_BLOCK_TIMEOUT_MS,
+        enabled: bool = True,
+    ):
+        if on_full not in ("block", "drop"):
+            raise ValueError(f"on_full must be 'block' or 'drop', got {on_full!r}")
+        self.store = store
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_ms / 1000.0
+        self.on_full = on_full
+        self.block_timeout = block_timeout_ms / 1000.0
+        self.enabled = enabled
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._enqueued = 0
+        self._processed = 0  # written, failed or dropped after enqueue
+        self._queued_ids: Dict[str, int] = {}  # event_id -> copies queued or being written
+        self._stats = {"written": 0, "batches": 0, "dropped": 0, "sync_writes": 0, "failed": 0, "max_batch": 0}
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # Forked child: the parent's queued events belong to the parent
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self._enqueued = self._processed = 0
+                self._queued_ids = {}
+                self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, event: ConversionEvent) -> bool:
+        """Queue one event for writing. Returns False if it was shed because the queue is full."""
+        return self.submit_batch([event])
+
+    def submit_batch(self, events: List[ConversionEvent]) -> bool:
+        """
+        Queue events to be written in one log_events call (one transaction), all or none.
+        Returns False if they were shed because the queue is full.
+        """
+        if not events:
+            return True
+        if self._closed or not self.enabled:
+            self.store.log_events(events)
+            with self._lock:
+                self._stats["sync_writes"] += len(events)
+            return True
+        self._ensure_thread()
+        with self._lock:
+            self._enqueued += len(events)
+            self._track(events, 1)
+        try:
+            if self.on_full == "block":
+                self._queue.put(events, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(events)
+            return True
+        except queue.Full:
+            with self._lock:
+                self._enqueued -= len(events)
+                self._track(events, -1)
+                if self.on_full == "drop":
+                    self._stats["dropped"] += len(events)
+                    return False
+                self._stats["sync_writes"] += len(events)
+            # Backpressure timed out: write inline rather than lose the events
+            self.store.log_events(events)
+            return True
+
+    def _track(self, events: List[ConversionEvent], step: int) -> None:
+        """Count events in or out of _queued_ids (caller holds _lock)."""
+        ids = self._queued_ids
+        for e in events:
+            n = ids.get(e.event_id, 0) + step
+            if n > 0:
+                ids[e.event_id] = n
+            else:
+                ids.pop(e.event_id, None)
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._enqueued - self._processed
+
+    def wait_for_event(self, event_id: str, timeout: Optional[float] = None) -> bool:
+        """
+        Block until event_id is no longer queued or being written by this writer; returns at
+        once if it never was. False on timeout.
+        """
+        with self._lock:
+            return self._done.wait_for(lambda: event_id not in self._queued_ids, timeout=timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every event submitted before this call is committed. False on timeout."""
+        with self._lock:
+            target = self._enqueued
+            return self._done.wait_for(lambda: self._processed >= target, timeout=timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Stop accepting queued writes, drain the queue and stop the background thread."""
+        if self._closed:
+            return
+        self._closed = True
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            self._queue.put(self._STOP)
+            thread.join(timeout)
+        # Events that raced with close() after the thread drained
+        self._drain()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["pending"] = self._enqueued - self._processed
+        out["queue_capacity"] = self._queue.maxsize
+        out["batch_size"] = self.batch_size
+        out["flush_ms"] = self.flush_interval * 1000.0
+        out["on_full"] = self.on_full
+        out["enabled"] = self.enabled and not self._closed
+        return out
+
+    def _run(self) -> None:
+        q = self._queue
+        stopping = False
+        carry = None  # a submitted batch that did not fit into the previous commit
+        while not stopping:
+            first, carry = (carry if carry is not None else q.get()), None
+            if first is self._STOP:
+                break
+            batch = list(first)
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                if len(batch) + len(item) > self.batch_size:
+                    carry = item
+                    break
+                batch.extend(item)
+            self._write(batch)
+        if carry is not None:
+            self._write(list(carry))
+        self._drain()
+
+    def _drain(self) -> None:
+        """Write everything currently queued, in commits of up to batch_size events (batches whole)."""
+        batch: List[ConversionEvent] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                continue
+            if batch and len(batch) + len(item) > self.batch_size:
+                self._write(batch)
+                batch = []
+            batch.extend(item)
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch: List[ConversionEvent]) -> None:
+        failed = len(batch)
+        try:
+            for attempt in range(2):
+                try:
+                    self.store.log_events(batch)
+                    failed = 0
+                    break
+                except self.store.write_errors:
+                    if attempt == 0:
+                        time.sleep(0.05)
+                        continue
+                    logger.exception("Dropping %d conversion events after failed write", len(batch))
+        except Exception:
+            # Anything else (a bad event, a store bug) must not kill the writer thread
+            logger.exception("Dropping %d conversion events after unexpected write error", len(batch))
+        finally:
+            with self._lock:
+                s = self._stats
+                if failed:
+                    s["failed"] += failed
+                else:
+                    s["written"] += len(batch)
+                    s["batches"] += 1
+                    s["max_batch"] = max(s["max_batch"], len(batch))
+                self._processed += len(batch)
+                self._track(batch, -1)
+                self._done.notify_all()
+
+
+_writer: Optional[EventWriter] = None
+
+
+def get_event_writer() -> EventWriter:
+    """Process-wide write-behind logger for the shared MetricsStore (drained at exit)."""
+    global _writer
+    if _writer is None:
+        _writer = EventWriter(get_metrics_store(), enabled=EVENT_WRITE_BEHIND)
+        atexit.register(_writer.close)
+    return _writer
@@ -0,0 +1,581 @@
+"""
+PostgreSQL LearningStore: one learning database shared by every node of a deployment
+(LEARNING_BACKEND=postgres, LEARNING_DB_URL=postgresql://...).
+
+With the default SQLite store each node learns only from its own traffic. Here all nodes
+write into the same global_aggregates and aggregate_buckets, so a boost learned on one node
+is served by all of them (after at most BOOST_CACHE_TTL, since each node's boost cache only
+sees its own writes).
+
+Connections come from a psycopg_pool pool (LEARNING_DB_POOL_MIN..LEARNING_DB_POOL_MAX per
+process, reopened after fork). A batch from EventWriter is one transaction: the events are
+upserted, the contributions they already recorded are read back with one query, and the
+aggregate deltas of the whole batch are merged per key and applied as batched upserts
+(executemany, pipelined by psycopg) in key order, so concurrent nodes lock aggregate rows in
+the same order. A transaction that still hits a deadlock or serialization failure is retried.
+
+Events and their recorded contributions mirror the SQLite schema (source lists are JSONB),
+so re-logging an event or repeating feedback replaces its contribution there too. The
+columnar archive, retention and event_sources are SQLite-only; per-publisher reads query the
+JSONB source lists instead.
+
+Requires psycopg with its pool: pip install "psycopg[binary,pool]".
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from instrumentation import DB_OP_SECONDS, timed
+from learning import (
+    BOOST_CACHE_TTL, BOOST_HALF_LIFE_DAYS, MIN_SAMPLE_SIZE, BoostCache, ConversionEvent,
+    LearningStore, _aggregate_mismatches, _event_contributions, _event_day, _outcome_quality, _performance_by_cluster,
+)
+
+try:
+    import psycopg
+    from psycopg.types.json import Jsonb
+    from psycopg_pool import ConnectionPool as PgConnectionPool
+except ImportError:
+    psycopg = None
+    Jsonb = None
+    PgConnectionPool = None
+
+# PostgreSQL connection string for LEARNING_BACKEND=postgres
+LEARNING_DB_URL = os.environ.get("LEARNING_DB_URL", "")
+# Pooled connections per process
+LEARNING_DB_POOL_MIN = int(os.environ.get("LEARNING_DB_POOL_MIN", "1"))
+LEARNING_DB_POOL_MAX = int(os.environ.get("LEARNING_DB_POOL_MAX", "10"))
+# Seconds a caller waits for a free pooled connection before failing
+LEARNING_DB_POOL_TIMEOUT_S = float(os.environ.get("LEARNING_DB_POOL_TIMEOUT_S", "5"))
+# Attempts of a write transaction that fails on a deadlock or serialization failure
+WRITE_ATTEMPTS = 3
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS conversion_events (
+        event_id TEXT PRIMARY KEY,
+        query_id TEXT NOT NULL,
+        customer_id TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        query_text TEXT NOT NULL,
+        query_hash TEXT NOT NULL,
+        query_cluster TEXT NOT NULL,
+        intent TEXT NOT NULL,
+        sources_purchased JSONB NOT NULL,
+        total_cost DOUBLE PRECISION NOT NULL,
+        decision_confidence DOUBLE PRECISION NOT NULL,
+        sources_cited JSONB NOT NULL,
+        citation_rate DOUBLE PRECISION NOT NULL,
+        utilization_by_source JSONB NOT NULL,
+        answer_quality DOUBLE PRECISION,
+        user_rating DOUBLE PRECISION,
+        correction_made INTEGER NOT NULL DEFAULT 0,
+        cost_efficiency DOUBLE PRECISION
+    );
+    CREATE INDEX IF NOT EXISTS idx_events_cluster ON conversion_events(query_cluster);
+    CREATE INDEX IF NOT EXISTS idx_events_timestamp ON conversion_events(timestamp);
+    CREATE INDEX IF NOT EXISTS idx_events_customer ON conversion_events(customer_id);
+    -- Per-publisher reads (get_publisher_performance) look publishers up in the source lists
+    CREATE INDEX IF NOT EXISTS idx_events_purchased ON conversion_events USING GIN (sources_purchased);
+    CREATE INDEX IF NOT EXISTS idx_events_cited ON conversion_events USING GIN (sources_cited);
+    CREATE INDEX IF NOT EXISTS idx_events_utilization ON conversion_events USING GIN (utilization_by_source);
+
+    CREATE TABLE IF NOT EXISTS global_aggregates (
+        query_cluster TEXT NOT NULL,
+        publisher TEXT NOT NULL,
+        total_purchases BIGINT NOT NULL DEFAULT 0,
+        total_citations BIGINT NOT NULL DEFAULT 0,
+        sum_quality DOUBLE PRECISION NOT NULL DEFAULT 0,
+        sum_cost DOUBLE PRECISION NOT NULL DEFAULT 0,
+        count BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (query_cluster, publisher)
+    );
+
+    -- What each event added to global_aggregates (so feedback can replace it exactly)
+    CREATE TABLE IF NOT EXISTS event_contributions (
+        event_id TEXT NOT NULL,
+        query_cluster TEXT NOT NULL,
+        publisher TEXT NOT NULL,
+        purchases INTEGER NOT NULL,
+        citations INTEGER NOT NULL,
+        quality DOUBLE PRECISION NOT NULL,
+        cost DOUBLE PRECISION NOT NULL,
+        count INTEGER NOT NULL,
+        has_quality INTEGER NOT NULL DEFAULT 0,
+        day INTEGER NOT NULL,
+        PRIMARY KEY (event_id, publisher)
+    );
+
+    -- Daily rollups of global_aggregates (day = UTC date ordinal of the event)
+    CREATE TABLE IF NOT EXISTS aggregate_buckets (
+        query_cluster TEXT NOT NULL,
+        day INTEGER NOT NULL,
+        publisher TEXT NOT NULL,
+        total_purchases BIGINT NOT NULL DEFAULT 0,
+        total_citations BIGINT NOT NULL DEFAULT 0,
+        sum_quality DOUBLE PRECISION NOT NULL DEFAULT 0,
+        sum_cost DOUBLE PRECISION NOT NULL DEFAULT 0,
+        count BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (query_cluster, day, publisher)
+    );
+    CREATE INDEX IF NOT EXISTS idx_buckets_day ON aggregate_buckets(day);
+"""
+
+_UPSERT_BUCKETS = """
+    INSERT INTO aggregate_buckets (query_cluster, day, publisher, total_purchases, total_citations, sum_quality, sum_cost, count)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (query_cluster, day, publisher) DO UPDATE SET
+        total_purchases = aggregate_buckets.total_purchases + excluded.total_purchases,
+        total_citations = aggregate_buckets.total_citations + excluded.total_citations,
+        sum_quality = aggregate_buckets.sum_quality + excluded.sum_quality,
+        sum_cost = aggregate_buckets.sum_cost + excluded.sum_cost,
+        count = aggregate_buckets.count + excluded.count
+"""
+
+_UPSERT_GLOBAL = """
+    INSERT INTO global_aggregates (query_cluster, publisher, total_purchases, total_citations, sum_quality, sum_cost, count)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (query_cluster, publisher) DO UPDATE SET
+        total_purchases = global_aggregates.total_purchases + excluded.total_purchases,
+        total_citations = global_aggregates.total_citations + excluded.total_citations,
+        sum_quality = global_aggregates.sum_quality + excluded.sum_quality,
+        sum_cost = global_aggregates.sum_cost + excluded.sum_cost,
+        count = global_aggregates.count + excluded.count
+"""
+
+# The event's cluster, as the SQLite store records it (query_cluster, else intent)
+_CLUSTER = "CASE WHEN e.query_cluster <> '' THEN e.query_cluster ELSE e.intent END"
+
+
+class PostgresMetricsStore(LearningStore):
+    """
+    LearningStore in a PostgreSQL database shared by all nodes (see module docstring).
+    Privacy: k-anonymity (only report when N >= MIN_SAMPLE_SIZE), optional DP noise.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        boost_cache_ttl: Optional[float] = None,
+        boost_half_life_days: float = BOOST_HALF_LIFE_DAYS,
+        min_size: int = LEARNING_DB_POOL_MIN,
+        max_size: int = LEARNING_DB_POOL_MAX,
+    ):
+        if psycopg is None or PgConnectionPool is None:
+            raise RuntimeError('LEARNING_BACKEND=postgres needs psycopg: pip install "psycopg[binary,pool]"')
+        self.url = url or LEARNING_DB_URL
+        if not self.url:
+            raise RuntimeError("LEARNING_BACKEND=postgres needs LEARNING_DB_URL")
+        self.write_errors = (psycopg.Error,)
+        self.boost_half_life_days = boost_half_life_days
+        self.boost_cache = BoostCache(BOOST_CACHE_TTL if boost_cache_ttl is None else boost_cache_ttl)
+        self.min_size = min_size
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._pool = self._open_pool()
+        self._stats = {"write_transactions": 0, "write_retries": 0, "write_errors": 0}
+        self._init_schema()
+
+    def _open_pool(self) -> "PgConnectionPool":
+        return PgConnectionPool(
+            self.url, min_size=self.min_size, max_size=self.max_size, timeout=LEARNING_DB_POOL_TIMEOUT_S,
+            name="learning", open=True,
+        )
+
+    def _get_pool(self) -> "PgConnectionPool":
+        if os.getpid() != self._pid:
+            # Forked child: the parent's connections and pool threads are not ours to use (or close)
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._pool = self._open_pool()
+                    self._pid = os.getpid()
+        return self._pool
+
+    @contextmanager
+    def _conn(self) -> Iterator["psycopg.Connection"]:
+        """A pooled connection for reads (autocommit: each query sees the latest committed data)."""
+        with self._get_pool().connection() as c:
+            c.autocommit = True
+            try:
+                yield c
+            finally:
+                c.autocommit = False
+
+    def _write(self, fn) -> Any:
+        """
+        Run fn(cursor) in one write transaction and return its result. Deadlocks and
+        serialization failures between nodes are retried (WRITE_ATTEMPTS in all).
+        """
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                with self._get_pool().connection() as c:
+                    with c.transaction(), c.cursor() as cur:
+                        result = fn(cur)
+                with self._lock:
+                    self._stats["write_transactions"] += 1
+                return result
+            except (psycopg.errors.DeadlockDetected, psycopg.errors.SerializationFailure):
+                with self._lock:
+                    self._stats["write_retries"] += 1
+                if attempt == WRITE_ATTEMPTS - 1:
+                    raise
+                time.sleep(0.01 * (attempt + 1))
+            except psycopg.Error:
+                with self._lock:
+                    self._stats["write_errors"] += 1
+                raise
+
+    def _init_schema(self) -> None:
+        def create(cur) -> None:
+            # Nodes starting together must not race on CREATE TABLE IF NOT EXISTS
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('learning_schema'))")
+            cur.execute(_SCHEMA)
+        self._write(create)
+
+    @timed(DB_OP_SECONDS, "log_event")
+    def log_event(self, event: ConversionEvent) -> None:
+        """Store one conversion event and update global aggregates."""
+        self.log_events([event])
+
+    @timed(DB_OP_SECONDS, "log_events")
+    def log_events(self, events: List[ConversionEvent]) -> None:
+        """
+        Store many conversion events in one transaction, with one merged set of aggregate
+        upserts for the batch. An event_id repeated in the batch counts as its last copy,
+        as it does when the SQLite store logs them one after another.
+        """
+        if not events:
+            return
+        latest = {e.event_id: e for e in events}
+        batch = [latest[event_id] for event_id in sorted(latest)]
+
+        def write(cur) -> None:
+            # Upserting the event rows first locks them, so feedback on them waits for this batch
+            cur.executemany("""
+                INSERT INTO conversion_events (
+                    event_id, query_id, customer_id, timestamp,
+                    query_text, query_hash, query_cluster, intent,
+                    sources_purchased, total_cost, decision_confidence,
+                    sources_cited, citation_rate, utilization_by_source,
+                    answer_quality, user_rating, correction_made, cost_efficiency
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (event_id) DO UPDATE SET
+                    query_id = excluded.query_id, customer_id = excluded.customer_id, timestamp = excluded.timestamp,
+                    query_text = excluded.query_text, query_hash = excluded.query_hash,
+                    query_cluster = excluded.query_cluster, intent = excluded.intent,
+                    sources_purchased = excluded.sources_purchased, total_cost = excluded.total_cost,
+                    decision_confidence = excluded.decision_confidence, sources_cited = excluded.sources_cited,
+                    citation_rate = excluded.citation_rate, utilization_by_source = excluded.utilization_by_source,
+                    answer_quality = excluded.answer_quality, user_rating = excluded.user_rating,
+                    correction_made = excluded.correction_made, cost_efficiency = excluded.cost_efficiency
+            """, [(
+                e.event_id, e.query_id, e.customer_id, e.timestamp,
+                e.query_text, e.query_hash, e.query_cluster, e.intent,
+                Jsonb(e.sources_purchased), e.total_cost, e.decision_confidence,
+                Jsonb(e.sources_cited), e.citation_rate, Jsonb(e.utilization_by_source),
+                e.answer_quality, e.user_rating, 1 if e.correction_made else 0, e.cost_efficiency,
+            ) for e in batch])
+            old = self._recorded_contributions(cur, list(latest))
+            changes = []
+            for e in batch:
+                cluster = e.query_cluster or e.intent
+                new = _event_contributions(
+                    cluster, e.sources_purchased, e.sources_cited, e.total_cost,
+                    _outcome_quality(e.answer_quality, e.user_rating),
+                )
+                changes.append((e.event_id, old.get(e.event_id, {}), new, _event_day(e.timestamp)))
+            self._apply_contributions(cur, changes)
+
+        self._write(write)
+
+    @staticmethod
+    def _recorded_contributions(cur, event_ids: List[str]) -> Dict[str, Dict[Tuple[str, str], Tuple]]:
+        """event_id -> (cluster, publisher) -> (purchases, citations, quality, cost, count, has_quality, day)"""
+        out: Dict[str, Dict[Tuple[str, str], Tuple]] = {}
+        cur.execute("""
+            SELECT event_id, query_cluster, publisher, purchases, citations, quality, cost, count, has_quality, day
+            FROM event_contributions WHERE event_id = ANY(%s)
+        """, (event_ids,))
+        for r in cur.fetchall():
+            out.setdefault(r[0], {})[(r[1], r[2])] = tuple(r[3:])
+        return out
+
+    @staticmethod
+    def _apply_contributions(cur, changes: List[Tuple[str, Dict, Dict, int]]) -> None:
+        """
+        For each (event_id, old, new, day): add (new - old) to global_aggregates and the daily
+        buckets and record new as the event's contribution. Deltas are merged per key across
+        the batch, then upserted in key order.
+        """
+        bucket_deltas: Dict[Tuple[str, int, str], List] = {}
+        deltas: Dict[Tuple[str, str], List] = {}
+        for _, old, new, day in changes:
+            for sign, contributions in ((1, new), (-1, old)):
+                for (cluster, pub), vals in contributions.items():
+                    bucket_day = day if sign > 0 else vals[6]
+                    acc = bucket_deltas.setdefault((cluster, bucket_day, pub), [0, 0, 0.0, 0.0, 0])
+                    total = deltas.setdefault((cluster, pub), [0, 0, 0.0, 0.0, 0])
+                    for i in range(5):
+                        acc[i] += sign * vals[i]
+                        total[i] += sign * vals[i]
+        bucket_rows = [key + tuple(d) for key, d in sorted(bucket_deltas.items()) if any(d)]
+        if bucket_rows:
+            cur.executemany(_UPSERT_BUCKETS, bucket_rows)
+        rows = [key + tuple(d) for key, d in sorted(deltas.items()) if any(d)]
+        if rows:
+            cur.executemany(_UPSERT_GLOBAL, rows)
+        replaced = [event_id for event_id, old, _, _ in changes if old]
+        if replaced:
+            cur.execute("DELETE FROM event_contributions WHERE event_id = ANY(%s)", (replaced,))
+        cur.executemany("""
+            INSERT INTO event_contributions (event_id, query_cluster, publisher, purchases, citations, quality, cost, count, has_quality, day)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, [(event_id,) + key + vals[:6] + (day,) for event_id, _, new, day in changes for key, vals in new.items()])
+
+    @timed(DB_OP_SECONDS, "submit_feedback")
+    def submit_feedback(
+        self,
+        event_id: str,
+        sources_cited: List[str],
+        answer_quality: Optional[float] = None,
+        user_rating: Optional[float] = None,
+        correction_made: bool = False,
+    ) -> bool:
+        """
+        Update an existing event with outcome feedback and replace its aggregate contribution
+        (the event row is locked, so feedback from two nodes applies one after the other).
+        """
+        def write(cur) -> Optional[str]:
+            cur.execute("""
+                SELECT query_cluster, intent, sources_purchased, total_cost, timestamp
+                FROM conversion_events WHERE event_id = %s FOR UPDATE
+            """, (event_id,))
+            row = cur.fetchone()
+            if not row:
+                return None
+            cluster, intent, purchased, total_cost, timestamp = row
+            cluster = cluster or intent
+            citation_rate = len(sources_cited) / len(purchased) if purchased else 0.0
+            quality = _outcome_quality(answer_quality, user_rating)
+            cost_eff = (quality / total_cost) if (quality is not None and total_cost > 0) else None
+            cur.execute("""
+                UPDATE conversion_events SET
+                    sources_cited = %s, citation_rate = %s, answer_quality = %s, user_rating = %s,
+                    correction_made = %s, cost_efficiency = %s
+                WHERE event_id = %s
+            """, (Jsonb(sources_cited), citation_rate, answer_quality, user_rating, 1 if correction_made else 0,
+                  cost_eff, event_id))
+            old = self._recorded_contributions(cur, [event_id]).get(event_id, {})
+            new = _event_contributions(cluster, purchased, sources_cited, total_cost, quality)
+            self._apply_contributions(cur, [(event_id, old, new, _event_day(timestamp))])
+            return cluster
+
+        cluster = self._write(write)
+        if cluster is None:
+            return False
+        self.boost_cache.invalidate([cluster])
+        return True
+
+    @timed(DB_OP_SECONDS, "get_global_publisher_performance")
+    def get_global_publisher_performance(
+        self,
+        query_cluster: Optional[str] = None,
+        min_sample_size: int = MIN_SAMPLE_SIZE,
+        customer_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Return learned publisher performance by cluster.
+        Only includes (cluster, publisher) with count >= min_sample_size (k-anonymity).
+        With customer_id, only that customer's events count (summed from their contributions).
+        """
+        with self._conn() as c:
+            if customer_id is not None:
+                sql = """
+                    SELECT ec.query_cluster, ec.publisher, SUM(ec.purchases), SUM(ec.citations), SUM(ec.quality),
+                           SUM(ec.cost), SUM(ec.count)
+                    FROM conversion_events e JOIN event_contributions ec ON ec.event_id = e.event_id
+                    WHERE e.customer_id = %s
+                """
+                params: List[Any] = [customer_id]
+                if query_cluster:
+                    sql += " AND ec.query_cluster = %s"
+                    params.append(query_cluster)
+                sql += " GROUP BY ec.query_cluster, ec.publisher HAVING SUM(ec.count) >= %s ORDER BY 1, 2"
+                rows = c.execute(sql, params + [min_sample_size]).fetchall()
+                return {"by_cluster": _performance_by_cluster(rows), "min_sample_size": min_sample_size,
+                        "customer_id": customer_id}
+            if query_cluster:
+                rows = c.execute("""
+                    SELECT query_cluster, publisher, total_purchases, total_citations, sum_quality, sum_cost, count
+                    FROM global_aggregates WHERE query_cluster = %s AND count >= %s
+                """, (query_cluster, min_sample_size)).fetchall()
+            else:
+                rows = c.execute("""
+                    SELECT query_cluster, publisher, total_purchases, total_citations, sum_quality, sum_cost, count
+                    FROM global_aggregates WHERE count >= %s
+                """, (min_sample_size,)).fetchall()
+        return {"by_cluster": _performance_by_cluster(rows), "min_sample_size": min_sample_size}
+
+    @timed(DB_OP_SECONDS, "get_publisher_performance")
+    def get_publisher_performance(
+        self,
+        publisher: str,
+        query_cluster: Optional[str] = None,
+        min_sample_size: int = MIN_SAMPLE_SIZE,
+    ) -> Dict[str, Any]:
+        """
+        One publisher across query clusters, from the events' JSONB source lists: purchases,
+        citations of purchased copies, citations without a purchase, and mean reported
+        utilization. Only clusters with purchase_count >= min_sample_size are reported.
+        """
+        sql = f"""
+            SELECT {_CLUSTER},
+                   COUNT(*) FILTER (WHERE e.sources_purchased ? %(p)s),
+                   COUNT(*) FILTER (WHERE e.sources_purchased ? %(p)s AND e.sources_cited ? %(p)s),
+                   COUNT(*) FILTER (WHERE NOT e.sources_purchased ? %(p)s AND e.sources_cited ? %(p)s),
+                   AVG((e.utilization_by_source ->> %(p)s)::double precision)
+            FROM conversion_events e
+            WHERE (e.sources_purchased ? %(p)s OR e.sources_cited ? %(p)s OR e.utilization_by_source ? %(p)s)
+        """
+        params: Dict[str, Any] = {"p": publisher}
+        if query_cluster:
+            sql += f" AND {_CLUSTER} = %(cluster)s"
+            params["cluster"] = query_cluster
+        with self._conn() as c:
+            rows = c.execute(sql + " GROUP BY 1 ORDER BY 1", params).fetchall()
+        by_cluster = {}
+        for cluster, purchases, citations, unpurchased, avg_utilization in rows:
+            if purchases < min_sample_size:
+                continue
+            by_cluster[cluster] = {
+                "purchase_count": purchases,
+                "citation_count": citations,
+                "citation_rate": citations / purchases if purchases else 0,
+                "cited_without_purchase": unpurchased,
+                "avg_utilization": avg_utilization,
+            }
+        return {"publisher": publisher, "by_cluster": by_cluster, "min_sample_size": min_sample_size}
+
+    def _bucket_rows(self, query_cluster: Optional[str], first_day: int) -> List[Tuple]:
+        with self._conn() as c:
+            if query_cluster:
+                return c.execute("""
+                    SELECT query_cluster, publisher, day, total_purchases, total_citations, sum_quality, sum_cost, count
+                    FROM aggregate_buckets WHERE query_cluster = %s AND day >= %s
+                """, (query_cluster, first_day)).fetchall()
+            return c.execute("""
+                SELECT query_cluster, publisher, day, total_purchases, total_citations, sum_quality, sum_cost, count
+                FROM aggregate_buckets WHERE day >= %s
+            """, (first_day,)).fetchall()
+
+    def check_aggregates(self) -> Dict[str, Any]:
+        """Compare global_aggregates and aggregate_buckets with the sums of recorded contributions, without writing."""
+        return self.rebuild_aggregates(apply=False)
+
+    def rebuild_aggregates(self, apply: bool = True) -> Dict[str, Any]:
+        """
+        Recompute global_aggregates and aggregate_buckets as the sums of the recorded
+        contributions and report where the incrementally maintained rows differ. With
+        apply=False this reads one REPEATABLE READ snapshot and writes nothing. With
+        apply=True the tables are replaced in one transaction that locks them against
+        writers (in the order writers touch them) while the set-based statements run.
+        """
+        if not apply:
+            with self._get_pool().connection() as c:
+                with c.transaction(), c.cursor() as cur:
+                    cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")  # one snapshot for all reads
+                    report = self._compare_aggregates(cur)
+            report["applied"] = False
+            return report
+
+        def rebuild(cur) -> Dict[str, Any]:
+            cur.execute("LOCK TABLE aggregate_buckets, global_aggregates, event_contributions IN SHARE ROW EXCLUSIVE MODE")
+            out = self._compare_aggregates(cur)
+            cur.execute("DELETE FROM aggregate_buckets")
+            cur.execute("""
+                INSERT INTO aggregate_buckets (query_cluster, day, publisher, total_purchases, total_citations, sum_quality, sum_cost, count)
+                SELECT query_cluster, day, publisher, SUM(purchases), SUM(citations), SUM(quality), SUM(cost), SUM(count)
+                FROM event_contributions GROUP BY query_cluster, day, publisher
+            """)
+            cur.execute("DELETE FROM global_aggregates")
+            cur.execute("""
+                INSERT INTO global_aggregates (query_cluster, publisher, total_purchases, total_citations, sum_quality, sum_cost, count)
+                SELECT query_cluster, publisher, SUM(purchases), SUM(citations), SUM(quality), SUM(cost), SUM(count)
+                FROM event_contributions GROUP BY query_cluster, publisher
+            """)
+            return out
+
+        report = self._write(rebuild)
+        self.boost_cache.clear()
+        report["applied"] = True
+        return report
+
+    @staticmethod
+    def _compare_aggregates(cur) -> Dict[str, Any]:
+        cur.execute("""
+            SELECT query_cluster, publisher, total_purchases, total_citations, sum_quality, sum_cost, count
+            FROM global_aggregates
+        """)
+        current = {(r[0], r[1]): r[2:] for r in cur.fetchall()}
+        cur.execute("""
+            SELECT query_cluster, publisher, SUM(purchases), SUM(citations), SUM(quality), SUM(cost), SUM(count)
+            FROM event_contributions GROUP BY query_cluster, publisher
+        """)
+        rebuilt = {(r[0], r[1]): list(r[2:]) for r in cur.fetchall()}
+        cur.execute("""
+            SELECT query_cluster, day, publisher, total_purchases, total_citations, sum_quality, sum_cost, count
+            FROM aggregate_buckets
+        """)
+        current_buckets = {(r[0], r[1], r[2]): r[3:] for r in cur.fetchall()}
+        cur.execute("""
+            SELECT query_cluster, day, publisher, SUM(purchases), SUM(citations), SUM(quality), SUM(cost), SUM(count)
+            FROM event_contributions GROUP BY query_cluster, day, publisher
+        """)
+        rebuilt_buckets = {(r[0], r[1], r[2]): list(r[3:]) for r in cur.fetchall()}
+        mismatches = _aggregate_mismatches(current, rebuilt)
+        bucket_mismatches = _aggregate_mismatches(
+            current_buckets, rebuilt_buckets, key_names=("query_cluster", "day", "publisher"),
+        )
+        return {
+            "mismatches": mismatches,
+            "bucket_mismatches": bucket_mismatches,
+            "aggregate_rows": len(rebuilt),
+            "consistent": not mismatches and not bucket_mismatches,
+        }
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool and write transaction statistics."""
+        pool = self._get_pool().get_stats()
+        with self._lock:
+            out = dict(self._stats)
+        out.update({
+            "open_connections": pool.get("pool_size", 0),
+            "idle_connections": pool.get("pool_available", 0),
+            "pool_min": pool.get("pool_min", self.min_size),
+            "pool_max": pool.get("pool_max", self.max_size),
+            "connections_opened": pool.get("connections_num", 0),
+            "connections_lost": pool.get("connections_lost", 0),
+            "checkouts": pool.get("requests_num", 0),
+            "checkouts_waiting": pool.get("requests_waiting", 0),
+            "checkout_wait_ms_total": pool.get("requests_wait_ms", 0),
+            "checkout_errors": pool.get("requests_errors", 0),
+        })
+        return out
+
+    def close(self) -> None:
+        self._pool.close()
+
+    @timed(DB_OP_SECONDS, "event_count")
+    def event_count(self) -> int:
+        """Events logged."""
+        with self._conn() as c:
+            return c.execute("SELECT COUNT(*) FROM conversion_events").fetchone()[0]
+
+    @timed(DB_OP_SECONDS, "has_event")
+    def has_event(self, event_id: str) -> bool:
+        """Whether event_id is in conversion_events."""
+        with self._conn() as c:
+            return c.execute("SELECT 1 FROM conversion_events WHERE event_id = %s", (event_id,)).fetchone() is not None
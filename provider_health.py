@@ -0,0 +1,203 @@
+"""
+Search provider health: rolling outcomes, circuit breakers and latency-aware ordering.
+
+Every provider call ends as one of:
+  success    non-empty results (latency recorded)
+  failure    error, empty results, or still running at the overall deadline
+  abandoned  cancelled because another provider won; its elapsed time is recorded as a
+             latency sample (a lower bound) but it counts as neither success nor failure
+
+Breaker per provider: closed → open when, within the rolling window, at least
+PROVIDER_MIN_CALLS calls were made and the error rate reaches PROVIDER_ERROR_THRESHOLD, or
+after PROVIDER_MAX_CONSECUTIVE_FAILURES failures in a row. An open provider is skipped for
+PROVIDER_OPEN_S seconds, doubling on each consecutive trip up to PROVIDER_OPEN_MAX_S; then it
+is half-open and one probe call is let through: success closes it, failure re-opens it.
+When every provider is open the fan-out still calls the best-ranked one; a success closes it.
+
+Ordering: providers are sorted by expected time to a non-empty result, median latency
+divided by the (smoothed) success rate, with a PROVIDER_PRIORITY_PENALTY per configured position so the
+configured order wins unless another provider is clearly faster or healthier.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+PROVIDER_WINDOW_S = float(os.environ.get("PROVIDER_WINDOW_S", "300"))
+PROVIDER_WINDOW_MAX_CALLS = 200
+PROVIDER_MIN_CALLS = int(os.environ.get("PROVIDER_MIN_CALLS", "5"))
+PROVIDER_ERROR_THRESHOLD = float(os.environ.get("PROVIDER_ERROR_THRESHOLD", "0.5"))
+PROVIDER_MAX_CONSECUTIVE_FAILURES = int(os.environ.get("PROVIDER_MAX_CONSECUTIVE_FAILURES", "3"))
+PROVIDER_OPEN_S = float(os.environ.get("PROVIDER_OPEN_S", "30"))
+PROVIDER_OPEN_MAX_S = float(os.environ.get("PROVIDER_OPEN_MAX_S", "600"))
+PROVIDER_PRIORITY_PENALTY = float(os.environ.get("PROVIDER_PRIORITY_PENALTY", "0.25"))
+PRIOR_LATENCY_S = 1.0  # assumed median latency before a provider has any samples
+PRIOR_CALLS = 2.0      # pseudo-successes smoothing the success rate, so one failure is not a verdict
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+def _percentile(sorted_values: Sequence[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    idx = min(int(q * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[idx]
+
+
+class ProviderState:
+    """Rolling window and breaker for one provider. Callers hold ProviderHealth's lock."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls: deque = deque()  # (timestamp, outcome, latency_s)
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.open_s = PROVIDER_OPEN_S
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        self.trips = 0
+
+    def _trim(self, now: float) -> None:
+        while self.calls and (now - self.calls[0][0] > PROVIDER_WINDOW_S or len(self.calls) > PROVIDER_WINDOW_MAX_CALLS):
+            self.calls.popleft()
+
+    def counts(self) -> Tuple[int, int]:
+        """(successes, failures) in the window."""
+        ok = sum(1 for _, outcome, _ in self.calls if outcome == "success")
+        failed = sum(1 for _, outcome, _ in self.calls if outcome == "failure")
+        return ok, failed
+
+    def latencies(self) -> List[float]:
+        return sorted(lat for _, outcome, lat in self.calls if outcome != "failure")
+
+    def expected_time(self) -> float:
+        ok, failed = self.counts()
+        lat = self.latencies()
+        median = _percentile(lat, 0.5) if lat else PRIOR_LATENCY_S
+        return median * (ok + failed + PRIOR_CALLS) / (ok + PRIOR_CALLS)
+
+    def refresh_state(self, now: float) -> None:
+        if self.state == OPEN and now >= self.open_until:
+            self.state = HALF_OPEN
+            self.probe_in_flight = False
+
+    def trip(self, now: float) -> None:
+        if self.state != CLOSED:
+            self.open_s = min(self.open_s * 2, PROVIDER_OPEN_MAX_S)
+        self.state = OPEN
+        self.open_until = now + self.open_s
+        self.probe_in_flight = False
+        self.trips += 1
+
+
+class ProviderHealth:
+    """Health of every search provider seen so far; thread-safe."""
+
+    def __init__(self):
+        self._providers: Dict[str, ProviderState] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str) -> ProviderState:
+        state = self._providers.get(name)
+        if state is None:
+            state = self._providers[name] = ProviderState(name)
+        return state
+
+    def order(self, names: Sequence[str]) -> List[str]:
+        """
+        Providers to try, best first: usable ones (closed, or half-open with no probe out)
+        by expected time with the priority penalty, then open ones. Does not claim probes.
+        """
+        now = time.monotonic()
+        with self._lock:
+            ranked = []
+            for i, name in enumerate(names):
+                st = self._get(name)
+                st.refresh_state(now)
+                blocked = st.state == OPEN or (st.state == HALF_OPEN and st.probe_in_flight)
+                score = st.expected_time() * (1 + PROVIDER_PRIORITY_PENALTY * i)
+                ranked.append((blocked, score, i, name))
+        ranked.sort()
+        return [name for _, _, _, name in ranked]
+
+    def acquire(self, name: str) -> bool:
+        """May a call to this provider start now? Claims the probe slot when half-open."""
+        now = time.monotonic()
+        with self._lock:
+            st = self._get(name)
+            st.refresh_state(now)
+            if st.state == CLOSED:
+                return True
+            if st.state == HALF_OPEN and not st.probe_in_flight:
+                st.probe_in_flight = True
+                return True
+            return False
+
+    def record(self, name: str, outcome: str, latency_s: float) -> None:
+        """outcome: "success", "failure" or "abandoned" (see module docstring)."""
+        now = time.monotonic()
+        with self._lock:
+            st = self._get(name)
+            st.calls.append((now, outcome, latency_s))
+            st._trim(now)
+            if outcome == "success":
+                st.consecutive_failures = 0
+                if st.state != CLOSED:
+                    # A probe, or a last-resort call while open, came back good
+                    st.state = CLOSED
+                    st.open_s = PROVIDER_OPEN_S
+                    st.probe_in_flight = False
+            elif outcome == "failure":
+                st.consecutive_failures += 1
+                if st.state == HALF_OPEN:
+                    st.trip(now)
+                elif st.state == CLOSED:
+                    ok, failed = st.counts()
+                    total = ok + failed
+                    if (st.consecutive_failures >= PROVIDER_MAX_CONSECUTIVE_FAILURES
+                            or (total >= PROVIDER_MIN_CALLS and failed / total >= PROVIDER_ERROR_THRESHOLD)):
+                        st.trip(now)
+            elif st.state == HALF_OPEN:
+                # An abandoned probe proves nothing; let the next call probe again
+                st.probe_in_flight = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._providers.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            out = {}
+            for name, st in self._providers.items():
+                st.refresh_state(now)
+                st._trim(now)
+                ok, failed = st.counts()
+                lat = st.latencies()
+                out[name] = {
+                    "state": st.state,
+                    "calls": len(st.calls),
+                    "successes": ok,
+                    "failures": failed,
+                    "error_rate": failed / (ok + failed) if ok + failed else 0.0,
+                    "latency_p50_ms": _ms(_percentile(lat, 0.5)),
+                    "latency_p95_ms": _ms(_percentile(lat, 0.95)),
+                    "expected_time_ms": _ms(st.expected_time()),
+                    "consecutive_failures": st.consecutive_failures,
+                    "trips": st.trips,
+                    "open_for_s": max(st.open_until - now, 0.0) if st.state == OPEN else 0.0,
+                }
+            return out
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1e3, 1)
+
+
+_health = ProviderHealth()
+
+
+def get_provider_health() -> ProviderHealth:
+    return _health
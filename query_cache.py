@@ -0,0 +1,125 @@
+"""
+Memo of the deterministic, per-query part of optimize(): extract_signals output and the
+scored source list, keyed by a hash of the normalized query text.
+
+Bid simulation and Gates 1–3 are not cached; they run on a fresh copy of the scored
+sources for every request, so randomized bids stay independent across repeats.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "4096"))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", "600"))
+
+
+def normalize_query(query: str) -> str:
+    """
+    Cache normalization: surrounding whitespace only. Case, inner whitespace and punctuation
+    all change extract_signals output (entities, templates, word counts), so they stay.
+    """
+    return query.strip()
+
+
+def query_key(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class QueryEntry:
+    """Signals for one query plus the sources scored under the learned boost last seen for it."""
+
+    __slots__ = ("query", "sigs", "scored")
+
+    def __init__(self, query: str, sigs: Dict[str, Any]):
+        self.query = query
+        self.sigs = sigs
+        self.scored: Optional[Tuple[Dict[str, float], List[Dict[str, Any]]]] = None  # (learned_boost, scored)
+
+
+class QueryCache:
+    """
+    Size-bounded LRU of QueryEntry with a TTL. Entries are shared between requests:
+    callers must treat entry.sigs as read-only and copy scored sources before mutating them.
+    """
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, QueryEntry]]" = OrderedDict()  # key -> (expires_at, entry)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.score_hits = 0
+        self.score_misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, normalized: str) -> Optional[QueryEntry]:
+        key = query_key(normalized)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                if item[0] > time.monotonic() and item[1].query == normalized:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return item[1]
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, entry: QueryEntry) -> None:
+        if not self.enabled:
+            return
+        key = query_key(entry.query)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def scored_for(self, entry: QueryEntry, learned_boost: Dict[str, float]) -> Optional[List[Dict[str, Any]]]:
+        """Copies of the entry's scored sources if they were scored under an equal learned boost."""
+        cached = entry.scored
+        if cached is not None and cached[0] == learned_boost:
+            with self._lock:
+                self.score_hits += 1
+            return [dict(s) for s in cached[1]]
+        with self._lock:
+            self.score_misses += 1
+        return None
+
+    def store_scored(self, entry: QueryEntry, learned_boost: Dict[str, float], scored: List[Dict[str, Any]]) -> None:
+        """Keep a private copy of scored (callers go on to mutate theirs during bidding)."""
+        entry.scored = (dict(learned_boost or {}), [dict(s) for s in scored])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            score_lookups = self.score_hits + self.score_misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "score_hits": self.score_hits,
+                "score_misses": self.score_misses,
+                "score_hit_rate": self.score_hits / score_lookups if score_lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+            }
@@ -0,0 +1,142 @@
+"""
+Response profiles for /optimize and a faster JSON encoder.
+
+  debug     the full optimize() result, every source with its catalog text inlined: the
+            shape /optimize always returned, so it is the default
+  standard  the same fields, but source entries (selected, rejected, ineligible, allScored)
+            drop the static catalog text (CATALOG_TEXT_FIELDS) and the bid formula string;
+            they carry sourceId, an index into GET /catalog
+  minimal   what a buying agent needs: event/query ids, intent, bid ceiling, cost and
+            savings, and the selected sources with their bids
+
+standard and minimal include catalogVersion, the /catalog ETag, so clients know when to
+refetch the catalog. The profile comes from the request ("profile" in the body or
+?profile=), else RESPONSE_PROFILE; clients opt in to standard or minimal.
+
+JSON is encoded with orjson when it is installed (stdlib json otherwise); ResponseStats
+records bytes and serialization time per profile, reported by /learn under "responses".
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is used instead
+    orjson = None
+
+PROFILES = ("minimal", "standard", "debug")
+RESPONSE_PROFILE = os.environ.get("RESPONSE_PROFILE", "debug")
+CATALOG_TEXT_FIELDS = ("topics", "domains", "priceSource", "priceDetail")
+SOURCE_LISTS = ("selected", "rejected", "ineligible", "allScored")
+MINIMAL_SOURCE_FIELDS = ("sourceId", "name", "price", "utility", "our_bid", "bid_decision")
+
+
+def resolve_profile(requested: Optional[str]) -> Optional[str]:
+    """The profile to use, or None if requested is not a known profile."""
+    profile = requested or RESPONSE_PROFILE
+    return profile if profile in PROFILES else None
+
+
+def catalog_document(sources: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """GET /catalog body: every source's static fields by sourceId, plus a content version."""
+    entries = [{"sourceId": i, **s} for i, s in enumerate(sources)]
+    version = hashlib.sha256(json.dumps(entries, sort_keys=True).encode()).hexdigest()[:16]
+    return {"version": version, "sources": entries}
+
+
+def _compact_source(s: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: v for k, v in s.items() if k not in CATALOG_TEXT_FIELDS}
+    detail = out.get("bid_detail")
+    if detail and "formula" in detail:
+        out["bid_detail"] = {k: v for k, v in detail.items() if k != "formula"}
+    return out
+
+
+def shape_response(result: Dict[str, Any], profile: str, catalog_version: str) -> Dict[str, Any]:
+    """The /optimize response for result (an optimize() result with event ids) in profile."""
+    if profile == "debug":
+        return {**result, "profile": "debug"}
+    if profile == "minimal":
+        out = {
+            "profile": "minimal",
+            "catalogVersion": catalog_version,
+            "event_id": result.get("event_id"),
+            "query_id": result.get("query_id"),
+            "customer_id": result.get("customer_id"),
+            "intent": result["sigs"]["intent"],
+            "bid_ceiling": result["bid_ceiling"],
+            "smartCost": result["smartCost"],
+            "savings": result["savings"],
+            "selected": [{k: s.get(k) for k in MINIMAL_SOURCE_FIELDS} for s in result["selected"]],
+        }
+        if result.get("selected_articles"):
+            out["selected_articles"] = result["selected_articles"]
+            out["search_provider"] = result.get("search_provider")
+        return out
+    out = dict(result)
+    for key in SOURCE_LISTS:
+        if key in out:
+            out[key] = [_compact_source(s) for s in out[key]]
+    out["profile"] = "standard"
+    out["catalogVersion"] = catalog_version
+    return out
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson when available; falls back to the default."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def dumps_bytes(self, obj: Any) -> bytes:
+        if orjson is None:
+            return super().dumps(obj).encode()
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+
+    def response(self, *args: Any, **kwargs: Any):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)  # pretty-printed
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
+
+
+class ResponseStats:
+    """Responses served, bytes and serialization time per profile."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_profile: Dict[str, List[float]] = {}  # profile -> [count, bytes, serialize_ms]
+
+    def observe(self, profile: str, nbytes: int, serialize_ms: float) -> None:
+        with self._lock:
+            row = self._by_profile.setdefault(profile, [0, 0, 0.0])
+            row[0] += 1
+            row[1] += nbytes
+            row[2] += serialize_ms
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = {p: list(r) for p, r in self._by_profile.items()}
+        return {
+            "encoder": "orjson" if orjson is not None else "json",
+            "profiles": {
+                p: {"count": c, "avg_bytes": b / c if c else 0.0, "avg_serialize_ms": ms / c if c else 0.0}
+                for p, (c, b, ms) in rows.items()
+            },
+        }
+
+
+def timed_dumps(provider: FastJSONProvider, obj: Any) -> tuple:
+    """(body bytes, serialization ms)."""
+    started = time.perf_counter()
+    body = provider.dumps_bytes(obj)
+    return body, (time.perf_counter() - started) * 1e3
@@ -0,0 +1,214 @@
+"""
+Retention for learning.db: keeps the live database to a bounded window of recent events.
+
+Events are partitioned by UTC day. A retention pass works through expired days oldest
+first, each step in bounded batches of short write transactions so request traffic gets the
+SQLite lock in between:
+
+  1. archive      events older than ARCHIVE_AFTER_DAYS move to the day-partitioned
+                  column archive (MetricsStore.archive_events)
+  2. query text   query_text older than QUERY_TEXT_RETENTION_DAYS is blanked, in live rows
+                  and in archived partitions (which are rewritten)
+  3. compaction   a day's small archive partitions are merged (MetricsStore.compact_archive)
+  4. aggregates   daily aggregate_buckets older than AGGREGATE_RETENTION_DAYS are deleted;
+                  lifetime totals in global_aggregates are kept
+  5. vacuum       free pages go back to the filesystem (PRAGMA incremental_vacuum)
+
+Each pass reports what it did and the space it reclaimed in the database and the archive.
+With RETENTION_INTERVAL_S > 0 (off by default: archived events no longer take /feedback)
+the app runs passes in a background thread (see get_retention_worker; /learn reports them
+under "retention"); `python retention.py run`
+runs one by hand, `python retention.py vacuum --enable-incremental` switches a database
+created before incremental vacuum was on (a full VACUUM, for a maintenance window).
+
+A period of 0 keeps that data forever.
+"""
+
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from event_archive import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+from learning import DECAY_HORIZON_HALF_LIVES, MetricsStore, _today, get_metrics_store
+
+# Seconds between background retention passes (0 = only `python retention.py run`). Opt-in:
+# a pass archives events older than ARCHIVE_AFTER_DAYS, after which /feedback for them is a 404
+RETENTION_INTERVAL_S = float(os.environ.get("RETENTION_INTERVAL_S", "0"))
+# Days query_text is kept, live and archived (0 = forever)
+QUERY_TEXT_RETENTION_DAYS = int(os.environ.get("QUERY_TEXT_RETENTION_DAYS", "0"))
+# Days of daily aggregate buckets kept for windowed/decayed reads (0 = forever)
+AGGREGATE_RETENTION_DAYS = int(os.environ.get("AGGREGATE_RETENTION_DAYS", "0"))
+# Batches (or archive groups) per step in one pass; the rest waits for the next pass
+RETENTION_MAX_BATCHES = int(os.environ.get("RETENTION_MAX_BATCHES", "20"))
+
+logger = logging.getLogger(__name__)
+
+
+def run_retention(
+    store: MetricsStore,
+    max_batches: Optional[int] = RETENTION_MAX_BATCHES,
+    archive_after_days: int = ARCHIVE_AFTER_DAYS,
+    query_text_days: int = QUERY_TEXT_RETENTION_DAYS,
+    aggregate_days: int = AGGREGATE_RETENTION_DAYS,
+) -> Dict[str, Any]:
+    """One retention pass over store; returns what each step did and the bytes reclaimed."""
+    start = time.perf_counter()
+    today = _today()
+    db_before = store.storage_stats()
+    report: Dict[str, Any] = {}
+
+    if archive_after_days > 0:
+        report["archive"] = store.archive_events(
+            before_day=today - archive_after_days, batch_size=ARCHIVE_BATCH_SIZE, max_batches=max_batches)
+
+    text_before = today - query_text_days if query_text_days > 0 else None
+    if text_before is not None:
+        report["query_text"] = store.redact_query_text(text_before, max_batches=max_batches)
+    report["compaction"] = store.compact_archive(redact_before_day=text_before, max_groups=max_batches)
+
+    if aggregate_days > 0:
+        # Never prune buckets a decayed boost still reads
+        horizon = int(math.ceil(store.boost_half_life_days * DECAY_HORIZON_HALF_LIVES))
+        report["aggregate_buckets"] = store.prune_aggregate_buckets(
+            today - max(aggregate_days, horizon), max_batches=max_batches)
+
+    report["vacuum"] = store.incremental_vacuum(max_steps=max_batches)
+    compaction = report["compaction"]
+    reclaimed_db = db_before["file_bytes"] - report["vacuum"]["file_bytes"]
+    reclaimed_archive = compaction["bytes_before"] - compaction["bytes_after"]
+    report["reclaimed_bytes"] = {"db": reclaimed_db, "archive": reclaimed_archive, "total": reclaimed_db + reclaimed_archive}
+    report["duration_ms"] = (time.perf_counter() - start) * 1e3
+    return report
+
+
+class RetentionWorker:
+    """Runs run_retention every interval_s in a daemon thread and keeps the last report; close() stops it."""
+
+    def __init__(self, store: MetricsStore, interval_s: float = RETENTION_INTERVAL_S):
+        self.store = store
+        self.interval_s = interval_s
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._stats: Dict[str, Any] = {
+            "passes": 0,
+            "errors": 0,
+            "bytes_reclaimed_total": 0,
+            "last_run": None,
+            "last_report": None,
+            "last_error": None,
+        }
+
+    def ensure_started(self) -> None:
+        """Start the thread (again after fork); no-op when interval_s <= 0 or after close()."""
+        if self.interval_s <= 0 or self._stop.is_set():
+            return
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+            self._thread.start()
+
+    def run_once(self, **kwargs: Any) -> Dict[str, Any]:
+        try:
+            report = run_retention(self.store, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+                self._stats["last_error"] = f"{type(e).__name__}: {e}"
+            raise
+        with self._lock:
+            s = self._stats
+            s["passes"] += 1
+            s["bytes_reclaimed_total"] += report["reclaimed_bytes"]["total"]
+            s["last_run"] = time.time()
+            s["last_report"] = report
+        return report
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+        out.update({
+            "interval_s": self.interval_s,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "archive_after_days": ARCHIVE_AFTER_DAYS,
+            "query_text_retention_days": QUERY_TEXT_RETENTION_DAYS,
+            "aggregate_retention_days": AGGREGATE_RETENTION_DAYS,
+        })
+        out.update(self.store.storage_stats())
+        return out
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Stop the thread: it exits now if idle, else after its current pass."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Retention pass failed")
+            self._stop.wait(self.interval_s)
+
+
+_worker: Optional[RetentionWorker] = None
+_worker_lock = threading.Lock()
+
+
+def get_retention_worker() -> RetentionWorker:
+    """Process-wide worker for the shared MetricsStore, started on first use (never for another backend)."""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                store = get_metrics_store()
+                _worker = RetentionWorker(store, RETENTION_INTERVAL_S if isinstance(store, MetricsStore) else 0)
+                atexit.register(_worker.close)
+    _worker.ensure_started()
+    return _worker
+
+
+def main():
+    import argparse
+
+    p = argparse.ArgumentParser(description="learning.db retention: archive, redact, compact, prune, vacuum")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="Run one retention pass")
+    run.add_argument("--max-batches", type=int, default=RETENTION_MAX_BATCHES,
+                     help="Batches per step (0 = until done)")
+    run.add_argument("--archive-after-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    run.add_argument("--query-text-days", type=int, default=QUERY_TEXT_RETENTION_DAYS)
+    run.add_argument("--aggregate-days", type=int, default=AGGREGATE_RETENTION_DAYS)
+    vac = sub.add_parser("vacuum", help="Incremental vacuum")
+    vac.add_argument("--enable-incremental", action="store_true",
+                     help="Switch an older database to incremental auto-vacuum (full VACUUM; blocks writers)")
+    sub.add_parser("status", help="Database and archive size")
+    args = p.parse_args()
+
+    store = get_metrics_store()
+    if not isinstance(store, MetricsStore):
+        raise SystemExit("retention applies to the SQLite learning store (LEARNING_BACKEND=sqlite)")
+    if args.cmd == "run":
+        out = run_retention(store, max_batches=args.max_batches or None, archive_after_days=args.archive_after_days,
+                            query_text_days=args.query_text_days, aggregate_days=args.aggregate_days)
+    elif args.cmd == "vacuum":
+        out = store.enable_incremental_vacuum() if args.enable_incremental else store.incremental_vacuum()
+    else:
+        out = {"db": store.storage_stats(), "archive": store.archive_stats()}
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
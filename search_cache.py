@@ -0,0 +1,222 @@
+"""
+Disk-backed cache of search results with stale-while-revalidate.
+
+Entries are keyed by (normalized query, num, provider chain) and stored in SQLite next to
+the learning DB (SEARCH_CACHE_DB, default search_cache.db in LEARNING_DB's directory), so
+they survive restarts and are shared by every worker on the host.
+
+Each entry carries its own TTL, chosen from the query's freshness needs (search_ttl):
+minutes for breaking news or fast-moving topics, a day for explainers and archival
+questions. Within ttl an entry is served as is; for a further ttl × SEARCH_CACHE_STALE_FACTOR
+it is served stale while one background refresh per key fetches a new copy; after that
+the caller fetches synchronously. Empty results are never cached.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from learning import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_ENABLED = os.environ.get("SEARCH_CACHE_ENABLED", "1") != "0"
+SEARCH_CACHE_STALE_FACTOR = float(os.environ.get("SEARCH_CACHE_STALE_FACTOR", "1.0"))
+SEARCH_CACHE_REFRESH_WORKERS = int(os.environ.get("SEARCH_CACHE_REFRESH_WORKERS", "2"))
+SEARCH_CACHE_PRUNE_EVERY = 500  # puts between sweeps of fully expired rows
+
+# TTL tiers in seconds
+TTL_REALTIME = float(os.environ.get("SEARCH_TTL_REALTIME_S", "120"))
+TTL_RECENT = float(os.environ.get("SEARCH_TTL_RECENT_S", "900"))
+TTL_DEFAULT = float(os.environ.get("SEARCH_TTL_DEFAULT_S", "3600"))
+TTL_ARCHIVE = float(os.environ.get("SEARCH_TTL_ARCHIVE_S", "86400"))
+
+SearchResult = Tuple[List[Dict[str, Any]], str]
+
+
+def search_ttl(sigs: Optional[Dict[str, Any]]) -> float:
+    """Cache TTL for a query's search results, from its extract_signals output."""
+    if not sigs:
+        return TTL_DEFAULT
+    freshness = sigs.get("freshness") or {}
+    max_fresh = sigs.get("maxFreshnessHours", 9999)
+    if sigs.get("intent") == "breaking_news" or freshness.get("velocity", 0) >= 0.9 or max_fresh <= 4:
+        return TTL_REALTIME
+    if freshness.get("required") or freshness.get("composed", 0) > 0.4:
+        return TTL_RECENT
+    if sigs.get("intent") == "explainer" or max_fresh >= 9999:
+        return TTL_ARCHIVE
+    return TTL_DEFAULT
+
+
+def normalize_search_query(query: str) -> str:
+    """Search engines ignore case and runs of whitespace, so the cache does too."""
+    return " ".join(query.lower().split())
+
+
+def cache_key(query: str, num: int, providers: str) -> str:
+    raw = f"{normalize_search_query(query)}\x1f{num}\x1f{providers}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _default_db_path() -> str:
+    learning_db = os.environ.get("LEARNING_DB", "learning.db")
+    return os.path.join(os.path.dirname(learning_db) or ".", "search_cache.db")
+
+
+class SearchCache:
+    """SQLite-backed search result cache; see the module docstring for the policy."""
+
+    def __init__(self, db_path: Optional[str] = None, stale_factor: float = SEARCH_CACHE_STALE_FACTOR,
+                 refresh_workers: int = SEARCH_CACHE_REFRESH_WORKERS):
+        self.db_path = db_path or os.environ.get("SEARCH_CACHE_DB") or _default_db_path()
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.stale_factor = stale_factor
+        self._pool = ConnectionPool(self.db_path)
+        self._refresh_executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="search-refresh")
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._stats = {"fresh_hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_failures": 0, "pruned": 0}
+        with self._pool.write() as c:
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    key TEXT PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    num INTEGER NOT NULL,
+                    providers TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    results TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    stale_until REAL NOT NULL
+                )
+            """)
+            c.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_stale ON search_cache(stale_until)")
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key: str) -> Optional[Tuple[SearchResult, bool]]:
+        """((results, provider), is_stale) for a servable entry, else None."""
+        row = self._pool.get().execute(
+            "SELECT provider, results, expires_at, stale_until FROM search_cache WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row is None or row[3] <= now:
+            return None
+        return (json.loads(row[1]), row[0]), row[2] <= now
+
+    def put(self, key: str, query: str, num: int, providers: str, result: SearchResult, ttl: float) -> None:
+        results, provider = result
+        if not results or ttl <= 0:
+            return
+        now = time.time()
+        with self._pool.write() as c:
+            c.execute(
+                """INSERT OR REPLACE INTO search_cache
+                   (key, query, num, providers, provider, results, fetched_at, expires_at, stale_until)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (key, normalize_search_query(query), num, providers, provider, json.dumps(results),
+                 now, now + ttl, now + ttl * (1 + self.stale_factor)),
+            )
+        with self._lock:
+            self._puts += 1
+            sweep = self._puts % SEARCH_CACHE_PRUNE_EVERY == 0
+        if sweep:
+            self.prune()
+
+    def prune(self) -> int:
+        """Delete entries past their stale window; returns rows removed."""
+        with self._pool.write() as c:
+            removed = c.execute("DELETE FROM search_cache WHERE stale_until <= ?", (time.time(),)).rowcount
+        with self._lock:
+            self._stats["pruned"] += removed
+        return removed
+
+    def fetch(self, query: str, num: int, providers: str, ttl: float,
+              fetch_fn: Callable[[], SearchResult]) -> SearchResult:
+        """Serve from cache, revalidate stale entries in the background, or call fetch_fn."""
+        key = cache_key(query, num, providers)
+        try:
+            cached = self.get(key)
+        except Exception as e:
+            logger.warning("Search cache read failed: %s", e)
+            cached = None
+        if cached is not None:
+            result, stale = cached
+            if not stale:
+                self._count("fresh_hits")
+                return result
+            self._count("stale_hits")
+            self._schedule_refresh(key, query, num, providers, ttl, fetch_fn)
+            return result
+        self._count("misses")
+        result = fetch_fn()
+        self._store(key, query, num, providers, result, ttl)
+        return result
+
+    def _store(self, key, query, num, providers, result, ttl) -> None:
+        try:
+            self.put(key, query, num, providers, result, ttl)
+        except Exception as e:
+            logger.warning("Search cache write failed: %s", e)
+
+    def _schedule_refresh(self, key, query, num, providers, ttl, fetch_fn) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                result = fetch_fn()
+                if result[0]:
+                    self._store(key, query, num, providers, result, ttl)
+                    self._count("refreshes")
+                else:
+                    self._count("refresh_failures")
+            except Exception as e:
+                logger.warning("Search cache refresh failed for %r: %s", query[:50], e)
+                self._count("refresh_failures")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._refresh_executor.submit(refresh)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["refreshing"] = len(self._refreshing)
+        lookups = out["fresh_hits"] + out["stale_hits"] + out["misses"]
+        out["hit_rate"] = (out["fresh_hits"] + out["stale_hits"]) / lookups if lookups else 0.0
+        try:
+            out["entries"] = self._pool.get().execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        except Exception:
+            out["entries"] = None
+        out["db_path"] = self.db_path
+        return out
+
+
+_cache: Optional[SearchCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> Optional[SearchCache]:
+    """Process-wide SearchCache, or None when SEARCH_CACHE_ENABLED=0."""
+    global _cache
+    if not SEARCH_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchCache()
+    return _cache
@@ -2,23 +2,76 @@
 Real-time search integration for the purchase optimizer.
 Maps search result URLs to catalog sources so the purchase plan is backed by actual articles to scrape.
 
-Provider order with fallback (first to return results wins):
+Providers in priority order:
   1) Brave Search — BRAVE_API_KEY
   2) Google Custom Search — GOOGLE_CSE_API_KEY + GOOGLE_CSE_CX
   3) DuckDuckGo — no key (always available)
+
+fetch_search_results fans out over a thread pool under one overall deadline
+(SEARCH_DEADLINE_MS). In "hedge" mode (default) the next provider starts when the previous
+one fails, comes back empty, or has not answered within SEARCH_HEDGE_MS; in "race" mode all
+start at once. The first non-empty result wins and the others are cancelled: their sockets
+are shut down and their retry back-off ends early. DuckDuckGo runs inside the ddgs library
+and cannot be interrupted mid-call, so a losing DuckDuckGo call finishes in the background.
+
+Brave and Google CSE share search_transport's keep-alive connection pools; each search
+worker thread keeps one long-lived DDGS client.
+
+Provider order is adaptive (provider_health): every call's outcome and latency feed a
+rolling window per provider, providers are tried in order of expected time to a non-empty
+result, and a provider whose error rate trips its circuit breaker is skipped until a
+half-open probe succeeds. The order above is the prior and the tie-breaker.
+Per-call latency, fallbacks to the next provider and breaker skips are exported on /metrics
+(instrumentation).
+
+BRAVE_SEARCH_URL and GOOGLE_CSE_URL override the API endpoints (e.g. local stub servers).
 """
 
+import logging
 import os
+import threading
 import time
-from typing import Any, Dict, List, Tuple
+import urllib.parse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
-try:
-    import urllib.request
-    import urllib.parse
-    import json as _json
-except ImportError:
-    pass
+from instrumentation import SEARCH_BREAKER_SKIPS, SEARCH_CALL_SECONDS, SEARCH_FALLBACKS, stage_timer
+from provider_health import ProviderHealth, get_provider_health
+from search_cache import TTL_DEFAULT, get_search_cache
+from search_transport import CancelToken, SearchCancelled, get_search_transport
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MODE = os.environ.get("SEARCH_MODE", "hedge")          # hedge | race
+SEARCH_HEDGE_MS = float(os.environ.get("SEARCH_HEDGE_MS", "1500"))
+SEARCH_DEADLINE_MS = float(os.environ.get("SEARCH_DEADLINE_MS", "8000"))
+SEARCH_MAX_WORKERS = int(os.environ.get("SEARCH_MAX_WORKERS", "16"))
+BRAVE_SEARCH_URL = os.environ.get("BRAVE_SEARCH_URL", "https://api.search.brave.com/res/v1/web/search")
+GOOGLE_CSE_URL = os.environ.get("GOOGLE_CSE_URL", "https://www.googleapis.com/customsearch/v1")
+RETRY_BACKOFF_S = 1.0
+
+
+def _with_retry(call: Callable[[float], List[Dict[str, Any]]], timeout: float,
+                cancel: Optional[CancelToken]) -> List[Dict[str, Any]]:
+    """
+    Run call(attempt_timeout) up to twice with a back-off in between; [] on failure.
+    Attempts are capped by the cancel token's deadline and stop once it is cancelled.
+    """
+    cancel = cancel or CancelToken()
+    for attempt in range(2):
+        attempt_timeout = cancel.remaining(timeout)
+        if cancel.cancelled or attempt_timeout <= 0:
+            return []
+        try:
+            return call(attempt_timeout)
+        except SearchCancelled:
+            return []
+        except Exception as e:
+            logger.debug("search attempt %s failed: %s", attempt + 1, e)
+            if attempt == 0 and not cancel.sleep(RETRY_BACKOFF_S):
+                return []
+    return []
 
 
 def _normalize_domain(link: str) -> str:
@@ -33,37 +86,29 @@ def _normalize_domain(link: str) -> str:
 
 
 # ─── Brave Search ─────────────────────────────────────────────────────────
-def fetch_brave(query: str, api_key: str, num: int = 10) -> List[Dict[str, Any]]:
+def fetch_brave(query: str, api_key: str, num: int = 10, cancel: Optional[CancelToken] = None) -> List[Dict[str, Any]]:
     """Call Brave Web Search API. Returns list of { title, link, snippet, displayLink }."""
-    url = "https://api.search.brave.com/res/v1/web/search?" + urllib.parse.urlencode({"q": query, "count": min(num, 20)})
-    req = urllib.request.Request(
-        url,
-        headers={
-            "X-Subscription-Token": api_key,
-            "Accept": "application/json",
-            "User-Agent": "ContentPurchaseOptimizer/1.0",
-        },
-    )
-    last_err = None
-    for attempt in range(2):
-        try:
-            with urllib.request.urlopen(req, timeout=12) as resp:
-                data = _json.loads(resp.read().decode())
-            results = (data.get("web") or {}).get("results") or []
-            return [
-                {
-                    "title": r.get("title", ""),
-                    "link": r.get("url", ""),
-                    "snippet": r.get("description", ""),
-                    "displayLink": _normalize_domain(r.get("url", "")),
-                }
-                for r in results[:num]
-            ]
-        except Exception as e:
-            last_err = e
-            if attempt == 0:
-                time.sleep(1)
-    return []
+    url = BRAVE_SEARCH_URL + "?" + urllib.parse.urlencode({"q": query, "count": min(num, 20)})
+    headers = {
+        "X-Subscription-Token": api_key,
+        "Accept": "application/json",
+        "User-Agent": "ContentPurchaseOptimizer/1.0",
+    }
+
+    def call(timeout: float) -> List[Dict[str, Any]]:
+        data = get_search_transport().get_json(url, headers, timeout, cancel)
+        results = (data.get("web") or {}).get("results") or []
+        return [
+            {
+                "title": r.get("title", ""),
+                "link": r.get("url", ""),
+                "snippet": r.get("description", ""),
+                "displayLink": _normalize_domain(r.get("url", "")),
+            }
+            for r in results[:num]
+        ]
+
+    return _with_retry(call, 12, cancel)
 
 
 # ─── DuckDuckGo / metasearch (ddgs preferred; duckduckgo_search fallback) ───
@@ -77,26 +122,42 @@ def _normalize_ddgs_result(r: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def fetch_duckduckgo(query: str, num: int = 10) -> List[Dict[str, Any]]:
+DDGS_TIMEOUT_S = 10
+_ddgs_local = threading.local()
+_ddgs_created = 0
+
+
+def _ddgs_client(ddgs_cls):
+    """This thread's long-lived DDGS client (its HTTP session is reused across searches)."""
+    global _ddgs_created
+    client = getattr(_ddgs_local, "client", None)
+    if client is None:
+        client = ddgs_cls(timeout=DDGS_TIMEOUT_S)
+        _ddgs_local.client = client
+        _ddgs_created += 1
+    return client
+
+
+def fetch_duckduckgo(query: str, num: int = 10, cancel: Optional[CancelToken] = None) -> List[Dict[str, Any]]:
     """Search via ddgs (metasearch) or legacy duckduckgo_search. Returns list of { title, link, snippet }."""
     num = min(num, 20)
     # Prefer modern ddgs package (Python 3.10+); avoids deprecation and often returns results
     try:
         from ddgs import DDGS
-        last_err = None
-        for attempt in range(2):
+
+        def call(timeout: float) -> List[Dict[str, Any]]:
+            client = _ddgs_client(DDGS)
             try:
-                client = DDGS()
                 results = client.text(query, max_results=num, backend="auto")
-                if results is None:
-                    results = []
-                results = list(results) if not isinstance(results, list) else results
-                return [_normalize_ddgs_result(r) for r in results]
-            except Exception as e:
-                last_err = e
-                if attempt == 0:
-                    time.sleep(1)
-        return []
+            except Exception:
+                _ddgs_local.client = None  # rebuild a client that may be in a bad state
+                raise
+            if results is None:
+                results = []
+            results = list(results) if not isinstance(results, list) else results
+            return [_normalize_ddgs_result(r) for r in results]
+
+        return _with_retry(call, 10, cancel)
     except ImportError:
         pass
     # Fallback: legacy duckduckgo_search (deprecated, may return 0 results)
@@ -104,23 +165,23 @@ def fetch_duckduckgo(query: str, num: int = 10) -> List[Dict[str, Any]]:
         import warnings
         with warnings.catch_warnings(action="ignore", category=RuntimeWarning):
             from duckduckgo_search import DDGS
-        for attempt in range(2):
-            try:
-                with DDGS() as ddgs:
-                    raw = list(ddgs.text(query, max_results=num))
-                return [_normalize_ddgs_result(r) for r in raw]
-            except Exception:
-                if attempt == 0:
-                    time.sleep(1)
+
+        def legacy_call(timeout: float) -> List[Dict[str, Any]]:
+            with DDGS(timeout=max(int(timeout), 1)) as ddgs:
+                raw = list(ddgs.text(query, max_results=num))
+            return [_normalize_ddgs_result(r) for r in raw]
+
+        return _with_retry(legacy_call, 10, cancel)
     except ImportError:
         pass
     return []
 
 
 # ─── Google Custom Search ─────────────────────────────────────────────────
-def fetch_google_cse(query: str, api_key: str, cx: str, num: int = 10) -> List[Dict[str, Any]]:
+def fetch_google_cse(query: str, api_key: str, cx: str, num: int = 10,
+                     cancel: Optional[CancelToken] = None) -> List[Dict[str, Any]]:
     """Call Google Custom Search JSON API. Returns list of { title, link, snippet, displayLink }."""
-    base = "https://www.googleapis.com/customsearch/v1"
+    base = GOOGLE_CSE_URL
     params = {
         "key": api_key,
         "cx": cx,
@@ -128,58 +189,191 @@ def fetch_google_cse(query: str, api_key: str, cx: str, num: int = 10) -> List[D
         "num": min(num, 10),
     }
     url = base + "?" + "&".join(f"{k}={urllib.parse.quote(str(v))}" for k, v in params.items())
-    req = urllib.request.Request(url, headers={"User-Agent": "ContentPurchaseOptimizer/1.0"})
-    last_err = None
-    for attempt in range(2):
-        try:
-            with urllib.request.urlopen(req, timeout=10) as resp:
-                data = _json.loads(resp.read().decode())
-            items = data.get("items") or []
-            return [
-                {
-                    "title": it.get("title", ""),
-                    "link": it.get("link", ""),
-                    "snippet": it.get("snippet", ""),
-                    "displayLink": (it.get("displayLink") or _normalize_domain(it.get("link", ""))),
-                }
-                for it in items
-            ]
-        except Exception as e:
-            last_err = e
-            if attempt == 0:
-                time.sleep(1)
-    return []
+    headers = {"User-Agent": "ContentPurchaseOptimizer/1.0"}
+
+    def call(timeout: float) -> List[Dict[str, Any]]:
+        data = get_search_transport().get_json(url, headers, timeout, cancel)
+        items = data.get("items") or []
+        return [
+            {
+                "title": it.get("title", ""),
+                "link": it.get("link", ""),
+                "snippet": it.get("snippet", ""),
+                "displayLink": (it.get("displayLink") or _normalize_domain(it.get("link", ""))),
+            }
+            for it in items
+        ]
+
+    return _with_retry(call, 10, cancel)
 
 
 # ─── Site-restricted search (fallback to get articles from our catalog) ─────
-def fetch_search_results_for_site(query: str, site_domain: str, num: int = 3) -> List[Dict[str, Any]]:
+def fetch_search_results_for_site(query: str, site_domain: str, num: int = 3,
+                                  ttl_s: Optional[float] = None) -> List[Dict[str, Any]]:
     """Search restricted to one domain (e.g. apnews.com). Use when general search returns no matches."""
     q = f"{query} site:{site_domain}"
-    results, _ = fetch_search_results(q, num=num)
+    results, _ = fetch_search_results(q, num=num, ttl_s=ttl_s)
     return results
 
 
 # ─── Unified entrypoint ────────────────────────────────────────────────────
-def fetch_search_results(query: str, num: int = 12) -> Tuple[List[Dict[str, Any]], str]:
-    """
-    Fetch real-time search results for the query.
-    Tries providers in order (Brave → Google CSE → DuckDuckGo); first to return
-    non-empty results wins. Each provider is retried once on failure.
-    Returns (list of { title, link, snippet, displayLink }, provider_name).
-    """
+SearchFn = Callable[[str, int, CancelToken], List[Dict[str, Any]]]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix="search")
+    return _executor
+
+
+def configured_providers() -> List[Tuple[str, SearchFn]]:
+    """(name, fetch(query, num, cancel)) for every configured provider, in priority order."""
+    providers: List[Tuple[str, SearchFn]] = []
     brave_key = os.environ.get("BRAVE_API_KEY", "").strip()
     if brave_key:
-        results = fetch_brave(query, brave_key, num=num)
-        if results:
-            return (results, "Brave")
+        providers.append(("Brave", lambda q, n, c: fetch_brave(q, brave_key, num=n, cancel=c)))
     api_key = os.environ.get("GOOGLE_CSE_API_KEY", "").strip()
     cx = os.environ.get("GOOGLE_CSE_CX", "").strip()
     if api_key and cx:
-        results = fetch_google_cse(query, api_key, cx, num=num)
-        if results:
-            return (results, "Google CSE")
-    results = fetch_duckduckgo(query, num=num)
-    return (results, "DuckDuckGo")
+        providers.append(("Google CSE", lambda q, n, c: fetch_google_cse(q, api_key, cx, num=n, cancel=c)))
+    providers.append(("DuckDuckGo", lambda q, n, c: fetch_duckduckgo(q, num=n, cancel=c)))
+    return providers
+
+
+def fan_out(
+    query: str,
+    num: int,
+    providers: List[Tuple[str, SearchFn]],
+    mode: Optional[str] = None,
+    hedge_ms: Optional[float] = None,
+    deadline_ms: Optional[float] = None,
+    health: Optional[ProviderHealth] = None,
+) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Run providers concurrently ("race") or staggered by hedge_ms ("hedge") until one returns
+    non-empty results or deadline_ms passes; cancel the rest. Returns (results, provider name),
+    or ([], name of the last provider) when none succeeded in time.
+    With health, providers whose circuit is open are skipped (the first of them still runs
+    if no provider could start) and every outcome is recorded.
+    """
+    mode = mode or SEARCH_MODE
+    hedge_s = (SEARCH_HEDGE_MS if hedge_ms is None else hedge_ms) / 1e3
+    deadline = time.monotonic() + (SEARCH_DEADLINE_MS if deadline_ms is None else deadline_ms) / 1e3
+    executor = _get_executor()
+    waiting = list(providers)
+    running: Dict[Any, Tuple[str, CancelToken, float]] = {}
+    skipped: List[Tuple[str, SearchFn]] = []
+    next_start = time.monotonic()
+    winner: Optional[Tuple[List[Dict[str, Any]], str]] = None
+    last_name = providers[-1][0] if providers else ""
+
+    def start_next() -> None:
+        nonlocal last_name
+        while waiting:
+            name, fn = waiting.pop(0)
+            if health is not None and not health.acquire(name):
+                skipped.append((name, fn))
+                SEARCH_BREAKER_SKIPS.inc(name)
+                if waiting or running or len(skipped) < len(providers):
+                    continue
+                # Every circuit is open: try the best-ranked provider anyway
+                name, fn = skipped[0]
+            token = CancelToken(deadline)
+            running[executor.submit(fn, query, num, token)] = (name, token, time.monotonic())
+            last_name = name
+            return
+
+    def record(name: str, outcome: str, started: float) -> None:
+        elapsed = time.monotonic() - started
+        SEARCH_CALL_SECONDS.observe(elapsed, name, outcome)
+        if health is not None:
+            health.record(name, outcome, elapsed)
+
+    try:
+        while waiting or running:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            while waiting and (mode == "race" or not running or now >= next_start):
+                start_next()
+                next_start = now + hedge_s
+            timeout = deadline - now
+            if waiting:
+                timeout = min(timeout, max(next_start - now, 0.0))
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name, _, started = running.pop(fut)
+                try:
+                    results = fut.result()
+                except Exception as e:
+                    logger.warning("Search provider %s failed: %s", name, e)
+                    results = []
+                record(name, "success" if results else "failure", started)
+                if results:
+                    winner = (results, name)
+                    break
+                if waiting or running:
+                    SEARCH_FALLBACKS.inc(name)
+                # Failed or empty: the next provider need not wait out the hedge delay
+                next_start = time.monotonic()
+            if winner:
+                break
+    finally:
+        for fut, (name, token, started) in running.items():
+            token.cancel()
+            fut.cancel()
+            # A loser to a faster provider was merely slow; one still running at the deadline failed
+            record(name, "abandoned" if winner else "failure", started)
+    if winner:
+        return winner
+    return ([], last_name)
+
+
+def fetch_search_results(query: str, num: int = 12, deadline_ms: Optional[float] = None,
+                         ttl_s: Optional[float] = None) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Fetch real-time search results for the query.
+    Fans out over the configured providers (Brave → Google CSE → DuckDuckGo), in the order
+    provider_health currently prefers, as described in the module docstring; the first to
+    return non-empty results wins. Each provider is retried once on failure within the
+    overall deadline.
+    Results go through search_cache (stale-while-revalidate); ttl_s is the entry's TTL,
+    normally search_cache.search_ttl(sigs), and 0 bypasses the cache.
+    Returns (list of { title, link, snippet, displayLink }, provider_name).
+    """
+    providers = configured_providers()
+    health = get_provider_health()
+
+    def fetch() -> Tuple[List[Dict[str, Any]], str]:
+        # Ranked at fetch time so background refreshes see current health
+        rank = {name: i for i, name in enumerate(health.order([name for name, _ in providers]))}
+        ordered = sorted(providers, key=lambda p: rank[p[0]])
+        return fan_out(query, num, ordered, deadline_ms=deadline_ms, health=health)
+
+    cache = get_search_cache()
+    ttl = TTL_DEFAULT if ttl_s is None else ttl_s
+    with stage_timer("search"):
+        if cache is None or ttl <= 0:
+            return fetch()
+        # Keyed by the configured chain, not the current order, so re-ranking keeps the cache warm
+        return cache.fetch(query, num, ">".join(name for name, _ in providers), ttl, fetch)
+
+
+def search_stats() -> Dict[str, Any]:
+    """Provider health, connection reuse and latency per host, DDGS clients, result cache."""
+    cache = get_search_cache()
+    return {
+        "providers": get_provider_health().stats(),
+        "hosts": get_search_transport().stats(),
+        "ddgs_clients_created": _ddgs_created,
+        "cache": cache.stats() if cache is not None else None,
+    }
 
 
 def is_search_configured() -> bool:
@@ -188,9 +382,5 @@ def is_search_configured() -> bool:
 
 
 def get_search_provider_name() -> str:
-    """Which provider will be used (for UI or logs)."""
-    if os.environ.get("BRAVE_API_KEY", "").strip():
-        return "Brave"
-    if os.environ.get("GOOGLE_CSE_API_KEY", "").strip() and os.environ.get("GOOGLE_CSE_CX", "").strip():
-        return "Google CSE"
-    return "DuckDuckGo"
+    """Which provider would be tried first right now (for UI or logs)."""
+    return get_provider_health().order([name for name, _ in configured_providers()])[0]
@@ -0,0 +1,339 @@
+"""
+Shared HTTP transport for search providers.
+
+One keep-alive connection pool per host (scheme, host, port): idle connections are reused
+LIFO, so at steady volume requests skip the TCP and TLS handshakes. Each host has a
+concurrency limit (SEARCH_MAX_PER_HOST); callers wait for a slot within their deadline.
+Requests ask for gzip and bodies are decoded transparently. Every request lands in a
+latency histogram (from connection checkout to decoded body) split by whether its
+connection was new or reused, which shows what the handshakes cost.
+
+Also holds CancelToken, the cooperative cancellation used by search_provider's fan-out:
+a cancelled request's socket is shut down and its connection is never pooled again.
+"""
+
+import gzip
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+SEARCH_MAX_PER_HOST = int(os.environ.get("SEARCH_MAX_PER_HOST", "8"))
+SEARCH_IDLE_TIMEOUT_S = float(os.environ.get("SEARCH_IDLE_TIMEOUT_S", "60"))
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class SearchCancelled(Exception):
+    """Raised inside a provider call once its CancelToken has been cancelled."""
+
+
+class CancelToken:
+    """
+    Cooperative cancellation for one provider call. cancel() shuts down any registered
+    in-flight HTTP connection (unblocking its read) and wakes a pending retry back-off.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline  # time.monotonic() value, or None for no deadline
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._conns: set = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def remaining(self, cap: float) -> float:
+        """Seconds left before the deadline, at most cap."""
+        if self.deadline is None:
+            return cap
+        return max(min(cap, self.deadline - time.monotonic()), 0.0)
+
+    def sleep(self, seconds: float) -> bool:
+        """Back-off that ends early on cancel or deadline. True if the call should go on."""
+        return not self._event.wait(self.remaining(seconds)) and self.remaining(1.0) > 0
+
+    def register(self, conn) -> None:
+        with self._lock:
+            if self.cancelled:
+                raise SearchCancelled()
+            self._conns.add(conn)
+
+    def unregister(self, conn) -> None:
+        with self._lock:
+            self._conns.discard(conn)
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._event.set()
+            conns, self._conns = self._conns, set()
+        for conn in conns:
+            _abort_connection(conn)
+
+
+def _abort_connection(conn) -> None:
+    sock = getattr(conn, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (upper bounds in ms, plus an overflow bucket)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total_ms = 0.0
+        self.count = 0
+
+    def observe(self, ms: float) -> None:
+        i = 0
+        while i < len(self.buckets) and ms > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total_ms += ms
+        self.count += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{b}" for b in self.buckets] + ["inf"]
+        return {
+            "count": self.count,
+            "avg_ms": self.total_ms / self.count if self.count else 0.0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+def _decode_body(body: bytes, encoding: str) -> bytes:
+    encoding = (encoding or "").strip().lower()
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+# Errors that mean a reused keep-alive connection had already been closed by the server
+_STALE_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError, http.client.BadStatusLine)
+
+
+class HostPool:
+    """Keep-alive connections to one host, at most max_connections in use at a time."""
+
+    def __init__(self, scheme: str, host: str, port: Optional[int], max_connections: int, idle_timeout: float):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._idle: deque = deque()  # (conn, released_at)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.stale = 0
+        self.slot_waits = 0
+        self.slot_timeouts = 0
+        self.latency = {"new": LatencyHistogram(), "reused": LatencyHistogram()}
+
+    def _new_connection(self, timeout: float):
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        with self._lock:
+            self.created += 1
+        return cls(self.host, self.port, timeout=timeout)
+
+    def acquire(self, timeout: float) -> Tuple[Any, bool]:
+        """(connection, reused) once a slot is free; raises TimeoutError after timeout seconds."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.slot_waits += 1
+            if not self._slots.acquire(timeout=timeout):
+                with self._lock:
+                    self.slot_timeouts += 1
+                raise TimeoutError(f"no free connection to {self.host} within {timeout:.2f}s")
+        now = time.monotonic()
+        with self._lock:
+            self.in_use += 1
+            while self._idle:
+                conn, released_at = self._idle.pop()
+                if now - released_at <= self.idle_timeout:
+                    self.reused += 1
+                    conn.timeout = timeout
+                    if conn.sock is not None:
+                        conn.sock.settimeout(timeout)
+                    return conn, True
+                self.discarded += 1
+                conn.close()
+        try:
+            return self._new_connection(timeout), False
+        except Exception:
+            self._release_slot()
+            raise
+
+    def release(self, conn, reusable: bool) -> None:
+        with self._lock:
+            if reusable and conn.sock is not None and len(self._idle) < self.max_connections:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            elif conn is not None:
+                self.discarded += 1
+        if conn is not None:
+            conn.close()
+        self._release_slot()
+
+    def note_reconnect(self) -> None:
+        """A reused connection turned out stale and was reopened."""
+        with self._lock:
+            self.reused -= 1
+            self.created += 1
+            self.stale += 1
+
+    def observe(self, reused: bool, ms: float) -> None:
+        with self._lock:
+            self.latency["reused" if reused else "new"].observe(ms)
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self.in_use -= 1
+        self._slots.release()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.created + self.reused
+            return {
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "max_connections": self.max_connections,
+                "connections_created": self.created,
+                "connections_reused": self.reused,
+                "reuse_rate": self.reused / requests if requests else 0.0,
+                "connections_discarded": self.discarded,
+                "stale_reconnects": self.stale,
+                "slot_waits": self.slot_waits,
+                "slot_timeouts": self.slot_timeouts,
+                "latency_ms": {k: h.to_dict() for k, h in self.latency.items()},
+            }
+
+
+class SearchTransport:
+    """Per-host HostPools shared by all search providers; starts fresh after fork."""
+
+    def __init__(self, max_per_host: int = SEARCH_MAX_PER_HOST, idle_timeout: float = SEARCH_IDLE_TIMEOUT_S):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self._pools: Dict[Tuple[str, str, Optional[int]], HostPool] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def pool(self, scheme: str, host: str, port: Optional[int]) -> HostPool:
+        key = (scheme, host, port)
+        if os.getpid() != self._pid:
+            # Forked child: the parent's sockets must not be shared
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._pools = {}
+                    self._pid = os.getpid()
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = HostPool(scheme, host, port, self.max_per_host, self.idle_timeout)
+                    self._pools[key] = pool
+        return pool
+
+    def get_json(self, url: str, headers: Dict[str, str], timeout: float,
+                 cancel: Optional[CancelToken] = None) -> Any:
+        """GET url over a pooled keep-alive connection and decode its (possibly gzip) JSON body."""
+        parts = urlsplit(url)
+        pool = self.pool(parts.scheme, parts.hostname, parts.port)
+        path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+        headers = {**headers, "Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+        conn, reused = pool.acquire(cancel.remaining(timeout) if cancel is not None else timeout)
+        started = time.perf_counter()
+        reusable = False
+        try:
+            if cancel is not None:
+                cancel.register(conn)
+            try:
+                try:
+                    conn.request("GET", path, headers=headers)
+                    resp = conn.getresponse()
+                except _STALE_ERRORS:
+                    if not reused or (cancel is not None and cancel.cancelled):
+                        raise
+                    # The server closed the idle connection; retry once on a fresh one
+                    conn.close()
+                    reused = False
+                    pool.note_reconnect()
+                    conn.request("GET", path, headers=headers)
+                    resp = conn.getresponse()
+                body = _decode_body(resp.read(), resp.getheader("Content-Encoding", ""))
+                reusable = not resp.will_close
+            finally:
+                if cancel is not None:
+                    cancel.unregister(conn)
+            if resp.status >= 400:
+                raise OSError(f"HTTP {resp.status} from {parts.hostname}")
+            data = json.loads(body.decode())
+        except OSError:
+            reusable = False
+            if cancel is not None and cancel.cancelled:
+                raise SearchCancelled()
+            raise
+        except Exception:
+            reusable = False
+            raise
+        finally:
+            if cancel is not None and cancel.cancelled:
+                reusable = False
+            pool.release(conn, reusable)
+        pool.observe(reused, (time.perf_counter() - started) * 1e3)
+        return data
+
+    def close(self) -> None:
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pools = dict(self._pools)
+        return {f"{s}://{h}" + (f":{p}" if p else ""): pool.stats() for (s, h, p), pool in pools.items()}
+
+
+_transport: Optional[SearchTransport] = None
+_transport_lock = threading.Lock()
+
+
+def get_search_transport() -> SearchTransport:
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = SearchTransport()
+    return _transport
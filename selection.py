@@ -0,0 +1,238 @@
+"""
+Gate 3 selection: choose which eligible sources to buy.
+
+The problem: maximize the total value of the selected sources, value = utility -
+price_weight * price (so a source is bought only if its utility is worth its price, as in
+the greedy gate's utility-per-dollar ranking), subject to
+  - total price <= budget (a knapsack over price),
+  - at most max_sources picks, and at least min_sources when any such set is feasible,
+  - no two sources from a REDUNDANT pair,
+  - tier diversity: beyond the first source of a paid tier, at most min_sources - 1
+    duplicates of paid tiers overall (the greedy gate allows a duplicate only while
+    fewer than min_sources are selected).
+
+solve_selection runs a depth-first branch-and-bound over sources in descending value.
+The bound at a node is its value plus the best remaining values that still fit the budget,
+one per open slot (non-positive ones only while the set is short of min_sources). A greedy
+pass seeds the incumbent, so when the latency budget
+runs out the best plan found so far is returned along with its optimality gap against
+the root bound.
+"""
+
+import heapq
+import math
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+BOUND_SCAN = 64  # items a bound looks at before capping the rest by the current value
+
+
+class SelectionResult:
+    """Outcome of solve_selection; indices refer to the candidates list passed in."""
+
+    __slots__ = ("indices", "objective", "bound", "status", "nodes", "elapsed_ms")
+
+    def __init__(self, indices, objective, bound, status, nodes, elapsed_ms):
+        self.indices = indices
+        self.objective = objective
+        self.bound = bound
+        self.status = status
+        self.nodes = nodes
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def gap(self) -> float:
+        """Relative optimality gap: 0.0 when proven optimal."""
+        if self.status == "optimal" or self.bound <= 0:
+            return 0.0
+        return max(self.bound - self.objective, 0.0) / self.bound
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "objective": self.objective,
+            "upperBound": self.bound,
+            "gap": self.gap,
+            "nodes": self.nodes,
+            "elapsedMs": round(self.elapsed_ms, 3),
+        }
+
+
+def _conflicts(redundant) -> Dict[str, set]:
+    out: Dict[str, set] = {}
+    for pair in redundant:
+        for a in pair:
+            for b in pair:
+                if a != b:
+                    out.setdefault(a, set()).add(b)
+    return out
+
+
+class _Search:
+    def __init__(self, candidates, budget, max_sources, max_dups, conflicts, deadline, price_weight):
+        self.candidates = candidates
+        self.price_weight = price_weight
+        # Sources are materialized lazily in descending value (ties: candidates order);
+        # the search rarely looks past the first few dozen.
+        self._heap = list(zip([price_weight * c["price"] - c["utility"] for c in candidates], range(len(candidates))))
+        heapq.heapify(self._heap)
+        self.items: List[tuple] = []  # (value, price, name, tier, index)
+        self.n = len(candidates)
+        self.budget = budget
+        self.max_sources = max_sources
+        self.max_dups = max_dups
+        self.conflicts = conflicts
+        self.deadline = deadline
+        self.nodes = 0
+        self.steps = 0
+        self.timed_out = False
+        self.best_util = -math.inf
+        self.best: List[int] = []
+        self.need = 0
+
+    def item(self, k) -> tuple:
+        items = self.items
+        while len(items) <= k:
+            _, i = heapq.heappop(self._heap)
+            c = self.candidates[i]
+            items.append((c["utility"] - self.price_weight * c["price"], c["price"], c["name"], c["type"], i))
+        return items[k]
+
+    def feasible_add(self, item, names, tiers, dups) -> Optional[int]:
+        """New duplicate count if item can join the set, else None."""
+        _, _, name, tier, _ = item
+        blocked = self.conflicts.get(name)
+        if blocked and not blocked.isdisjoint(names):
+            return None
+        if tier != "free" and tier in tiers:
+            if dups >= self.max_dups:
+                return None
+            return dups + 1
+        return dups
+
+    def bound(self, start, util, spent, slots, names=(), tiers=(), dups=0) -> float:
+        """
+        util plus the top `slots` remaining values among items that could each join the
+        current set on their own (price fits, no redundancy or tier conflict); values <= 0
+        only as many as the set still needs to reach self.need.
+        """
+        room = self.budget - spent
+        total = util
+        required = max(self.need - (self.max_sources - slots), 0)
+        for k in range(start, self.n):
+            if slots == 0:
+                break
+            item = self.item(k)
+            if item[0] <= 0 and required == 0:
+                break  # later items are worth no more
+            if k - start >= BOUND_SCAN:
+                # Nothing later is worth more than this item; stop scanning
+                return total + required * item[0] + (slots - required) * max(item[0], 0.0)
+            if item[1] <= room and self.feasible_add(item, names, tiers, dups) is not None:
+                total += item[0]
+                slots -= 1
+                required = max(required - 1, 0)
+        return total
+
+    def offer(self, chosen, util):
+        if len(chosen) >= self.need and util > self.best_util:
+            self.best_util = util
+            self.best = list(chosen)
+
+    def expired(self) -> bool:
+        self.steps += 1
+        if self.steps & 255 == 0 and time.perf_counter() > self.deadline:
+            self.timed_out = True
+        return self.timed_out
+
+    def dfs(self, start, chosen, names, tiers, dups, spent, util):
+        self.nodes += 1
+        self.offer(chosen, util)
+        slots = self.max_sources - len(chosen)
+        if slots == 0:
+            return
+        for j in range(start, self.n):
+            if self.expired():
+                return
+            if len(chosen) + (self.n - j) < self.need:
+                return
+            item = self.item(j)
+            if spent + item[1] > self.budget:
+                continue
+            new_dups = self.feasible_add(item, names, tiers, dups)
+            if new_dups is None:
+                continue
+            # Items are in descending value, so bounds only shrink as j advances
+            if self.bound(j, util, spent, slots, names, tiers, dups) <= self.best_util:
+                return
+            tier = item[3]
+            chosen.append(item[4])
+            names.add(item[2])
+            added_tier = tier not in tiers
+            if added_tier:
+                tiers.add(tier)
+            self.dfs(j + 1, chosen, names, tiers, new_dups, spent + item[1], util + item[0])
+            chosen.pop()
+            names.discard(item[2])
+            if added_tier:
+                tiers.discard(tier)
+
+
+def _greedy(search: _Search):
+    """Take sources in descending value while they fit and add value (or min_sources is short); seeds the incumbent."""
+    chosen, names, tiers, dups, spent, util = [], set(), set(), 0, 0.0, 0.0
+    for k in range(search.n):
+        if len(chosen) >= search.max_sources or search.expired():
+            break
+        item = search.item(k)
+        if item[0] <= 0 and len(chosen) >= search.need:
+            break
+        if spent + item[1] > search.budget:
+            continue
+        new_dups = search.feasible_add(item, names, tiers, dups)
+        if new_dups is None:
+            continue
+        chosen.append(item[4])
+        names.add(item[2])
+        tiers.add(item[3])
+        dups, spent, util = new_dups, spent + item[1], util + item[0]
+    search.offer(chosen, util)
+
+
+def solve_selection(
+    candidates: Sequence[Dict[str, Any]],
+    budget: float,
+    min_sources: int,
+    max_sources: int,
+    redundant: Sequence[Sequence[str]] = (),
+    time_budget_ms: float = 5.0,
+    price_weight: float = 0.0,
+) -> SelectionResult:
+    """
+    Best set of candidates (dicts with name, price, type, utility) under the Gate 3
+    constraints above, valuing each at utility - price_weight * price (0 maximizes raw
+    utility). Indices in the result are in candidates order.
+    """
+    started = time.perf_counter()
+    search = _Search(
+        candidates, budget, max_sources, max(min_sources - 1, 0), _conflicts(redundant),
+        started + time_budget_ms / 1e3, price_weight,
+    )
+    root_bound = search.bound(0, 0.0, 0.0, max_sources)
+
+    # Prefer sets of at least min_sources; relax only if none exists.
+    for need in range(min(min_sources, max_sources), -1, -1):
+        search.need = need
+        search.best_util, search.best = -math.inf, []
+        _greedy(search)
+        if not search.timed_out:
+            search.dfs(0, [], set(), set(), 0, 0.0, 0.0)
+        if search.best_util > -math.inf:
+            break
+
+    status = "time_limit" if search.timed_out else "optimal"
+    objective = search.best_util if search.best_util > -math.inf else 0.0
+    return SelectionResult(
+        sorted(search.best), objective, objective if status == "optimal" else root_bound,
+        status, search.nodes, (time.perf_counter() - started) * 1e3,
+    )
@@ -0,0 +1,269 @@
+r"""
+Signal-extraction engine: every pattern and lookup table used by app.extract_signals,
+compiled once at import.
+
+Trigger detection works in one tokenization pass over the query:
+  1) Each trigger pattern is indexed by the words its match can start with (derived from
+     the pattern source, e.g. r'\b(this\s+week|latest|q[1-4])\b' -> this, latest, q1..q4).
+  2) The lowercased query is split into word tokens once; only triggers whose anchor word
+     (or anchor character such as '$' or '%') appears are confirmed with their compiled regex.
+Triggers whose pattern cannot be indexed, and all non-ASCII queries, fall back to running
+the compiled regex, so results always equal a plain re.search with the same pattern/flags.
+"""
+
+import re
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+# ─── Intent profiles ──────────────────────────────────────────────────────
+INTENT_PROFILES = {
+    "financial_analysis": "earnings revenue profit stock market investment quarterly financial economics gdp tariff semiconductor fund",
+    "breaking_news":      "today latest breaking just announced hours minutes update urgent happened morning",
+    "tech_product":       "product launch release features review specs benchmark model gpt llm capabilities version",
+    "explainer":          "how does explain history background context overview understand mechanism works",
+    "policy":             "regulation law policy act eu government legislation compliance requirement providers",
+    "medical_clinical":   "clinical trial drug treatment therapy patient study health symptoms diagnosis results should take",
+}
+
+
+def token_set(text: str) -> FrozenSet[str]:
+    """Tokenization used by cos_sim: lowercase words longer than two characters."""
+    return frozenset(w for w in text.lower().split() if len(w) > 2)
+
+
+INTENT_TOKENS: Dict[str, FrozenSet[str]] = {k: token_set(v) for k, v in INTENT_PROFILES.items()}
+
+# ─── Trigger patterns ─────────────────────────────────────────────────────
+# Searched in the lowercased query. (name, pattern, case-insensitive)
+SIGNAL_TRIGGERS = [
+    ("what_happened", r"\bwhat('s|\s+is|\s+happened|\s+happening)\b", False),
+    ("specific",      r'\b(q[1-4]|20[2-9]\d|\$[\d]+|percent|%|basis\s*points|ipo|ceo|cfo|merger|acquisition|exactly|specific|detail|result)\b', True),
+    ("high_stakes",   r'\b(should\s+i|should\s+we|invest|buy|sell|treatment|diagnosis|legal|liability|compliance|prescription|recommend)\b', True),
+    ("med_stakes",    r'\b(impact|affect|influence|result|consequence|implication|effect)\b', True),
+    ("sensitivity",   r'\b(medical|clinical|legal|financial\s+advice|investment\s+advice|drug|diagnosis|prescription|liability|should\s+i\s+take)\b', True),
+    ("finance",       r'\b(finance|earnings|revenue|profit)\b', True),
+    ("controversy",   r'\b(policy|regulation|debate|controversial|ban|restrict|versus|vs\.|disagree|dispute|different\s+views)\b', True),
+    ("now",           r'\b(today|this\s+morning|just|breaking|right\s+now|announced|hours\s+ago|minutes\s+ago|tonight|yesterday)\b', True),
+    ("recent",        r'\b(this\s+week|this\s+month|latest|recent|new|2025|2026|q[1-4]\s*202[456])\b', True),
+    ("archive",       r'\b(history|background|how\s+does|explain|what\s+is|overview|2020|2019|2018|originally)\b', True),
+    ("quarterly",     r'\b(q[1-4])\b', True),
+    ("year",          r'\b(202[3456])\b', False),
+    ("event",         r'\b(earnings|ipo|merger|acquisition|rate\s+decision|vote|election|launch|announcement|profit\s+warning|down\s+\d|up\s+\d)\b', True),
+    ("analytical",    r'\b(analyze|analysis|impact|implication|compare|versus|tradeoff|why\s+is|explain\s+why|how\s+does|what\s+are\s+the)\b', True),
+    ("depth",         r'\b(comprehensive|detailed|in-depth|full\s+analysis|thorough|breakdown|deep\s+dive|specific|exactly)\b', True),
+    ("navigational",  r'\b(official|site|website|page|homepage|portal)\b', True),
+    ("transactional", r'\b(how\s+to|steps\s+to|guide|tutorial|sign\s+up)\b', True),
+    ("ambiguity",     r'\b(or|versus|vs\.|either|unclear|depends|different\s+views|perspective|both\s+sides)\b', True),
+    ("earnings",      r"\b(earnings|revenue|profit|q[1-4])\b", False),
+]
+
+# Intent templates, searched case-insensitively in the original query; first match in list order wins.
+TEMPLATES = [
+    (r'\b(earnings|revenue|profit)\b.*\b(q[1-4]|quarter|annual)\b', "<company>_earnings_<period>", 0.22),
+    (r'\b(what\s+did|said|announced|statement)\b',                   "<speaker>_statement",         0.18),
+    (r'\b(clinical\s+trial|phase\s+[123]|fda)\b',                    "<medical_trial>",              0.20),
+    (r'\b(today|this\s+morning|just|breaking)\b',                    "<breaking_event>",             0.15),
+    (r'\b(compliance|regulation|act|law|requirement)\b',             "<policy_query>",               0.12),
+    (r'\b(should\s+i|should\s+we)\b',                                "<decision_query>",             0.10),
+]
+
+HAS_ENTITY_RE = re.compile(r"\b[A-Z][a-z]{2,}\b")
+ENTITY_RE = re.compile(r'\b([A-Z][a-z]{1,}(?:\s[A-Z][a-z]{1,})*|[A-Z]{2,6})\b')
+ENTITY_SKIP = frozenset({'The', 'A', 'An', 'In', 'On', 'At', 'Is', 'It', 'If', 'Do', 'Be', 'We', 'My'})
+
+_WORD_RE = re.compile(r"\w+")
+
+
+# ─── Anchor derivation ────────────────────────────────────────────────────
+def _split_alternatives(body: str) -> List[str]:
+    """Split a regex body on top-level '|'."""
+    out, depth, start, i = [], 0, 0, 0
+    while i < len(body):
+        ch = body[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == "[":
+            i = body.index("]", i) + 1
+            continue
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            out.append(body[start:i])
+            start = i + 1
+        i += 1
+    out.append(body[start:])
+    return out
+
+
+def _closing_paren(s: str, open_idx: int) -> int:
+    depth, i = 0, open_idx
+    while i < len(s):
+        ch = s[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == "[":
+            i = s.index("]", i) + 1
+            continue
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    raise ValueError(f"unbalanced pattern: {s!r}")
+
+
+def _class_chars(spec: str) -> Optional[str]:
+    """Expand a simple character class body like '1-4', '456' or '\\d'."""
+    chars, i = [], 0
+    while i < len(spec):
+        if spec.startswith(r"\d", i):
+            chars.extend("0123456789")
+            i += 2
+        elif i + 2 < len(spec) and spec[i + 1] == "-":
+            chars.extend(chr(c) for c in range(ord(spec[i]), ord(spec[i + 2]) + 1))
+            i += 3
+        elif spec[i].isalnum():
+            chars.append(spec[i])
+            i += 1
+        else:
+            return None
+    return "".join(chars)
+
+
+def _atom_anchors(atom: str) -> Optional[Tuple[FrozenSet[str], FrozenSet[str]]]:
+    """
+    For an alternative that follows a \\b: (words its first token can be, non-word chars it can
+    start with), or None when the atom uses constructs this indexer does not model.
+    """
+    if atom.startswith(r"\$") or atom.startswith(r"\."):
+        return frozenset(), frozenset(atom[1])
+    if atom[:1] in ("%", "'", "-"):
+        return frozenset(), frozenset(atom[0])
+    prefixes, words, i = [""], set(), 0
+    while i < len(atom):
+        ch = atom[i]
+        if ch.isalnum() or ch == "_":
+            chars, i = ch, i + 1
+        elif atom.startswith(r"\d", i) or ch == "[":
+            if ch == "[":
+                end = atom.index("]", i)
+                chars, i = _class_chars(atom[i + 1:end]), end + 1
+            else:
+                chars, i = "0123456789", i + 2
+            if chars is None:
+                return None
+        elif atom.startswith(r"\s*", i):
+            # Zero whitespace joins the words into one token; one or more ends the token here.
+            words.update(prefixes)
+            i += 3
+            continue
+        elif atom.startswith(r"\s", i) or atom.startswith(r"\.", i) or ch in "-'":
+            break
+        elif ch == "(":
+            end = _closing_paren(atom, i)
+            alts = _split_alternatives(atom[i + 1:end])
+            if not all(a.startswith((r"\s", "'")) for a in alts):
+                return None
+            break
+        else:
+            return None
+        if i < len(atom) and atom[i] in "*+?{":
+            return None
+        prefixes = [p + c for p in prefixes for c in chars]
+    if prefixes == [""]:
+        return None
+    words.update(prefixes)
+    return frozenset(words), frozenset()
+
+
+def pattern_anchors(pattern: str) -> Optional[Tuple[FrozenSet[str], FrozenSet[str]]]:
+    """
+    Anchors for a pattern of the form \\b(alt|alt|...)\\b... or \\bword...: the union of
+    _atom_anchors over its leading alternatives, or None if any alternative is not indexable.
+    """
+    if not pattern.startswith(r"\b"):
+        return None
+    rest = pattern[2:]
+    if rest.startswith("("):
+        end = _closing_paren(rest, 0)
+        if not (rest[end + 1:] == "" or rest[end + 1:].startswith(r"\b")):
+            return None
+        atoms = _split_alternatives(rest[1:end])
+    else:
+        atoms = [rest]
+    words, chars = set(), set()
+    for atom in atoms:
+        anchors = _atom_anchors(atom)
+        if anchors is None:
+            return None
+        words.update(anchors[0])
+        chars.update(anchors[1])
+    return frozenset(words), frozenset(chars)
+
+
+class _AnchoredPatternSet:
+    """Compiled patterns plus a word/char index of where each one can start."""
+
+    def __init__(self, named_patterns: List[Tuple[str, str, int]]):
+        self.order = [name for name, _, _ in named_patterns]
+        self.compiled = {name: re.compile(pat, flags) for name, pat, flags in named_patterns}
+        self.by_word: Dict[str, List[str]] = {}
+        self.by_char: Dict[str, List[str]] = {}
+        self.always: List[str] = []
+        for name, pat, _ in named_patterns:
+            anchors = pattern_anchors(pat)
+            if anchors is None:
+                self.always.append(name)
+                continue
+            for w in anchors[0]:
+                self.by_word.setdefault(w, []).append(name)
+            for c in anchors[1]:
+                self.by_char.setdefault(c, []).append(name)
+
+    def candidates(self, lowered: str, tokens: FrozenSet[str]) -> set:
+        if not lowered.isascii():
+            return set(self.order)
+        cands = set(self.always)
+        by_word = self.by_word
+        for t in tokens:
+            names = by_word.get(t)
+            if names:
+                cands.update(names)
+        for c, names in self.by_char.items():
+            if c in lowered:
+                cands.update(names)
+        return cands
+
+
+_TRIGGERS = _AnchoredPatternSet([
+    (name, pat, re.IGNORECASE if icase else 0) for name, pat, icase in SIGNAL_TRIGGERS
+])
+_TEMPLATES = _AnchoredPatternSet([(label, pat, re.IGNORECASE) for pat, label, _ in TEMPLATES])
+_TEMPLATE_INFO = {label: boost for _, label, boost in TEMPLATES}
+
+
+def scan_triggers(query: str) -> Tuple[FrozenSet[str], bool, Optional[Dict[str, Any]]]:
+    """
+    Detect every signal trigger in the query.
+    Returns (names of SIGNAL_TRIGGERS that fire, has_entity, matched template dict or None).
+    """
+    q = query.lower()
+    tokens = frozenset(_WORD_RE.findall(q))
+
+    cands = _TRIGGERS.candidates(q, tokens)
+    compiled = _TRIGGERS.compiled
+    triggers = frozenset(name for name in cands if compiled[name].search(q))
+
+    matched_template = None
+    t_cands = _TEMPLATES.candidates(q, tokens)
+    for label in _TEMPLATES.order:
+        if label in t_cands and _TEMPLATES.compiled[label].search(query):
+            matched_template = {"label": label, "boost": _TEMPLATE_INFO[label]}
+            break
+
+    return triggers, HAS_ENTITY_RE.search(query) is not None, matched_template
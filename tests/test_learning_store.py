@@ -0,0 +1,223 @@
+"""
+LearningStore behaviour both backends must share, run against MetricsStore (a SQLite file per
+test) and PostgresMetricsStore (a scratch schema per test).
+
+PostgreSQL comes from LEARNING_TEST_DB_URL, else a throwaway server started with pgserver
+(pip install pgserver); without either, or without psycopg, the PostgreSQL cases are skipped.
+
+  python -m pytest tests
+"""
+
+import os
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from learning import BoostCache, ConversionEvent, EventWriter, MetricsStore  # noqa: E402
+
+TODAY = date.today()
+
+
+def event(event_id, purchased, cluster="breaking_news", days_ago=0, customer_id="c1"):
+    day = TODAY - timedelta(days=days_ago)
+    return ConversionEvent(
+        event_id=event_id, query_id=event_id, query_text=f"query {event_id}", customer_id=customer_id,
+        timestamp=f"{day.isoformat()}T12:00:00Z", query_cluster=cluster, intent=cluster,
+        sources_purchased=purchased, total_cost=1.5,
+    )
+
+
+def counts(store, min_sample_size=1, **kwargs):
+    """(cluster, publisher) -> (purchases, citations, sample size) as the store reports them."""
+    perf = store.get_global_publisher_performance(min_sample_size=min_sample_size, **kwargs)
+    return {
+        (cluster, pub): (s["purchase_count"], s["citation_count"], s["sample_size"])
+        for cluster, pubs in perf["by_cluster"].items() for pub, s in pubs.items()
+    }
+
+
+@pytest.fixture(scope="session")
+def pg_url(tmp_path_factory):
+    try:
+        import psycopg  # noqa: F401
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        pytest.skip("psycopg[pool] is not installed")
+    url = os.environ.get("LEARNING_TEST_DB_URL")
+    if url:
+        yield url
+        return
+    try:
+        import pgserver
+    except ImportError:
+        pytest.skip("no PostgreSQL: set LEARNING_TEST_DB_URL or pip install pgserver")
+    server = pgserver.get_server(str(tmp_path_factory.mktemp("pgdata")), cleanup_mode="stop")
+    yield server.get_uri()
+    server.cleanup()
+
+
+@pytest.fixture
+def postgres_store(pg_url):
+    import psycopg
+    from psycopg.conninfo import make_conninfo
+
+    from learning_pg import PostgresMetricsStore
+
+    schema = f"test_{uuid.uuid4().hex[:8]}"
+    with psycopg.connect(pg_url, autocommit=True) as c:
+        c.execute(f"CREATE SCHEMA {schema}")
+    store = PostgresMetricsStore(make_conninfo(pg_url, options=f"-c search_path={schema}"),
+                                 boost_cache_ttl=0, min_size=1, max_size=2)
+    yield store
+    store.close()
+    with psycopg.connect(pg_url, autocommit=True) as c:
+        c.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    store = MetricsStore(str(tmp_path / "learning.db"), boost_cache_ttl=0)
+    yield store
+    store.close()
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def store(request):
+    return request.getfixturevalue(f"{request.param}_store")
+
+
+def corrupt(store, sql):
+    """Run sql against the store's aggregate tables behind its back."""
+    if isinstance(store, MetricsStore):
+        with store._pool.write() as c:
+            c.execute(sql)
+    else:
+        store._write(lambda cur: cur.execute(sql))
+
+
+def test_log_events_updates_aggregates(store):
+    store.log_events([event("e1", ["Reuters", "AP"]), event("e2", ["Reuters"])])
+    store.log_event(event("e3", ["Nature"], cluster="science"))
+
+    assert store.event_count() == 3
+    assert counts(store) == {
+        ("breaking_news", "Reuters"): (2, 0, 2),
+        ("breaking_news", "AP"): (1, 0, 1),
+        ("science", "Nature"): (1, 0, 1),
+    }
+    assert counts(store, query_cluster="science") == {("science", "Nature"): (1, 0, 1)}
+
+
+def test_relogged_event_replaces_its_contribution(store):
+    store.log_events([event("e1", ["Reuters", "AP"])])
+    store.log_events([event("e1", ["Bloomberg"])])
+
+    assert store.event_count() == 1
+    assert counts(store) == {("breaking_news", "Bloomberg"): (1, 0, 1)}
+    assert store.check_aggregates()["consistent"]
+
+
+def test_k_anonymity_threshold(store):
+    store.log_events([event(f"e{i}", ["Reuters"]) for i in range(4)] + [event("e9", ["AP"])])
+
+    assert counts(store, min_sample_size=4) == {("breaking_news", "Reuters"): (4, 0, 4)}
+
+
+def test_submit_feedback_counts_citations_once(store):
+    store.log_events([event("e1", ["Reuters", "AP"]), event("e2", ["Reuters"])])
+
+    assert store.submit_feedback("e1", ["Reuters"], answer_quality=0.9)
+    assert store.submit_feedback("e1", ["Reuters"], answer_quality=0.9)  # repeated: replaces, never adds
+    assert store.submit_feedback("e2", ["Reuters", "Unbought"], answer_quality=0.5)
+    assert not store.submit_feedback("missing", ["Reuters"])
+
+    assert counts(store) == {
+        ("breaking_news", "Reuters"): (2, 2, 2),
+        ("breaking_news", "AP"): (1, 0, 1),
+    }
+    # Corrected feedback moves the citation
+    assert store.submit_feedback("e1", ["AP"], answer_quality=0.9)
+    assert counts(store)[("breaking_news", "AP")] == (1, 1, 1)
+    assert counts(store)[("breaking_news", "Reuters")] == (2, 1, 2)
+    assert store.check_aggregates()["consistent"]
+
+
+def test_has_event(store):
+    store.log_events([event("e1", ["Reuters"])])
+
+    assert store.has_event("e1")
+    assert not store.has_event("missing")
+
+
+def test_event_writer_waits_only_for_queued_events(sqlite_store):
+    writer = EventWriter(sqlite_store, flush_ms=200)
+    try:
+        writer.submit(event("e1", ["Reuters"]))
+        assert writer.wait_for_event("e1", timeout=5.0)
+        assert sqlite_store.has_event("e1")
+        started = time.monotonic()
+        assert writer.wait_for_event("never-queued", timeout=5.0)
+        assert time.monotonic() - started < 0.1
+    finally:
+        writer.close()
+
+
+def test_learned_boost_prefers_cited_publishers(store):
+    store.log_events([event(f"e{i}", ["Reuters", "AP"]) for i in range(10)])
+    for i in range(10):
+        store.submit_feedback(f"e{i}", ["Reuters"] if i < 8 else ["AP"], answer_quality=0.8)
+
+    boost = store.get_learned_domain_boost("breaking_news")
+    assert set(boost) == {"Reuters", "AP"}
+    assert 0 <= boost["AP"] < boost["Reuters"] <= 1
+    assert store.get_learned_domain_boost("no_such_cluster") == {}
+
+
+def test_boost_cache_survives_events_until_feedback(store):
+    store.boost_cache = BoostCache(ttl=60)
+    store.log_events([event(f"e{i}", ["Reuters", "AP"]) for i in range(4)])
+    store.submit_feedback("e0", ["Reuters"], answer_quality=0.8)
+    before = store.get_learned_domain_boost("breaking_news")
+
+    store.log_events([event("e9", ["AP"])])  # events reach the boost on expiry
+    assert store.get_learned_domain_boost("breaking_news") == before
+    assert store.boost_cache.stats()["hits"] == 1
+
+    store.submit_feedback("e1", ["AP"], answer_quality=0.8)  # feedback invalidates at once
+    assert store.get_learned_domain_boost("breaking_news") != before
+    assert store.boost_cache.stats()["invalidations"] == 1
+
+
+def test_recent_performance_window(store):
+    store.log_events([event("old", ["Reuters"], days_ago=40), event("new", ["Reuters"], days_ago=1)])
+
+    recent = store.get_recent_publisher_performance(days=7, min_sample_size=1)
+    assert recent["by_cluster"]["breaking_news"]["Reuters"]["events_in_window"] == 1
+    decayed = store.get_recent_publisher_performance(days=60, half_life_days=10, min_sample_size=1)
+    assert decayed["by_cluster"]["breaking_news"]["Reuters"]["events_in_window"] == 2
+    assert decayed["by_cluster"]["breaking_news"]["Reuters"]["sample_size"] < 2
+
+
+def test_check_and_rebuild_aggregates(store):
+    store.log_events([event(f"e{i}", ["Reuters", "AP"], days_ago=i % 3) for i in range(6)])
+    store.submit_feedback("e0", ["AP"], answer_quality=0.7)
+    expected = counts(store)
+    assert store.check_aggregates()["consistent"]
+
+    corrupt(store, "UPDATE global_aggregates SET total_citations = total_citations + 5, count = count + 1")
+    corrupt(store, "DELETE FROM aggregate_buckets WHERE publisher = 'AP'")
+    check = store.check_aggregates()
+    assert not check["consistent"]
+    assert len(check["mismatches"]) == 2
+    assert check["bucket_mismatches"]
+    assert not store.check_aggregates()["consistent"]  # checking writes nothing
+
+    report = store.rebuild_aggregates()
+    assert report["applied"]
+    assert store.check_aggregates()["consistent"]
+    assert counts(store) == expected
@@ -0,0 +1,40 @@
+"""
+RetentionWorker start/stop.
+
+  python -m pytest tests
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from learning import MetricsStore  # noqa: E402
+from retention import RetentionWorker  # noqa: E402
+
+
+def test_worker_is_off_without_an_interval(tmp_path):
+    store = MetricsStore(str(tmp_path / "learning.db"))
+    worker = RetentionWorker(store, interval_s=0)
+    worker.ensure_started()
+    assert not worker.stats()["running"]
+    store.close()
+
+
+def test_close_stops_an_idle_worker(tmp_path):
+    store = MetricsStore(str(tmp_path / "learning.db"))
+    worker = RetentionWorker(store, interval_s=3600)
+    worker.ensure_started()
+    deadline = time.monotonic() + 10
+    while worker.stats()["passes"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert worker.stats()["passes"] == 1
+
+    started = time.monotonic()
+    worker.close()
+    assert time.monotonic() - started < 1.0
+    assert not worker.stats()["running"]
+    worker.ensure_started()  # closed workers stay stopped
+    assert not worker.stats()["running"]
+    store.close()
@@ -0,0 +1,78 @@
+"""
+selection.solve_selection against an exhaustive search over small random candidate sets.
+
+  python -m pytest tests
+"""
+
+import itertools
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from selection import solve_selection  # noqa: E402
+
+TIERS = ("free", "wire", "mid", "premium")
+
+
+def candidates(rng, n):
+    out = []
+    for i in range(n):
+        tier = rng.choice(TIERS)
+        price = 0.0 if tier == "free" else round(rng.uniform(0.3, 5.0), 2)
+        out.append({"name": f"s{i}", "type": tier, "price": price, "utility": round(rng.uniform(0.2, 1.0), 3)})
+    return out
+
+
+def brute_force(cands, budget, min_sources, max_sources, redundant, price_weight):
+    """Best value over every feasible set, preferring sets of at least min_sources (as the solver does)."""
+    conflicts = {frozenset(p) for p in redundant}
+    for need in range(min(min_sources, max_sources), -1, -1):
+        best = None
+        for k in range(need, max_sources + 1):
+            for combo in itertools.combinations(cands, k):
+                if sum(c["price"] for c in combo) > budget:
+                    continue
+                if any(frozenset((a["name"], b["name"])) in conflicts for a, b in itertools.combinations(combo, 2)):
+                    continue
+                paid = [c["type"] for c in combo if c["type"] != "free"]
+                if len(paid) - len(set(paid)) > max(min_sources - 1, 0):
+                    continue
+                value = sum(c["utility"] - price_weight * c["price"] for c in combo)
+                if best is None or value > best:
+                    best = value
+        if best is not None:
+            return best
+    return 0.0
+
+
+@pytest.mark.parametrize("price_weight", [0.0, 0.1, 0.5])
+def test_solver_matches_exhaustive_search(price_weight):
+    rng = random.Random(3)
+    for _ in range(150):
+        cands = candidates(rng, rng.randint(0, 8))
+        names = [c["name"] for c in cands]
+        redundant = [tuple(rng.sample(names, 2)) for _ in range(2)] if len(names) >= 2 else []
+        budget = rng.choice([1.0, 4.0, 12.0])
+        min_sources = rng.randint(1, 3)
+        max_sources = max(min_sources + 1, 2)
+
+        r = solve_selection(cands, budget, min_sources, max_sources, redundant=redundant,
+                            time_budget_ms=1000, price_weight=price_weight)
+        assert r.status == "optimal"
+        assert r.objective == pytest.approx(brute_force(cands, budget, min_sources, max_sources, redundant, price_weight))
+        picked = [cands[i] for i in r.indices]
+        assert r.objective == pytest.approx(sum(c["utility"] - price_weight * c["price"] for c in picked))
+
+
+def test_price_weight_skips_sources_not_worth_their_price():
+    cands = [
+        {"name": "free_a", "type": "free", "price": 0.0, "utility": 0.6},
+        {"name": "free_b", "type": "free", "price": 0.0, "utility": 0.55},
+        {"name": "pricey", "type": "premium", "price": 4.0, "utility": 0.35},
+    ]
+    assert {cands[i]["name"] for i in solve_selection(cands, 12.0, 2, 3).indices} == {"free_a", "free_b", "pricey"}
+    assert {cands[i]["name"] for i in solve_selection(cands, 12.0, 2, 3, price_weight=0.1).indices} == {"free_a", "free_b"}
@@ -0,0 +1,114 @@
+"""
+signal_engine's anchor prefilter must never change what fires: scan_triggers is checked
+against a plain re.search of every SIGNAL_TRIGGERS/TEMPLATES pattern, and every pattern
+must stay indexable so an edited pattern cannot quietly fall back to (or drop out of) the index.
+
+  python -m pytest tests
+"""
+
+import os
+import random
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import signal_engine  # noqa: E402
+from signal_engine import SIGNAL_TRIGGERS, TEMPLATES, pattern_anchors, scan_triggers  # noqa: E402
+
+# Patterns the indexer is allowed to leave unindexed (always run). Add a name here only on purpose.
+EXPECTED_ALWAYS = {"triggers": set(), "templates": set()}
+
+SAMPLE_QUERIES = [
+    "What did the Fed announce today about interest rates?",
+    "NVIDIA Q3 2025 earnings revenue and profit breakdown",
+    "How does the EU AI Act regulation affect providers of general purpose models?",
+    "Should I take ibuprofen after a clinical trial of a new drug?",
+    "Latest GPT model release features and benchmark specs",
+    "Explain the history and background of the Bretton Woods system",
+    "what's happening in iran",
+    "Tariff impact on semiconductor supply chains versus domestic policy debate",
+    "official website for the SEC filing portal",
+    "how to sign up for a brokerage account, step by step guide",
+    "Comprehensive in-depth analysis of Apple vs Microsoft cloud strategy",
+    "breaking: merger announced between two major banks hours ago",
+    "",
+    "ok",
+]
+
+ADVERSARIAL = [
+    "what's", "whats new", "what 's up", "what's\nhappening", "WHAT'S HAPPENING", "what is", "what  happened",
+    "vs.", "vs", "apple vs. google", "apple vs.google", ".vs.", "versus?",
+    "in-depth", "in depth", "in--depth", "-in-depth-", "an in-depthanalysis",
+    "$5", "$", "a$5", "$$5", "costs $100.50", "5%", "%", "5%5", "100 percent", "percentage",
+    "q3 2025", "q32025", "q3  2026", "Q4 2024", "q5 2025", "q1", "_q1", "q12025", "2019 vs 2026", "20255",
+    "basis points", "basispoints", "basis  points", "should i take", "should  i  take", "shouldi",
+    "down 5", "down5", "up 3%", "right now", "hours ago", "minutes  ago", "sign-up", "sign up",
+    "phase 2 trial", "phase 4", "FDA", "fda-approved", "earnings for q3", "revenue this quarter",
+    "ſell", "İstanbul earnings", "ÜBER merger", "café policy", "naïve regulation", "Straße law",
+    "résumé guide", "日本 earnings today", "emoji 📈 ipo", " today", "today​", "ﬁnance",
+]
+
+_VOCAB = (
+    "today latest breaking just announced earnings revenue profit q1 q2 q3 q4 2019 2023 2024 2025 2026 "
+    "should i we take invest buy sell policy regulation law act compliance clinical trial fda phase 2 "
+    "how does to explain why what is are the happened happening history overview versus vs. or either "
+    "impact effect official site guide tutorial comprehensive detailed in-depth deep dive $100 percent % "
+    "ipo ceo merger vote election launch down 5 up 3 the a in on Apple Tesla NVIDIA EU SEC Fed Iran "
+    "what's q12025 basispoints basis points a$5 5%5 sign-up _q1 ſell İstanbul ÜBER"
+).split()
+_SEPARATORS = [" ", " ", " ", "  ", "\n", ", ", "-", ".", "'", "$"]
+
+
+def random_queries(n, seed=7):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        words = [rng.choice(_VOCAB) for _ in range(rng.randint(1, 12))]
+        if rng.random() < 0.3:
+            words = [w.upper() if rng.random() < 0.3 else w.capitalize() for w in words]
+        out.append("".join(w + rng.choice(_SEPARATORS) for w in words).strip())
+    return out
+
+
+def reference_scan(query):
+    """What scan_triggers must return: every pattern run with plain re.search."""
+    q = query.lower()
+    triggers = frozenset(
+        name for name, pat, icase in SIGNAL_TRIGGERS if re.search(pat, q, re.IGNORECASE if icase else 0)
+    )
+    template = next(
+        ({"label": label, "boost": boost} for pat, label, boost in TEMPLATES if re.search(pat, query, re.IGNORECASE)),
+        None,
+    )
+    return triggers, re.search(r"\b[A-Z][a-z]{2,}\b", query) is not None, template
+
+
+@pytest.mark.parametrize("query", SAMPLE_QUERIES + ADVERSARIAL)
+def test_scan_matches_plain_regex(query):
+    assert scan_triggers(query) == reference_scan(query)
+
+
+def test_scan_matches_plain_regex_on_generated_queries():
+    for query in random_queries(3000):
+        assert scan_triggers(query) == reference_scan(query), query
+
+
+def test_every_pattern_is_indexed():
+    assert set(signal_engine._TRIGGERS.always) == EXPECTED_ALWAYS["triggers"]
+    assert set(signal_engine._TEMPLATES.always) == EXPECTED_ALWAYS["templates"]
+    for name, pat, _ in SIGNAL_TRIGGERS:
+        words, chars = pattern_anchors(pat)
+        assert words or chars, name
+
+
+@pytest.mark.parametrize("pattern", [
+    r"\b(foo|ba+r)\b",      # quantifier inside a word
+    r"\b(?:foo|bar)\b",     # non-capturing group
+    r"\b\w+ing\b",          # open-ended start
+    r"(foo|bar)\b",         # no leading \b
+])
+def test_unmodelled_patterns_are_not_indexed(pattern):
+    assert pattern_anchors(pattern) is None